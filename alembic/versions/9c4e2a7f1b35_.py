@@ -0,0 +1,34 @@
+"""set message reply_to_id to null when the message it answers is deleted
+
+Revision ID: 9c4e2a7f1b35
+Revises: 4e7b9a2c6d18
+Create Date: 2025-03-10 11:02:47.318526
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4e2a7f1b35'
+down_revision: Union[str, None] = '4e7b9a2c6d18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # References to messages deleted before foreign keys were enforced
+    op.execute(
+        "UPDATE message SET reply_to_id = NULL WHERE reply_to_id IS NOT NULL "
+        "AND reply_to_id NOT IN (SELECT id FROM message)"
+    )
+
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_message_reply_to_id_message', type_='foreignkey')
+        batch_op.create_foreign_key('fk_message_reply_to_id_message', 'message', ['reply_to_id'], ['id'], ondelete='SET NULL')
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_message_reply_to_id_message', type_='foreignkey')
+        batch_op.create_foreign_key('fk_message_reply_to_id_message', 'message', ['reply_to_id'], ['id'])
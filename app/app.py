@@ -1,18 +1,33 @@
 """Main app module."""
 
+import functools
 import json
+import os
 from types import SimpleNamespace
 from socketio import AsyncServer
 
 import reflex as rx
 from reflex.utils import format
-from app.state import State
+from app.state import CHECKPOINT_POLICY, State, complete_text, refresh_sidebar
+from app.http_pool import http_pool_lifespan, pool_stats_endpoint
+from app.checkpoint import recover_interrupted_responses
+from app.resilience import upstream_stats_endpoint
+from app.prompt_cache import prompt_cache_stats_endpoint
+from app.provider_cache import usage_stats_endpoint
+from app.summarizer import summarizer_lifespan, summary_stats_endpoint
+from app.writer import db_writer_lifespan, db_writer_stats_endpoint
+from app.unit_of_work import query_stats_endpoint
+from app.row_cache import row_cache_stats_endpoint
+from app.sidebar_cache import sidebar_cache_lifespan, sidebar_cache_stats_endpoint
 from app.styles import base_style
 from app.components.project_sidebar import project_sidebar
 from app.components.chat_sidebar import chat_sidebar
 from app.components.main_chat import main_chat
 from app.components.project_modal import project_modal
 
+# Serve the /api/*-stats counters; off by default as they expose usage details
+STATS_ENDPOINTS = os.getenv("STATS_ENDPOINTS", "0").lower() in ("1", "true", "yes")
+
 SIDEBAR_WIDTH = "30ch"
 TWO_COLUMN_TEMPLATE = f"{SIDEBAR_WIDTH} 1fr"
 THREE_COLUMN_TEMPLATE = f"{SIDEBAR_WIDTH} {SIDEBAR_WIDTH} 1fr"
@@ -121,6 +136,29 @@ app = rx.App(
     },
 )
 
+# Share one pooled upstream HTTP session for the lifetime of the app
+app.register_lifespan_task(http_pool_lifespan)
+app.register_lifespan_task(summarizer_lifespan, complete=complete_text)
+# Commit app writes through one writer; flush what is queued at shutdown
+app.register_lifespan_task(db_writer_lifespan)
+# Push sidebar list changes to every open tab
+app.register_lifespan_task(
+    sidebar_cache_lifespan, refresh=functools.partial(refresh_sidebar, app)
+)
+# Abort responses left streaming by workers that died or were restarted
+app.register_lifespan_task(recover_interrupted_responses, policy=CHECKPOINT_POLICY)
+
+if STATS_ENDPOINTS:
+    app.api.get("/api/pool-stats")(pool_stats_endpoint)
+    app.api.get("/api/upstream-stats")(upstream_stats_endpoint)
+    app.api.get("/api/prompt-cache-stats")(prompt_cache_stats_endpoint)
+    app.api.get("/api/usage-stats")(usage_stats_endpoint)
+    app.api.get("/api/summary-stats")(summary_stats_endpoint)
+    app.api.get("/api/db-writer-stats")(db_writer_stats_endpoint)
+    app.api.get("/api/query-stats")(query_stats_endpoint)
+    app.api.get("/api/row-cache-stats")(row_cache_stats_endpoint)
+    app.api.get("/api/sidebar-cache-stats")(sidebar_cache_stats_endpoint)
+
 # Add routes
 app.add_page(index)
 app.add_page(projects, route="/projects", on_load=State.load_projects)
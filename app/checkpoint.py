@@ -0,0 +1,155 @@
+"""Write-behind checkpointing of assistant responses while they stream."""
+
+import asyncio
+import contextlib
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import *
+
+from sqlmodel import select
+
+from .models import Message, MessageStatus
+from .streaming import TextAccumulator
+from .writer import db_writer
+
+
+@dataclass
+class CheckpointPolicy:
+    """How often a partial response is written to the database.
+
+    A checkpoint is written once `interval_s` has passed since the previous one,
+    or earlier if `max_chars` of new text have arrived. At most one write is in
+    flight at a time; text arriving meanwhile goes into the next checkpoint.
+
+    A response not checkpointed for `stale_after_s` was left by a worker that
+    died. It must be longer than the upstream read timeout
+    (HTTP_POOL_SOCK_READ_TIMEOUT), which fails a live stream that goes silent
+    for longer, e.g. while a model reasons without streaming text.
+    """
+
+    interval_s: float = 2.0
+    max_chars: int = 8192
+    stale_after_s: float = 600.0
+
+    @classmethod
+    def from_env(cls) -> "CheckpointPolicy":
+        """Build a policy from CHECKPOINT_* environment variables."""
+        defaults = cls()
+        return cls(
+            interval_s=float(os.getenv("CHECKPOINT_INTERVAL_S", defaults.interval_s)),
+            max_chars=int(os.getenv("CHECKPOINT_MAX_CHARS", defaults.max_chars)),
+            stale_after_s=float(
+                os.getenv("CHECKPOINT_STALE_AFTER_S", defaults.stale_after_s)
+            ),
+        )
+
+
+def _write_partial(session, message_id: int, content: str, reasoning: str):
+    message = session.get(Message, message_id)
+    if message and message.status == MessageStatus.STREAMING.value:
+        message.content = content
+        message.reasoning = reasoning
+        session.add(message)
+
+
+class ResponseCheckpointer:
+    """Periodically persists the partial content/reasoning of a streaming message."""
+
+    def __init__(self, message_id: Optional[int], policy: CheckpointPolicy):
+        self.message_id = message_id
+        self.policy = policy
+        self.checkpoints = 0
+        self._loop = asyncio.get_running_loop()
+        self._last_time = self._loop.time()
+        self._last_chars = 0
+        self._pending: Optional[asyncio.Task] = None
+
+    def maybe_checkpoint(self, content: TextAccumulator, reasoning: TextAccumulator):
+        """Schedule a background write if the policy says one is due."""
+        if self.message_id is None:
+            return
+        if self._pending is not None and not self._pending.done():
+            return
+
+        chars = len(content) + len(reasoning)
+        new_chars = chars - self._last_chars
+        if not new_chars:
+            return
+        elapsed = self._loop.time() - self._last_time
+        if elapsed < self.policy.interval_s and new_chars < self.policy.max_chars:
+            return
+
+        self._last_time = self._loop.time()
+        self._last_chars = chars
+        self.checkpoints += 1
+        self._pending = asyncio.create_task(
+            db_writer.submit(
+                _write_partial,
+                self.message_id,
+                content.getvalue(),
+                reasoning.getvalue(),
+            )
+        )
+
+    async def drain(self):
+        """Wait for an in-flight checkpoint so it cannot overwrite the final write."""
+        if self._pending is not None:
+            try:
+                await self._pending
+            except Exception as e:
+                print(f"Checkpoint error: {str(e)}")
+            self._pending = None
+
+
+def _utc(moment: datetime) -> datetime:
+    # SQLite hands timestamps back without their timezone, which is UTC
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def abort_stale_responses(session, cutoff: datetime) -> int:
+    """Mark responses not checkpointed since `cutoff` as aborted.
+
+    Partial text from the last checkpoint is kept. The caller commits it.
+
+    Returns:
+        How many responses were aborted
+    """
+    streaming = session.exec(
+        select(Message).where(Message.status == MessageStatus.STREAMING.value)
+    ).all()
+    stale = [message for message in streaming if _utc(message.updated_at) < cutoff]
+    for message in stale:
+        message.status = MessageStatus.ABORTED.value
+        session.add(message)
+    return len(stale)
+
+
+async def _recover_stale_responses(policy: CheckpointPolicy):
+    while True:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=policy.stale_after_s)
+        try:
+            aborted = await db_writer.submit(abort_stale_responses, cutoff)
+            if aborted:
+                print(f"Marked {aborted} interrupted responses as aborted")
+        except Exception as e:
+            print(f"Error recovering interrupted responses: {str(e)}")
+        await asyncio.sleep(policy.stale_after_s / 2)
+
+
+@contextlib.asynccontextmanager
+async def recover_interrupted_responses(policy: CheckpointPolicy):
+    """App lifespan task aborting responses left streaming by workers that died.
+
+    Other workers may be streaming responses right now, so only those not
+    checkpointed for `policy.stale_after_s` are touched. Checks at startup and
+    then every `stale_after_s / 2`, which also catches responses of a worker
+    that died shortly before this one started.
+    """
+    task = asyncio.create_task(_recover_stale_responses(policy))
+    try:
+        yield
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
@@ -1,8 +1,12 @@
 """Chat interface components and styles."""
 
 import reflex as rx
+from app.context import MODEL_CONTEXT_TOKENS
 from app.state import State, Message
 
+# Models in the model pickers, with their context windows in app.context
+MODEL_OPTIONS = list(MODEL_CONTEXT_TOKENS)
+
 
 class ActionBarState(rx.State):
     """State for managing action bar behavior."""
@@ -163,13 +167,7 @@ def editing_message_input(index: int) -> rx.Component:
                     ),
                     rx.hstack(
                         rx.select(
-                            [
-                                "mistralai/codestral-2501",
-                                "aion-labs/aion-1.0",
-                                "deepseek/deepseek-r1",
-                                "openai/gpt-4o-mini",
-                                "google/gemini-2.0-flash-thinking-exp:free",
-                            ],
+                            MODEL_OPTIONS,
                             placeholder=State.model,
                             disabled=State.processing,
                             on_change=State.set_model,
@@ -360,6 +358,117 @@ def message(msg: Message, index: int) -> rx.Component:
     )
 
 
+def streaming_message() -> rx.Component:
+    """Render the assistant message that is still streaming."""
+    return rx.vstack(
+        rx.cond(
+            State.stream_reasoning != "",
+            rx.blockquote(
+                rx.markdown(State.stream_reasoning),
+                width="100%",
+                size="1",
+            ),
+        ),
+        rx.cond(
+            State.stream_content != "",
+            rx.box(
+                rx.markdown(
+                    State.stream_content,
+                    component_map=content_component_map,
+                    style=answer_style,
+                ),
+                width="100%",
+            ),
+        ),
+        align="start",
+        width="100%",
+    )
+
+
+def compare_models_popover() -> rx.Component:
+    """Pick extra models to answer the next question alongside the main one."""
+    return rx.popover.root(
+        rx.popover.trigger(
+            rx.button(
+                rx.icon("columns-2"),
+                rx.cond(
+                    State.compare_models.length() > 0,
+                    rx.text(State.compare_models.length(), size="1"),
+                ),
+                disabled=State.processing,
+                style={
+                    "background_color": "transparent",
+                    "border": "0px solid #E9E9E9",
+                    "color": "black",
+                },
+            ),
+        ),
+        rx.popover.content(
+            rx.vstack(
+                rx.text("Compare with", size="2", weight="bold"),
+                *[
+                    rx.checkbox(
+                        model,
+                        checked=State.compare_models.contains(model),
+                        on_change=lambda _, model=model: State.toggle_compare_model(
+                            model
+                        ),
+                        size="1",
+                    )
+                    for model in MODEL_OPTIONS
+                ],
+                spacing="2",
+            ),
+        ),
+    )
+
+
+def fanout_slot_card(slot) -> rx.Component:
+    """One model's response to the latest question."""
+    return rx.box(
+        rx.vstack(
+            rx.hstack(
+                rx.badge(slot.model, variant="soft"),
+                rx.cond(
+                    slot.status != "complete",
+                    rx.badge(slot.status, color_scheme="gray", variant="outline"),
+                ),
+                rx.spacer(),
+                rx.cond(
+                    slot.is_active,
+                    rx.badge("In use", color_scheme="green"),
+                    rx.button(
+                        "Use this response",
+                        size="1",
+                        variant="soft",
+                        disabled=State.processing,
+                        on_click=State.promote_response(slot.message_id),
+                    ),
+                ),
+                width="100%",
+            ),
+            rx.cond(
+                slot.reasoning != "",
+                rx.blockquote(rx.markdown(slot.reasoning), width="100%", size="1"),
+            ),
+            rx.markdown(slot.content, component_map=content_component_map),
+            align="start",
+            width="100%",
+        ),
+        style=answer_style | dict(padding="1em", overflow="auto"),
+    )
+
+
+def fanout_panel() -> rx.Component:
+    """Side-by-side responses from every model the latest question was sent to."""
+    return rx.grid(
+        rx.foreach(State.fanout_slots, fanout_slot_card),
+        columns=rx.breakpoints(initial="1", md="2"),
+        spacing="3",
+        width="100%",
+    )
+
+
 def action_bar() -> rx.Component:
     """Input bar for sending messages with auto-resize functionality."""
     return rx.cond(
@@ -386,19 +495,15 @@ def action_bar() -> rx.Component:
                         ),
                         rx.hstack(
                             rx.select(
-                                [
-                                    "mistralai/codestral-2501",
-                                    "aion-labs/aion-1.0",
-                                    "google/gemini-2.0-flash-thinking-exp:free",
-                                    "deepseek/deepseek-r1",
-                                    "openai/gpt-4o-mini",
-                                ],
+                                MODEL_OPTIONS,
                                 placeholder=State.model,
                                 disabled=State.processing,
                                 on_change=State.set_model,
                                 style=select_style,
                             ),
+                            compare_models_popover(),
                             rx.spacer(),
+                            rx.text(State.prompt_size_label, size="1", color="gray"),
                             rx.cond(
                                 State.processing,
                                 rx.button(
@@ -426,6 +531,10 @@ def action_bar() -> rx.Component:
                     ),
                     on_submit=State.process_question,
                 ),
+                rx.cond(
+                    State.context_notice != "",
+                    rx.text(State.context_notice, size="1", color="gray"),
+                ),
                 width="100%",
             ),
             style=input_container_style,
@@ -435,9 +544,23 @@ def action_bar() -> rx.Component:
     )
 
 
+def load_more_button(label: str, on_click) -> rx.Component:
+    """Button fetching another page of messages into the window."""
+    return rx.button(
+        label,
+        size="1",
+        variant="soft",
+        on_click=on_click,
+    )
+
+
 def chat_messages() -> rx.Component:
-    """Render all chat messages."""
+    """Render the loaded window of chat messages."""
     return rx.vstack(
+        rx.cond(
+            State.has_older_messages,
+            load_more_button("Load earlier messages", State.load_older_messages),
+        ),
         rx.cond(
             ~State.messages.length(),
             rx.heading(
@@ -454,6 +577,18 @@ def chat_messages() -> rx.Component:
             State.messages,
             message,
         ),
+        rx.cond(
+            State.has_newer_messages,
+            load_more_button("Load later messages", State.load_newer_messages),
+        ),
+        rx.cond(
+            State.streaming,
+            streaming_message(),
+        ),
+        rx.cond(
+            State.fanout_slots.length() > 0,
+            fanout_panel(),
+        ),
         align="center",
         width="100%",
         padding_bottom="5em",
@@ -0,0 +1,267 @@
+"""Token-budgeted assembly of the context sent upstream.
+
+Token counts are estimated, not tokenized: about four characters per token
+for ASCII text and roughly one token per character for CJK text. Counts are
+stored on `Message.token_count` and `Document.token_count` whenever content
+is written, so budgeting a turn is a sum over integers rather than a pass
+over the whole chat.
+"""
+
+import os
+from dataclasses import dataclass, field
+from typing import *
+
+from sqlalchemy import event, inspect
+from sqlmodel import desc, select
+
+from .models import Document, Message
+
+# The models offered in the UI, in menu order, with their context windows;
+# anything else uses DEFAULT_CONTEXT_TOKENS
+MODEL_CONTEXT_TOKENS = {
+    "mistralai/codestral-2501": 256_000,
+    "aion-labs/aion-1.0": 131_072,
+    "google/gemini-2.0-flash-thinking-exp:free": 1_048_576,
+    "deepseek/deepseek-r1": 64_000,
+    "openai/gpt-4o-mini": 128_000,
+}
+DEFAULT_CONTEXT_TOKENS = 32_000
+
+# Role markers and separators the provider adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Fast token estimate: chars / 4, plus ~0.75 per multi-byte character."""
+    if not text:
+        return 0
+    chars = len(text)
+    extra_bytes = len(text.encode("utf-8")) - chars
+    return int(chars / 4 + extra_bytes * 0.375) + 1
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    """The longest prefix of `text` that `estimate_tokens` puts at `tokens` or fewer."""
+    if estimate_tokens(text) <= tokens:
+        return text
+    # The estimate grows with the prefix: the empty prefix fits, `text` doesn't
+    fits, too_long = 0, len(text)
+    while too_long - fits > 1:
+        middle = (fits + too_long) // 2
+        if estimate_tokens(text[:middle]) <= tokens:
+            fits = middle
+        else:
+            too_long = middle
+    return text[:fits]
+
+
+def context_tokens(model: str) -> int:
+    """Context window of `model` in tokens."""
+    return MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS)
+
+
+@dataclass
+class ContextConfig:
+    """How the context window is split between output, documents and history."""
+
+    reserve_output_tokens: int = 8192  # Kept free for the response
+    safety_margin: float = 0.9  # Fraction of the window used, as counts are estimates
+    max_document_share: float = 0.75  # Max share of the budget for the system prompt
+
+    @classmethod
+    def from_env(cls) -> "ContextConfig":
+        """Build a config from CONTEXT_* environment variables."""
+        defaults = cls()
+        return cls(
+            reserve_output_tokens=int(
+                os.getenv(
+                    "CONTEXT_RESERVE_OUTPUT_TOKENS", defaults.reserve_output_tokens
+                )
+            ),
+            safety_margin=float(
+                os.getenv("CONTEXT_SAFETY_MARGIN", defaults.safety_margin)
+            ),
+            max_document_share=float(
+                os.getenv("CONTEXT_MAX_DOCUMENT_SHARE", defaults.max_document_share)
+            ),
+        )
+
+    def budget(self, model: str) -> int:
+        """Prompt tokens available for `model`."""
+        window = context_tokens(model)
+        reserve = min(self.reserve_output_tokens, window // 4)
+        return max(0, int(window * self.safety_margin) - reserve)
+
+
+@dataclass
+class ContextReport:
+    """What was sent and what was left out to fit the budget."""
+
+    model: str
+    budget: int
+    system_tokens: int = 0
+    history_tokens: int = 0
+    included_messages: int = 0
+    dropped_messages: int = 0
+    dropped_documents: List[str] = field(default_factory=list)
+    truncated_latest: bool = False
+
+    @property
+    def total_tokens(self) -> int:
+        return self.system_tokens + self.history_tokens
+
+    @property
+    def trimmed(self) -> bool:
+        return bool(
+            self.dropped_messages or self.dropped_documents or self.truncated_latest
+        )
+
+    def summary(self) -> str:
+        """One line for the UI; empty when nothing was left out."""
+        if not self.trimmed:
+            return ""
+        parts = []
+        if self.dropped_messages:
+            parts.append(f"{self.dropped_messages} older messages")
+        if self.dropped_documents:
+            parts.append(f"{len(self.dropped_documents)} documents")
+        if self.truncated_latest:
+            parts.append("the end of the latest message")
+        return f"Left out {', '.join(parts)} to fit {self.model}'s context"
+
+
+def fit_documents(
+    documents: list, budget: int, base_tokens: int
+) -> Tuple[list, list]:
+    """Keep documents in id order while they fit.
+
+    Args:
+        documents: Document rows
+        budget: Tokens available for the whole system prompt
+        base_tokens: Tokens of the system prompt without documents
+
+    Returns:
+        The documents to include and the documents left out
+    """
+    used = base_tokens
+    kept, dropped = [], []
+    for doc in sorted(documents, key=lambda doc: doc.id or 0):
+        tokens = doc.token_count or estimate_tokens(doc.content)
+        if used + tokens <= budget:
+            kept.append(doc)
+            used += tokens
+        else:
+            dropped.append(doc)
+    return kept, dropped
+
+
+def fit_history(
+    messages: List[Dict[str, Any]], budget: int, report: ContextReport
+) -> List[Dict[str, Any]]:
+    """Keep the most recent messages that fit in `budget`, oldest dropped first.
+
+    The latest message is always sent, truncated if it alone is over budget.
+    Messages carry a "tokens" key with their stored count, which is removed.
+
+    Args:
+        messages: API messages, oldest first
+        budget: Tokens available for history
+        report: Updated with what was included and dropped
+
+    Returns:
+        The messages to send, oldest first
+    """
+    kept: List[Tuple[Dict[str, Any], int]] = []
+    used = 0
+    for msg in reversed(messages):
+        tokens = (msg.pop("tokens", 0) or estimate_tokens(msg["content"])) + (
+            MESSAGE_OVERHEAD_TOKENS
+        )
+        if used + tokens > budget:
+            if kept:
+                break
+            # The latest message alone is over budget: keep as much of it as fits
+            msg["content"] = truncate_to_tokens(
+                msg["content"], budget - MESSAGE_OVERHEAD_TOKENS
+            )
+            tokens = estimate_tokens(msg["content"]) + MESSAGE_OVERHEAD_TOKENS
+            report.truncated_latest = True
+        kept.append((msg, tokens))
+        used += tokens
+
+    # Don't open the conversation with an orphaned assistant reply
+    while len(kept) > 1 and kept[-1][0]["role"] == "assistant":
+        used -= kept.pop()[1]
+
+    report.history_tokens = used
+    report.included_messages = len(kept)
+    report.dropped_messages = len(messages) - len(kept)
+    return [msg for msg, _ in reversed(kept)]
+
+
+def load_history(
+    session, chat_id: int, first_seq: int, budget: int
+) -> Tuple[List[Dict[str, Any]], int]:
+    """The chat's messages from position `first_seq` on that can fit in `budget`.
+
+    Only stored token counts are read for the whole range; content is loaded
+    just for the newest messages that fit, plus the one that overflows so
+    `fit_history` can still truncate a single oversized latest message.
+
+    Args:
+        session: Database session
+        chat_id: Chat to read
+        first_seq: Position of the first message to consider
+        budget: Upper bound on the tokens the history may use
+
+    Returns:
+        API messages with a "tokens" key, oldest first, and the number of
+        earlier messages that were not loaded
+    """
+    has_content = (
+        Message.chat_id == chat_id,
+        Message.is_active == True,
+        Message.seq >= first_seq,
+        Message.content != None,
+        Message.content != "",
+    )
+    counts = session.exec(
+        select(Message.seq, Message.token_count)
+        .where(*has_content)
+        .order_by(desc(Message.seq))
+    ).all()
+    used = 0
+    start = None
+    for seq, tokens in counts:
+        start = seq
+        used += tokens + MESSAGE_OVERHEAD_TOKENS
+        if used > budget:
+            break
+    if start is None:
+        return [], 0
+
+    rows = session.exec(
+        select(Message.role, Message.content, Message.token_count)
+        .where(*has_content, Message.seq >= start)
+        .order_by(Message.seq)
+    ).all()
+    history = [
+        {"role": role, "content": content, "tokens": tokens}
+        for role, content, tokens in rows
+    ]
+    return history, len(counts) - len(history)
+
+
+def _count_on_insert(mapper, connection, target):
+    target.token_count = estimate_tokens(target.content)
+
+
+def _count_on_update(mapper, connection, target):
+    if inspect(target).attrs.content.history.has_changes():
+        target.token_count = estimate_tokens(target.content)
+
+
+# Keep stored counts in step with content on every write
+for _model in (Message, Document):
+    event.listen(_model, "before_insert", _count_on_insert)
+    event.listen(_model, "before_update", _count_on_update)
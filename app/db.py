@@ -0,0 +1,114 @@
+"""Asynchronous database access for state events and background tasks.
+
+Event handlers run on the worker's event loop, so a synchronous `rx.session()`
+inside them holds up every other websocket and stream while SQLite works.
+Sessions from here go through SQLAlchemy's asyncio extension and an async
+driver (aiosqlite for SQLite): statements run on the driver's thread and the
+loop keeps serving other clients while it waits.
+
+The query helpers in `sequence`, `context` and `summarizer` take a plain
+session. `AsyncSession.run_sync` (or `run` below) hands them the sync facade of
+an async session, so they are shared by both paths unchanged.
+
+Both kinds of session use engines tuned by SQLITE_PROFILE (see `db_profile`);
+use `session()` rather than `rx.session()` for the remaining sync access.
+Writes go through the single writer in `writer`, which has a session of its
+own from `writer_session()`.
+"""
+
+from typing import *
+
+import reflex as rx
+import sqlalchemy
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .db_profile import (
+    SQLiteProfile,
+    create_async_engine,
+    create_engine,
+    create_writer_engine,
+)
+
+# Pragmas and pool settings of the app's SQLite engines
+SQLITE_PROFILE = SQLiteProfile.from_config()
+
+# Async driver for each sync database scheme
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def async_db_url() -> str:
+    """The configured `async_db_url`, or `db_url` with its async driver.
+
+    Deriving it keeps both engines on the same database when only `DB_URL` is
+    overridden.
+    """
+    config = rx.config.get_config()
+    if config.async_db_url:
+        return config.async_db_url
+    scheme, sep, rest = config.db_url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+_engines: Dict[str, sqlalchemy.engine.Engine] = {}
+_writer_engines: Dict[str, sqlalchemy.engine.Engine] = {}
+_async_sessionmakers: Dict[str, async_sessionmaker] = {}
+
+
+def engine() -> sqlalchemy.engine.Engine:
+    """The tuned sync engine for `db_url`."""
+    url = rx.config.get_config().db_url
+    if url not in _engines:
+        _engines[url] = create_engine(url, SQLITE_PROFILE)
+    return _engines[url]
+
+
+def session() -> Session:
+    """A sync session on the app database, like `rx.session()`."""
+    return Session(engine())
+
+
+def asession() -> AsyncSession:
+    """An async session on the app database.
+
+    async with asession() as session:
+        chat = await session.get(Chat, chat_id)
+
+    Configured like `rx.asession()`: objects stay loaded after a commit.
+    """
+    url = async_db_url()
+    if url not in _async_sessionmakers:
+        _async_sessionmakers[url] = async_sessionmaker(
+            bind=create_async_engine(url, SQLITE_PROFILE),
+            class_=AsyncSession,
+            expire_on_commit=False,
+            autocommit=False,
+            autoflush=False,
+        )
+    return _async_sessionmakers[url]()
+
+
+def writer_session() -> Session:
+    """A sync session on the database writer's own connection.
+
+    Its transactions begin with BEGIN IMMEDIATE on SQLite, and savepoints
+    work. Only `writer.DatabaseWriter` should use it, from its thread.
+    """
+    url = rx.config.get_config().db_url
+    if url not in _writer_engines:
+        _writer_engines[url] = create_writer_engine(url, SQLITE_PROFILE)
+    return Session(_writer_engines[url], expire_on_commit=False, autoflush=False)
+
+
+async def run(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run `fn(session, *args, **kwargs)` on a sync facade of an async session.
+
+    For reads written against a plain session. Writes go through
+    `writer.db_writer.submit`, which commits them.
+    """
+    async with asession() as session:
+        return await session.run_sync(fn, *args, **kwargs)
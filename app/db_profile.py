@@ -0,0 +1,149 @@
+"""SQLite engine profile: pragmas and pool settings for the app's engines.
+
+SQLite's defaults suit a single process writing occasionally: a rollback
+journal that makes readers wait for writers, a full fsync on every commit and
+a small page cache. The profile switches the database to WAL (readers and the
+writer no longer block each other), relaxes `synchronous` to NORMAL (safe
+under WAL; a power loss can only drop the last commits), maps the file into
+memory, enlarges the page cache, keeps temporary tables in memory, waits on a
+locked database instead of failing at once, and enforces foreign keys.
+
+Values come from the dataclass defaults, then the `sqlite_profile` dict in
+rxconfig.py, then SQLITE_* environment variables. Pragmas are applied to
+every new connection of the engines built by `app.db`. Reflex's own engine,
+which runs the migrations, is left alone, so alembic's batch table rebuilds
+never trip over foreign-key enforcement.
+"""
+
+import dataclasses
+import os
+from dataclasses import dataclass
+from typing import *
+
+import reflex as rx
+import sqlalchemy
+import sqlalchemy.ext.asyncio
+import sqlmodel
+from sqlalchemy import event
+
+
+@dataclass
+class SQLiteProfile:
+    """Pragmas set on each SQLite connection, and the connection pool size."""
+
+    journal_mode: str = "wal"
+    synchronous: str = "normal"
+    mmap_size: int = 256 * 1024 * 1024  # Bytes of the file mapped into memory
+    cache_size: int = -64 * 1024  # Negative: KiB of page cache per connection
+    temp_store: str = "memory"
+    busy_timeout_ms: int = 5000  # How long a statement waits on a locked database
+    foreign_keys: bool = True
+    # Connections are cheap and local; WAL lets pooled readers run concurrently
+    pool_size: int = 8
+    max_overflow: int = 8
+    pool_timeout_s: float = 30.0
+    pool_pre_ping: bool = False  # A local file connection does not go stale
+
+    @classmethod
+    def from_config(cls) -> "SQLiteProfile":
+        """Build a profile from rxconfig's `sqlite_profile` and SQLITE_* env vars."""
+        values = dict(getattr(rx.config.get_config(), "sqlite_profile", None) or {})
+        for field in dataclasses.fields(cls):
+            env = os.getenv(f"SQLITE_{field.name.upper()}")
+            if env is None:
+                continue
+            if field.type is bool:
+                values[field.name] = env.lower() in ("1", "true", "yes")
+            else:
+                values[field.name] = type(field.default)(env)
+        return cls(**values)
+
+    def pragmas(self) -> List[str]:
+        """PRAGMA statements for a new connection, in order."""
+        return [
+            f"PRAGMA journal_mode={self.journal_mode}",
+            f"PRAGMA synchronous={self.synchronous}",
+            f"PRAGMA mmap_size={self.mmap_size}",
+            f"PRAGMA cache_size={self.cache_size}",
+            f"PRAGMA temp_store={self.temp_store}",
+            f"PRAGMA busy_timeout={self.busy_timeout_ms}",
+            f"PRAGMA foreign_keys={'ON' if self.foreign_keys else 'OFF'}",
+        ]
+
+    def engine_args(self, url: str) -> Dict[str, Any]:
+        """Arguments for `create_engine`, on top of Reflex's own."""
+        args = rx.model.get_engine_args(url)
+        # An in-memory database lives in a single connection, so no pool size
+        if is_sqlite(url) and url.partition("://")[2].strip("/") not in ("", ":memory:"):
+            args.update(
+                pool_size=self.pool_size,
+                max_overflow=self.max_overflow,
+                pool_timeout=self.pool_timeout_s,
+                pool_pre_ping=self.pool_pre_ping,
+            )
+        return args
+
+    def apply(self, engine: sqlalchemy.engine.Engine):
+        """Run the pragmas on every connection `engine` opens."""
+
+        @event.listens_for(engine, "connect")
+        def set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in self.pragmas():
+                cursor.execute(pragma)
+            cursor.close()
+
+
+def is_sqlite(url: str) -> bool:
+    return url.partition("://")[0].split("+")[0] == "sqlite"
+
+
+def create_engine(url: str, profile: SQLiteProfile) -> sqlalchemy.engine.Engine:
+    """A sync engine for `url`, tuned by `profile` when it is SQLite."""
+    engine = sqlmodel.create_engine(url, **profile.engine_args(url))
+    if is_sqlite(url):
+        profile.apply(engine)
+    return engine
+
+
+def create_async_engine(
+    url: str, profile: SQLiteProfile
+) -> sqlalchemy.ext.asyncio.AsyncEngine:
+    """An async engine for `url`, tuned by `profile` when it is SQLite."""
+    engine = sqlalchemy.ext.asyncio.create_async_engine(
+        url, **profile.engine_args(url)
+    )
+    if is_sqlite(url):
+        profile.apply(engine.sync_engine)
+    return engine
+
+
+def begin_immediate(engine: sqlalchemy.engine.Engine):
+    """Start each transaction of `engine` with BEGIN IMMEDIATE.
+
+    The sqlite3 module defers BEGIN until the first write and mishandles
+    SAVEPOINT. Emitting BEGIN ourselves fixes both: savepoints nest properly,
+    and the write lock is taken when the transaction starts, waiting out
+    busy_timeout there rather than failing midway when a read has to upgrade
+    to a write.
+    """
+
+    @event.listens_for(engine, "connect")
+    def disable_implicit_begin(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def do_begin(connection):
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def create_writer_engine(url: str, profile: SQLiteProfile) -> sqlalchemy.engine.Engine:
+    """A sync engine with one connection, for the single database writer."""
+    args = profile.engine_args(url)
+    if "pool_size" in args:
+        args.update(pool_size=1, max_overflow=0)
+    engine = sqlmodel.create_engine(url, **args)
+    if is_sqlite(url):
+        profile.apply(engine)
+        begin_immediate(engine)
+    return engine
@@ -0,0 +1,181 @@
+"""Process-wide pooled HTTP client for upstream API calls."""
+
+import contextlib
+import os
+from dataclasses import dataclass
+from typing import *
+
+import aiohttp
+
+
+@dataclass
+class PoolConfig:
+    """Connector settings for the shared client session."""
+
+    limit: int = 100  # Total simultaneous connections
+    limit_per_host: int = 32  # Simultaneous connections to a single upstream
+    keepalive_timeout: float = 75.0  # Seconds an idle connection is kept open
+    ttl_dns_cache: int = 300  # Seconds a resolved address is cached
+    connect_timeout: float = 10.0
+    # Max silence between stream reads; None (0 in the environment) for no limit
+    sock_read_timeout: Optional[float] = 300.0
+
+    @classmethod
+    def from_env(cls) -> "PoolConfig":
+        """Build a config from HTTP_POOL_* environment variables."""
+        defaults = cls()
+        sock_read_timeout = os.getenv("HTTP_POOL_SOCK_READ_TIMEOUT")
+        return cls(
+            limit=int(os.getenv("HTTP_POOL_LIMIT", defaults.limit)),
+            limit_per_host=int(
+                os.getenv("HTTP_POOL_LIMIT_PER_HOST", defaults.limit_per_host)
+            ),
+            keepalive_timeout=float(
+                os.getenv("HTTP_POOL_KEEPALIVE_TIMEOUT", defaults.keepalive_timeout)
+            ),
+            ttl_dns_cache=int(
+                os.getenv("HTTP_POOL_TTL_DNS_CACHE", defaults.ttl_dns_cache)
+            ),
+            connect_timeout=float(
+                os.getenv("HTTP_POOL_CONNECT_TIMEOUT", defaults.connect_timeout)
+            ),
+            sock_read_timeout=(
+                defaults.sock_read_timeout
+                if sock_read_timeout is None
+                else float(sock_read_timeout) or None
+            ),
+        )
+
+
+@dataclass
+class PoolStats:
+    """Counters collected from aiohttp request tracing."""
+
+    requests: int = 0
+    connections_created: int = 0
+    connections_reused: int = 0
+    dns_cache_hits: int = 0
+    dns_cache_misses: int = 0
+    sessions_opened: int = 0
+
+    @property
+    def reuse_rate(self) -> float:
+        """Fraction of connection acquisitions served by a pooled connection."""
+        total = self.connections_created + self.connections_reused
+        return self.connections_reused / total if total else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "dns_cache_hits": self.dns_cache_hits,
+            "dns_cache_misses": self.dns_cache_misses,
+            "sessions_opened": self.sessions_opened,
+            "reuse_rate": round(self.reuse_rate, 4),
+        }
+
+
+class ClientRegistry:
+    """Owns the single aiohttp ClientSession shared by every request in the process.
+
+    The session is opened at app startup (see `http_pool_lifespan`) and closed on
+    shutdown. `get_session` also opens it lazily so scripts that never run the
+    lifespan hook still get a pooled session.
+    """
+
+    def __init__(self, config: Optional[PoolConfig] = None):
+        self.config = config or PoolConfig.from_env()
+        self.stats = PoolStats()
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        """Create a trace config that feeds the pool counters."""
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            self.stats.requests += 1
+
+        async def on_connection_create_end(session, ctx, params):
+            self.stats.connections_created += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            self.stats.connections_reused += 1
+
+        async def on_dns_cache_hit(session, ctx, params):
+            self.stats.dns_cache_hits += 1
+
+        async def on_dns_cache_miss(session, ctx, params):
+            self.stats.dns_cache_misses += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace_config
+
+    async def start(self) -> aiohttp.ClientSession:
+        """Open the shared session if it is not already open."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.config.limit,
+                limit_per_host=self.config.limit_per_host,
+                keepalive_timeout=self.config.keepalive_timeout,
+                use_dns_cache=True,
+                ttl_dns_cache=self.config.ttl_dns_cache,
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=None,
+                connect=self.config.connect_timeout,
+                sock_read=self.config.sock_read_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=timeout,
+                trace_configs=[self._trace_config()],
+            )
+            self.stats.sessions_opened += 1
+        return self._session
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Get the shared session, opening it on first use."""
+        return await self.start()
+
+    async def close(self):
+        """Close the shared session and release pooled connections."""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Snapshot of the counters plus the connector's current pool size."""
+        stats = self.stats.as_dict()
+        connector = self._session.connector if self._session else None
+        stats["open"] = bool(self._session and not self._session.closed)
+        stats["limit"] = self.config.limit
+        stats["limit_per_host"] = self.config.limit_per_host
+        stats["idle_connections"] = (
+            sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+            if connector
+            else 0
+        )
+        return stats
+
+
+client_registry = ClientRegistry()
+
+
+@contextlib.asynccontextmanager
+async def http_pool_lifespan():
+    """App lifespan task that opens the shared session and closes it on shutdown."""
+    await client_registry.start()
+    try:
+        yield
+    finally:
+        await client_registry.close()
+
+
+async def pool_stats_endpoint() -> Dict[str, Any]:
+    """API endpoint returning the shared pool statistics."""
+    return client_registry.pool_stats()
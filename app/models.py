@@ -1,6 +1,7 @@
 from datetime import datetime, timezone
+from enum import Enum
 from typing import List, Optional
-from sqlmodel import Column, DateTime, Field, func, Relationship
+from sqlmodel import Column, DateTime, Field, func, Index, Relationship
 
 import reflex as rx
 
@@ -26,12 +27,50 @@ Note that it's currently not possible to create a table without a primary key in
 """
 
 
+class MessageStatus(str, Enum):
+    """Lifecycle of an assistant response."""
+
+    STREAMING = "streaming"
+    COMPLETE = "complete"
+    ABORTED = "aborted"
+    ERROR = "error"
+
+
 class Message(rx.Model, table=True):
     """A chat message."""
 
+    __table_args__ = (
+        # Message windows, positional edits, history and summaries
+        Index("ix_message_chat_id_is_active_seq", "chat_id", "is_active", "seq"),
+        # Sibling responses to a user message
+        Index("ix_message_reply_to_id_id", "reply_to_id", "id"),
+        # Responses still streaming, see app.checkpoint
+        Index("ix_message_status", "status"),
+    )
+
     role: str
     content: Optional[str] = None
     reasoning: Optional[str] = None
+    status: str = Field(
+        default=MessageStatus.COMPLETE.value,
+        sa_column_kwargs={"server_default": MessageStatus.COMPLETE.value},
+    )
+    # Model that generated an assistant message
+    model: Optional[str] = None
+    # The user message an assistant message answers; shared by sibling responses
+    reply_to_id: Optional[int] = Field(
+        default=None, foreign_key="message.id", ondelete="SET NULL"
+    )
+    # Only active messages form the conversation; inactive ones are alternatives
+    is_active: bool = Field(default=True, sa_column_kwargs={"server_default": "1"})
+    # Position in the chat, see app.sequence; alternatives share their position
+    seq: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    # Token usage reported by the upstream for an assistant message
+    prompt_tokens: Optional[int] = None
+    cached_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    # Estimated tokens of `content`, kept up to date by app.context
+    token_count: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
 
     chat_id: int = Field(foreign_key="chat.id")
     created_at: datetime = Field(
@@ -51,14 +90,25 @@ class Message(rx.Model, table=True):
     )
 
     # Define relationship
-    chat: "Chat" = Relationship(back_populates="messages")
+    chat: "Chat" = Relationship(back_populates="all_messages")
 
 
 class Chat(rx.Model, table=True):
     """A chat session containing messages."""
 
+    __table_args__ = (
+        # A project's chats, most recently updated first
+        Index("ix_chat_project_id_updated_at", "project_id", "updated_at"),
+    )
+
     name: str
     project_id: int = Field(foreign_key="project.id")
+    # Rolling summary of older turns, maintained by app.summarizer
+    summary: Optional[str] = None
+    # Last message folded into `summary`; later active messages are sent verbatim
+    summary_through_id: Optional[int] = None
+    # Bumped on every summary write and message edit, to detect stale summaries
+    summary_version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
 
     created_at: datetime = Field(
         default_factory=lambda: datetime.now(timezone.utc),
@@ -77,7 +127,16 @@ class Chat(rx.Model, table=True):
     )
 
     # Define relationships
+    # The conversation: active messages only, by position
     messages: List[Message] = Relationship(
+        sa_relationship_kwargs={
+            "primaryjoin": "and_(Chat.id == Message.chat_id, Message.is_active == True)",
+            "order_by": "Message.seq",
+            "viewonly": True,
+        }
+    )
+    # Every message including alternative responses; owns deletion
+    all_messages: List[Message] = Relationship(
         back_populates="chat", sa_relationship_kwargs={"cascade": "all, delete-orphan"}
     )
     project: "Project" = Relationship(back_populates="chats")
@@ -86,9 +145,13 @@ class Chat(rx.Model, table=True):
 class Document(rx.Model, table=True):
     """A document in the knowledge base."""
 
+    __table_args__ = (Index("ix_document_project_id_id", "project_id", "id"),)
+
     name: str
     type: str
     content: str = ""
+    # Estimated tokens of `content`, kept up to date by app.context
+    token_count: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
     project_id: int = Field(foreign_key="project.id")
 
     created_at: datetime = Field(
@@ -114,9 +177,13 @@ class Document(rx.Model, table=True):
 class Project(rx.Model, table=True):
     """A project containing chats and knowledge base."""
 
+    __table_args__ = (Index("ix_project_updated_at", "updated_at"),)
+
     name: str
     description: str = ""
     system_instructions: str = ""
+    # Bumped whenever the instructions or documents change; keys the prompt cache
+    knowledge_version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
 
     created_at: datetime = Field(
         default_factory=lambda: datetime.now(timezone.utc),
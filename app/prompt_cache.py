@@ -0,0 +1,134 @@
+"""Versioned cache of rendered project system prompts."""
+
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import *
+
+from sqlmodel import select, update
+
+from .models import Project
+
+
+@dataclass
+class PromptCacheConfig:
+    """Memory bounds for the prompt cache; the least recently used entry goes first."""
+
+    max_entries: int = 64
+    max_chars: int = 32 * 1024 * 1024  # Total characters of all cached prompts
+
+    @classmethod
+    def from_env(cls) -> "PromptCacheConfig":
+        """Build a config from PROMPT_CACHE_* environment variables."""
+        defaults = cls()
+        return cls(
+            max_entries=int(
+                os.getenv("PROMPT_CACHE_MAX_ENTRIES", defaults.max_entries)
+            ),
+            max_chars=int(os.getenv("PROMPT_CACHE_MAX_CHARS", defaults.max_chars)),
+        )
+
+
+@dataclass(frozen=True)
+class CachedPrompt:
+    """A rendered system prompt and its estimated token count."""
+
+    prompt: str
+    tokens: int
+
+
+class PromptCache:
+    """Rendered system prompts keyed by project id and `Project.knowledge_version`.
+
+    Only the latest version of each project is kept: a lookup with a newer
+    version is a miss and the following `put` replaces the stale entry.
+    """
+
+    def __init__(self, config: Optional[PromptCacheConfig] = None):
+        self.config = config or PromptCacheConfig.from_env()
+        self._entries: "OrderedDict[int, Tuple[int, CachedPrompt]]" = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, project_id: int, version: int) -> Optional[CachedPrompt]:
+        """Return the cached prompt for this version of the project, if any."""
+        with self._lock:
+            entry = self._entries.get(project_id)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(project_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, project_id: int, version: int, prompt: str, tokens: int):
+        """Store a rendered prompt, evicting least recently used entries to fit."""
+        if len(prompt) > self.config.max_chars:
+            return
+        with self._lock:
+            self._remove(project_id)
+            self._entries[project_id] = (version, CachedPrompt(prompt, tokens))
+            self._chars += len(prompt)
+            while (
+                len(self._entries) > self.config.max_entries
+                or self._chars > self.config.max_chars
+            ):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, project_id: int):
+        """Drop a project's entry, e.g. when the project is deleted."""
+        with self._lock:
+            self._remove(project_id)
+
+    def _remove(self, project_id: int):
+        entry = self._entries.pop(project_id, None)
+        if entry is not None:
+            self._chars -= len(entry[1].prompt)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "chars": self._chars,
+        }
+
+
+prompt_cache = PromptCache()
+
+
+def bump_knowledge_version(session, project_id: int):
+    """Invalidate cached prompts of a project after its instructions or documents change.
+
+    The increment runs in SQL so concurrent edits never lose a bump. It keeps
+    `updated_at`, which orders the project list. The caller commits it
+    together with the edit.
+    """
+    session.exec(
+        update(Project)
+        .where(Project.id == project_id)
+        .values(
+            knowledge_version=Project.knowledge_version + 1,
+            updated_at=Project.updated_at,
+        )
+    )
+
+
+def knowledge_version(session, project_id: int) -> Optional[int]:
+    """Current `Project.knowledge_version`, or None if the project is gone."""
+    return session.exec(
+        select(Project.knowledge_version).where(Project.id == project_id)
+    ).first()
+
+
+async def prompt_cache_stats_endpoint() -> Dict[str, Any]:
+    """API endpoint returning the prompt cache counters."""
+    return prompt_cache.stats()
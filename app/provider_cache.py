@@ -0,0 +1,117 @@
+"""Provider-side prompt caching: cache_control breakpoints and cached-token accounting.
+
+OpenAI, DeepSeek and most other providers cache a repeated prompt prefix on their
+own; Anthropic and Gemini models only cache up to explicit `cache_control`
+breakpoints. Either way a hit needs the prefix (system prompt, then history) to
+be byte-identical across turns, which `format_system_prompt` guarantees by
+ordering documents by id.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import *
+
+from .models import Message
+
+PROVIDER_PROMPT_CACHING = os.getenv("PROVIDER_PROMPT_CACHING", "1") == "1"
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Model prefix -> breakpoints to place: the system prompt, then the latest message
+BREAKPOINT_MODELS = {
+    "anthropic/": 2,
+    "google/gemini": 1,  # Gemini only honours the last breakpoint
+}
+
+
+def cache_breakpoints(model: str) -> int:
+    """Number of cache_control breakpoints to place for `model`."""
+    if not PROVIDER_PROMPT_CACHING:
+        return 0
+    for prefix, count in BREAKPOINT_MODELS.items():
+        if model.startswith(prefix):
+            return count
+    return 0
+
+
+def _with_breakpoint(message: Dict[str, Any]) -> Dict[str, Any]:
+    content = message["content"]
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content}]
+    else:
+        content = [dict(part) for part in content]
+    content[-1]["cache_control"] = CACHE_CONTROL
+    return {**message, "content": content}
+
+
+def add_cache_breakpoints(
+    model: str, messages: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Return `messages` with cache_control breakpoints for models that need them.
+
+    The first breakpoint closes the system prompt (guidelines, identity and
+    documents), which is reused by every chat of the project. The second closes
+    the latest message so the next turn can reuse the whole history.
+
+    Args:
+        model: OpenRouter model id
+        messages: API messages; not modified
+
+    Returns:
+        The messages to send
+    """
+    count = cache_breakpoints(model)
+    if not count or not messages:
+        return messages
+
+    marked = list(messages)
+    if marked[0]["role"] == "system":
+        marked[0] = _with_breakpoint(marked[0])
+        count -= 1
+    if count and len(marked) > 1:
+        marked[-1] = _with_breakpoint(marked[-1])
+    return marked
+
+
+@dataclass
+class UsageStats:
+    """Token usage reported by the upstream, summed over responses."""
+
+    responses: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    completion_tokens: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "responses": self.responses,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_ratio": round(self.cached_tokens / self.prompt_tokens, 4)
+            if self.prompt_tokens
+            else 0.0,
+        }
+
+
+usage_stats = UsageStats()
+
+
+def record_usage(message: Message, usage: Optional[Dict[str, Any]]):
+    """Copy token counts from an OpenRouter usage block onto `message`."""
+    if not usage:
+        return
+    details = usage.get("prompt_tokens_details") or {}
+    message.prompt_tokens = usage.get("prompt_tokens")
+    message.completion_tokens = usage.get("completion_tokens")
+    message.cached_tokens = details.get("cached_tokens") or 0
+
+    usage_stats.responses += 1
+    usage_stats.prompt_tokens += message.prompt_tokens or 0
+    usage_stats.cached_tokens += message.cached_tokens
+    usage_stats.completion_tokens += message.completion_tokens or 0
+
+
+async def usage_stats_endpoint() -> Dict[str, Any]:
+    """API endpoint returning the summed token usage."""
+    return usage_stats.as_dict()
@@ -0,0 +1,215 @@
+"""Retries with jittered backoff and hedged requests for upstream API calls."""
+
+import asyncio
+import os
+import random
+from dataclasses import dataclass, field
+from typing import *
+
+import aiohttp
+
+T = TypeVar("T")
+
+# Statuses worth retrying: rate limiting, timeouts and transient server errors
+RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+@dataclass
+class RetryPolicy:
+    """How failed or slow upstream requests are retried and hedged."""
+
+    max_attempts: int = 3  # Attempts per request, including the first
+    base_delay_s: float = 0.5  # Backoff cap before the first retry, doubled each retry
+    max_delay_s: float = 8.0
+    hedge_after_ms: float = 0.0  # Start a second request if no byte arrives by then; 0 disables
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        """Build a policy from UPSTREAM_* environment variables."""
+        defaults = cls()
+        return cls(
+            max_attempts=int(
+                os.getenv("UPSTREAM_MAX_ATTEMPTS", defaults.max_attempts)
+            ),
+            base_delay_s=float(
+                os.getenv("UPSTREAM_BACKOFF_BASE_S", defaults.base_delay_s)
+            ),
+            max_delay_s=float(
+                os.getenv("UPSTREAM_BACKOFF_MAX_S", defaults.max_delay_s)
+            ),
+            hedge_after_ms=float(
+                os.getenv("UPSTREAM_HEDGE_AFTER_MS", defaults.hedge_after_ms)
+            ),
+        )
+
+    def backoff(self, retry: int, retry_after: Optional[float] = None) -> float:
+        """Delay before retry number `retry` (1-based), with full jitter.
+
+        A Retry-After hint from the upstream is honoured up to `max_delay_s`.
+        """
+        cap = min(self.max_delay_s, self.base_delay_s * 2 ** (retry - 1))
+        delay = random.uniform(0, cap)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay_s))
+        return delay
+
+
+@dataclass
+class UpstreamStats:
+    """Counters for retried and hedged upstream requests."""
+
+    requests: int = 0
+    attempts: int = 0
+    retries: int = 0
+    retry_reasons: Dict[str, int] = field(default_factory=dict)
+    failures: int = 0  # Requests that failed after all attempts
+    hedges_fired: int = 0
+    hedges_won: int = 0  # Hedged requests that started streaming before the original
+    hedges_cancelled: int = 0  # Losing requests cancelled after the other one won
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "retry_reasons": dict(self.retry_reasons),
+            "failures": self.failures,
+            "hedges_fired": self.hedges_fired,
+            "hedges_won": self.hedges_won,
+            "hedges_cancelled": self.hedges_cancelled,
+        }
+
+
+upstream_stats = UpstreamStats()
+
+
+class UpstreamError(Exception):
+    """The upstream answered with an error status."""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(f"Upstream returned {status}: {message}")
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status in RETRYABLE_STATUSES
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header; HTTP-date values are ignored."""
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+
+def _retry_reason(error: BaseException) -> Optional[str]:
+    """A short label if `error` is worth retrying, else None."""
+    if isinstance(error, UpstreamError):
+        return str(error.status) if error.retryable else None
+    if isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError)):
+        return type(error).__name__
+    return None
+
+
+async def with_retries(
+    attempt: Callable[[], Awaitable[T]],
+    policy: RetryPolicy,
+    stats: UpstreamStats = upstream_stats,
+) -> T:
+    """Await `attempt()`, retrying connection errors and retryable statuses.
+
+    Args:
+        attempt: Factory for one try of the request
+        policy: Attempt limit and backoff settings
+        stats: Counters to update
+
+    Returns:
+        The result of the first successful attempt
+    """
+    for number in range(1, policy.max_attempts + 1):
+        stats.attempts += 1
+        try:
+            return await attempt()
+        except Exception as e:
+            reason = _retry_reason(e)
+            if reason is None or number >= policy.max_attempts:
+                raise
+            stats.retries += 1
+            stats.retry_reasons[reason] = stats.retry_reasons.get(reason, 0) + 1
+            delay = policy.backoff(number, getattr(e, "retry_after", None))
+            print(f"Upstream {reason}, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+    raise RuntimeError("max_attempts must be at least 1")
+
+
+async def hedged(
+    attempt: Callable[[], Awaitable[T]],
+    policy: RetryPolicy,
+    discard: Callable[[T], Awaitable[None]],
+    stats: UpstreamStats = upstream_stats,
+) -> T:
+    """Await `attempt()`, racing a second copy if the first is slow.
+
+    If the first attempt has not finished after `policy.hedge_after_ms`, a second
+    one is started and whichever succeeds first wins. The other is cancelled, or
+    passed to `discard` if it also finished. An error from one attempt is only
+    raised once the other has failed too.
+
+    Args:
+        attempt: Factory for one (possibly retried) request
+        policy: Hedging threshold
+        discard: Releases the result of a losing attempt
+        stats: Counters to update
+
+    Returns:
+        The result of the winning attempt
+    """
+    if policy.hedge_after_ms <= 0:
+        return await attempt()
+
+    primary = asyncio.create_task(attempt())
+    hedge: Optional[asyncio.Task] = None
+    pending = {primary}
+    error: Optional[BaseException] = None
+    try:
+        done, pending = await asyncio.wait(
+            pending, timeout=policy.hedge_after_ms / 1000
+        )
+        if done:
+            return primary.result()
+
+        stats.hedges_fired += 1
+        hedge = asyncio.create_task(attempt())
+        pending.add(hedge)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            succeeded = [task for task in done if task.exception() is None]
+            if succeeded:
+                winner = primary if primary in succeeded else hedge
+                for task in succeeded:
+                    if task is not winner:
+                        await discard(task.result())
+                if winner is hedge:
+                    stats.hedges_won += 1
+                return winner.result()
+            error = next(iter(done)).exception()
+        raise error
+    finally:
+        # Runs on success, failure and when the caller is cancelled, including
+        # while it is still waiting on the primary alone
+        if hedge is not None:
+            stats.hedges_cancelled += len(pending)
+        for task in pending:
+            task.cancel()
+        for result in await asyncio.gather(*pending, return_exceptions=True):
+            if not isinstance(result, BaseException):
+                await discard(result)
+
+
+async def upstream_stats_endpoint() -> Dict[str, Any]:
+    """API endpoint returning the retry and hedging counters."""
+    return upstream_stats.as_dict()
@@ -0,0 +1,347 @@
+"""Chunked BM25 retrieval over project documents.
+
+Documents are split into overlapping chunks and indexed per project in an
+in-memory inverted index. The index is built lazily on the first query and
+then updated incrementally as documents are saved or deleted. Each index
+remembers the `Project.knowledge_version` it reflects, so changes made by
+another worker are picked up by a rebuild.
+"""
+
+import heapq
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import *
+
+from .context import estimate_tokens
+
+
+@dataclass
+class RetrievalConfig:
+    """How project knowledge is put into the prompt."""
+
+    # "full" sends every document; "bm25", "vector" and "hybrid" (both, fused)
+    # send only the top chunks. "vector" and "hybrid" need numpy, the
+    # "vector" extra
+    mode: str = "full"
+    top_k: int = 8
+    chunk_chars: int = 1500
+    chunk_overlap: int = 200
+    k1: float = 1.5
+    b: float = 0.75
+    max_indexes: int = 32  # Project indexes kept in memory
+
+    @classmethod
+    def from_env(cls) -> "RetrievalConfig":
+        """Build a config from RETRIEVAL_* environment variables."""
+        defaults = cls()
+        return cls(
+            mode=os.getenv("RETRIEVAL_MODE", defaults.mode),
+            top_k=int(os.getenv("RETRIEVAL_TOP_K", defaults.top_k)),
+            chunk_chars=int(os.getenv("RETRIEVAL_CHUNK_CHARS", defaults.chunk_chars)),
+            chunk_overlap=int(
+                os.getenv("RETRIEVAL_CHUNK_OVERLAP", defaults.chunk_overlap)
+            ),
+            max_indexes=int(os.getenv("RETRIEVAL_MAX_INDEXES", defaults.max_indexes)),
+        )
+
+
+@dataclass
+class Chunk:
+    """A piece of a document; quacks like a Document for `format_system_prompt`."""
+
+    doc_id: int
+    doc_name: str
+    position: int  # Index of the chunk within its document
+    content: str
+    token_count: int = 0
+
+    @property
+    def id(self) -> Tuple[int, int]:
+        # Sorts chunks by document, then by position within it
+        return (self.doc_id, self.position)
+
+    @property
+    def name(self) -> str:
+        return f"{self.doc_name} (part {self.position + 1})"
+
+
+def chunk_spans(text: str, size: int, overlap: int) -> List[Tuple[int, int]]:
+    """Split text into (start, end) spans of at most `size` chars, preferring line breaks.
+
+    Consecutive spans share up to `overlap` chars so a passage cut at a
+    boundary is still found whole in one of them.
+    """
+    if len(text) <= size:
+        return [(0, len(text))] if text.strip() else []
+    spans = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            # Cut at the last paragraph or line break in the second half, if any
+            cut = text.rfind("\n\n", start + size // 2, end)
+            if cut == -1:
+                cut = text.rfind("\n", start + size // 2, end)
+            if cut != -1:
+                end = cut + 1
+        if text[start:end].strip():
+            spans.append((start, end))
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return spans
+
+
+def chunk_text(text: str, size: int, overlap: int) -> List[str]:
+    """Split text into chunks as described in `chunk_spans`."""
+    return [text[start:end] for start, end in chunk_spans(text, size, overlap)]
+
+
+def chunk_document(
+    doc_id: int, name: str, content: str, config: RetrievalConfig
+) -> List[Chunk]:
+    return [
+        Chunk(doc_id, name, position, text, estimate_tokens(text))
+        for position, text in enumerate(
+            chunk_text(content or "", config.chunk_chars, config.chunk_overlap)
+        )
+    ]
+
+
+_WORD_RE = re.compile(r"\w+")
+_CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words; runs of CJK characters become overlapping bigrams."""
+    terms = []
+    for word in _WORD_RE.findall(text.lower()):
+        if _CJK_RE.search(word) and len(word) > 1:
+            terms.extend(word[i : i + 2] for i in range(len(word) - 1))
+        else:
+            terms.append(word)
+    return terms
+
+
+class BM25Index:
+    """Incremental inverted index over the chunks of one project."""
+
+    def __init__(self, config: RetrievalConfig):
+        self.config = config
+        self.clear()
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def clear(self):
+        self.version: Optional[int] = None
+        self._postings: Dict[str, Dict[int, int]] = {}  # term -> {chunk id: tf}
+        self._chunks: Dict[int, Chunk] = {}
+        self._lengths: Dict[int, int] = {}
+        self._doc_chunks: Dict[int, List[int]] = {}
+        self._total_length = 0
+        self._next_id = 0
+
+    def commit(self, version: int):
+        self.version = version
+
+    def add_document(self, doc_id: int, name: str, content: str):
+        """Index a document, replacing any previous version of it."""
+        self.remove_document(doc_id)
+        ids = []
+        for chunk in chunk_document(doc_id, name, content, self.config):
+            chunk_id = self._next_id
+            self._next_id += 1
+            terms = Counter(tokenize(chunk.content))
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[chunk_id] = tf
+            length = sum(terms.values())
+            self._chunks[chunk_id] = chunk
+            self._lengths[chunk_id] = length
+            self._total_length += length
+            ids.append(chunk_id)
+        self._doc_chunks[doc_id] = ids
+
+    def remove_document(self, doc_id: int):
+        for chunk_id in self._doc_chunks.pop(doc_id, []):
+            chunk = self._chunks.pop(chunk_id)
+            self._total_length -= self._lengths.pop(chunk_id)
+            for term in set(tokenize(chunk.content)):
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(chunk_id, None)
+                    if not postings:
+                        del self._postings[term]
+
+    def search(self, query: str, k: int) -> List[Tuple[float, Chunk]]:
+        """Top `k` chunks for `query` by BM25 score, best first."""
+        count = len(self._chunks)
+        if not count:
+            return []
+        k1, b = self.config.k1, self.config.b
+        average = self._total_length / count
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, tf in postings.items():
+                norm = k1 * (1 - b + b * self._lengths[chunk_id] / average)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (k1 + 1) / (
+                    tf + norm
+                )
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(score, self._chunks[chunk_id]) for chunk_id, score in best]
+
+
+def fuse_rankings(rankings: List[List[Chunk]], k: int, constant: int = 60) -> List[Chunk]:
+    """Merge ranked chunk lists with reciprocal rank fusion.
+
+    Args:
+        rankings: Chunk lists, best first, from different retrievers
+        k: Number of chunks to return
+        constant: Damping for lower ranks; 60 is the usual choice
+
+    Returns:
+        The top `k` chunks, best first
+    """
+    scores: Dict[Tuple[int, int], float] = {}
+    chunks: Dict[Tuple[int, int], Chunk] = {}
+    for ranking in rankings:
+        for rank, chunk in enumerate(ranking):
+            scores[chunk.id] = scores.get(chunk.id, 0.0) + 1 / (constant + rank + 1)
+            chunks.setdefault(chunk.id, chunk)
+    best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+    return [chunks[chunk_id] for chunk_id, _ in best]
+
+
+class IndexRegistry:
+    """Per-project indexes, least recently used evicted first.
+
+    Indexes are created with `factory` and provide `add_document`,
+    `remove_document`, `search`, `clear`, `commit(version)` and a `version`
+    attribute: the `Project.knowledge_version` they reflect. A persistent index
+    reopened with a matching version is used as is instead of being rebuilt,
+    as is one that `reload`s a version another worker committed.
+
+    Indexes change in place, so they are only used under the registry's lock:
+    searches (`search`) as well as updates. Nothing hands an index out.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[int], Any],
+        max_indexes: int,
+        on_drop: Optional[Callable[[int], None]] = None,
+    ):
+        self.factory = factory
+        self.max_indexes = max_indexes
+        self.on_drop = on_drop
+        self._indexes: "OrderedDict[int, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.updates = 0
+
+    def _open(self, project_id: int):
+        index = self._indexes.get(project_id)
+        if index is None:
+            index = self._indexes[project_id] = self.factory(project_id)
+            while len(self._indexes) > self.max_indexes:
+                _, evicted = self._indexes.popitem(last=False)
+                if hasattr(evicted, "close"):
+                    evicted.close()
+        self._indexes.move_to_end(project_id)
+        return index
+
+    def is_current(self, project_id: int, version: int) -> bool:
+        """Whether the project's open index reflects `version`.
+
+        Doesn't wait for the lock, so it can be asked from the event loop: an
+        outdated answer only means `search` checks again.
+        """
+        index = self._indexes.get(project_id)
+        return index is not None and index.version == version
+
+    def _current(self, project_id: int, version: int, documents: Callable[[], list]):
+        """The index of a project at `version`, rebuilt from `documents()` if stale.
+
+        A rebuild fills a new index and swaps it in. Call with the lock held.
+        """
+        index = self._open(project_id)
+        if index.version != version and hasattr(index, "reload"):
+            index.reload()
+        if index.version == version:
+            return index
+        rebuilt = self.factory(project_id)
+        rebuilt.clear()
+        for doc in documents():
+            rebuilt.add_document(doc.id, doc.name, doc.content)
+        rebuilt.commit(version)
+        self._indexes[project_id] = rebuilt
+        if hasattr(index, "close"):
+            index.close()
+        self.builds += 1
+        return rebuilt
+
+    def search(
+        self,
+        project_id: int,
+        version: int,
+        documents: Callable[[], list],
+        query: str,
+        k: int,
+    ) -> List[Tuple[float, Chunk]]:
+        """Top `k` chunks of the project's index at `version`, best first.
+
+        The index is rebuilt from `documents()` if stale. Blocks on rebuilds and
+        other threads' searches and updates: call it from a worker thread, as
+        the registry's other methods.
+        """
+        with self._lock:
+            return self._current(project_id, version, documents).search(query, k)
+
+    def _apply(
+        self, project_id: int, version: Optional[int], update: Callable[[Any], None]
+    ):
+        with self._lock:
+            index = self._open(project_id)
+            if version is None or index.version != version - 1:
+                return  # Missed another change (or never built); rebuilt on the next query
+            update(index)
+            index.commit(version)
+            self.updates += 1
+
+    def document_saved(self, project_id: int, version: Optional[int], doc):
+        """Apply a new or edited document committed as `version`."""
+        self._apply(
+            project_id,
+            version,
+            lambda index: index.add_document(doc.id, doc.name, doc.content),
+        )
+
+    def document_deleted(
+        self, project_id: int, version: Optional[int], doc_id: int
+    ):
+        """Apply a document deletion committed as `version`."""
+        self._apply(project_id, version, lambda index: index.remove_document(doc_id))
+
+    def drop(self, project_id: int):
+        """Forget a deleted project's index."""
+        with self._lock:
+            index = self._indexes.pop(project_id, None)
+            if index is not None and hasattr(index, "close"):
+                index.close()
+        if self.on_drop:
+            self.on_drop(project_id)
+
+
+RETRIEVAL_CONFIG = RetrievalConfig.from_env()
+
+bm25_indexes = IndexRegistry(
+    lambda project_id: BM25Index(RETRIEVAL_CONFIG), RETRIEVAL_CONFIG.max_indexes
+)
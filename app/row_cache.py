@@ -0,0 +1,153 @@
+"""Process-wide cache of the rows State's computed vars show.
+
+`current_project`, `current_chat`, `project_to_edit_data` and
+`chat_to_edit_data` are cached by Reflex per tab and recomputed whenever a
+var they read changes: the selected ids, and `State._row_version`, which the
+handlers bump after each write. A recompute asks this cache, which queries
+only when the row isn't cached yet or was invalidated by a write. Rows are
+shared by every tab and returned detached, so callers must not change them.
+
+Invalidation is explicit: whoever commits a change to a project, chat or
+project document calls `invalidate(Model, id)` once the write is committed
+(`invalidate_all(Chat)` when a project's chats go with it). Timestamp-only
+writes (`touch_chat`) don't invalidate.
+
+That assumes a single backend process. Writes made by another worker, or
+straight to the database, don't invalidate this process's rows, so every
+row is also reloaded once it is older than `RowCacheConfig.ttl_seconds`.
+
+Computed vars are evaluated synchronously on the event loop, so handlers
+that change which rows are shown `await load(...)` them first, on the async
+engine; `get` then finds them cached and only queries itself as a fallback.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import *
+
+from . import db
+
+
+@dataclass
+class RowCacheConfig:
+    """Bounds for the row cache; the least recently used row goes first."""
+
+    max_rows: int = 1024
+    ttl_seconds: float = 10.0  # Max age of a cached row; 0 keeps it until invalidated
+
+    @classmethod
+    def from_env(cls) -> "RowCacheConfig":
+        """Build a config from ROW_CACHE_* environment variables."""
+        defaults = cls()
+        return cls(
+            max_rows=int(os.getenv("ROW_CACHE_MAX_ROWS", defaults.max_rows)),
+            ttl_seconds=float(
+                os.getenv("ROW_CACHE_TTL_SECONDS", defaults.ttl_seconds)
+            ),
+        )
+
+
+class RowCache:
+    """Loaded rows keyed by model, id and loader.
+
+    One model and id can be cached by several loaders (a project alone, or
+    with its knowledge documents); `invalidate` drops them all.
+    """
+
+    def __init__(self, config: Optional[RowCacheConfig] = None):
+        self.config = config or RowCacheConfig.from_env()
+        # (model, id) -> loader -> (time loaded, row)
+        self._rows: "OrderedDict[Tuple[type, int], Dict[Callable, Tuple[float, Any]]]"
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get(self, model: type, row_id: int, loader: Callable[[Any, int], Any]) -> Any:
+        """`loader(session, row_id)`, from the cache unless invalidated or expired.
+
+        A missing row (None) isn't cached: its id may be taken by a new row.
+        A miss queries on the calling thread; handlers `load` rows beforehand.
+        """
+        found, row, generation = self._lookup((model, row_id), loader)
+        if found:
+            return row
+        with db.session() as session:
+            row = loader(session, row_id)
+        self._store((model, row_id), loader, row, generation)
+        return row
+
+    async def load(
+        self, model: type, row_id: int, loader: Callable[[Any, int], Any]
+    ) -> Any:
+        """Like `get`, but a miss is loaded on the async engine."""
+        found, row, generation = self._lookup((model, row_id), loader)
+        if found:
+            return row
+        row = await db.run(loader, row_id)
+        self._store((model, row_id), loader, row, generation)
+        return row
+
+    def _lookup(self, key: Tuple[type, int], loader: Callable) -> Tuple[bool, Any, int]:
+        """(True, row, _) for a fresh cached row, else (False, None, generation)."""
+        with self._lock:
+            loaded = self._rows.get(key, {}).get(loader)
+            ttl = self.config.ttl_seconds
+            if loaded is not None and (ttl <= 0 or time.monotonic() - loaded[0] < ttl):
+                self._rows.move_to_end(key)
+                self.hits += 1
+                return True, loaded[1], self.invalidations
+            self.misses += 1
+            return False, None, self.invalidations
+
+    def _store(
+        self, key: Tuple[type, int], loader: Callable, row: Any, generation: int
+    ):
+        """Cache a row loaded since `_lookup` returned `generation`."""
+        with self._lock:
+            # Don't cache what an invalidation during the load made stale
+            if row is not None and self.invalidations == generation:
+                self._rows.setdefault(key, {})[loader] = (time.monotonic(), row)
+                self._rows.move_to_end(key)
+                while len(self._rows) > self.config.max_rows:
+                    self._rows.popitem(last=False)
+                    self.evictions += 1
+
+    def invalidate(self, model: type, row_id: Optional[int]):
+        """Drop every cached load of a row after a write to it was committed."""
+        if row_id is None:
+            return
+        with self._lock:
+            self._rows.pop((model, row_id), None)
+            self.invalidations += 1
+
+    def invalidate_all(self, model: type):
+        """Drop every cached row of a model, e.g. a deleted project's chats."""
+        with self._lock:
+            for key in [key for key in self._rows if key[0] is model]:
+                del self._rows[key]
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "rows": len(self._rows),
+        }
+
+
+row_cache = RowCache()
+
+
+async def row_cache_stats_endpoint() -> Dict[str, Any]:
+    """API endpoint returning the row cache counters."""
+    return row_cache.stats()
@@ -0,0 +1,98 @@
+"""Positions of messages within a chat, and the SQL that edits by position.
+
+`Message.seq` is the 0-based position of a message in its chat's conversation:
+the active messages of a chat are numbered 0..n-1 without gaps, so the UI's
+list index is the seq. Alternative responses share the seq of the response
+they stand in for. Every positional lookup, truncation and delete is a single
+statement on the (chat_id, is_active, seq) index instead of a load of the
+whole conversation, and the UI pages through a chat by keyset on the same
+index.
+"""
+
+from typing import *
+
+from sqlmodel import delete, desc, func, select, update
+
+from .models import Message
+
+
+def next_seq(session, chat_id: int) -> int:
+    """Position for a message appended to the chat."""
+    return session.exec(
+        select(func.coalesce(func.max(Message.seq), -1) + 1).where(
+            Message.chat_id == chat_id, Message.is_active == True
+        )
+    ).one()
+
+
+def message_at(session, chat_id: int, seq: int) -> Optional[Message]:
+    """The active message at position `seq`, if any."""
+    if seq < 0:
+        return None
+    return session.exec(
+        select(Message).where(
+            Message.chat_id == chat_id,
+            Message.is_active == True,
+            Message.seq == seq,
+        )
+    ).first()
+
+
+def page_before(
+    session, chat_id: int, before_seq: Optional[int], limit: int
+) -> List[Message]:
+    """Up to `limit` active messages before position `before_seq`, oldest first.
+
+    With `before_seq` None this is the latest page of the chat.
+    """
+    query = select(Message).where(
+        Message.chat_id == chat_id, Message.is_active == True
+    )
+    if before_seq is not None:
+        query = query.where(Message.seq < before_seq)
+    page = session.exec(query.order_by(desc(Message.seq)).limit(limit)).all()
+    return list(reversed(page))
+
+
+def page_after(session, chat_id: int, after_seq: int, limit: int) -> List[Message]:
+    """Up to `limit` active messages after position `after_seq`, oldest first."""
+    return session.exec(
+        select(Message)
+        .where(
+            Message.chat_id == chat_id,
+            Message.is_active == True,
+            Message.seq > after_seq,
+        )
+        .order_by(Message.seq)
+        .limit(limit)
+    ).all()
+
+
+def delete_after(session, chat_id: int, seq: int):
+    """Delete every message (alternatives included) after position `seq`.
+
+    The caller commits it.
+    """
+    session.exec(
+        delete(Message).where(Message.chat_id == chat_id, Message.seq > seq)
+    )
+
+
+def delete_positions(session, chat_id: int, seq: int, count: int = 1):
+    """Delete the messages at positions seq..seq+count-1 and close the gap.
+
+    Alternatives at those positions go too. Later messages move up by `count`
+    so positions stay contiguous. The caller commits it.
+    """
+    session.exec(
+        delete(Message).where(
+            Message.chat_id == chat_id,
+            Message.seq >= seq,
+            Message.seq < seq + count,
+        )
+    )
+    session.exec(
+        update(Message)
+        .where(Message.chat_id == chat_id, Message.seq >= seq + count)
+        .values(seq=Message.seq - count, updated_at=Message.updated_at)
+    )
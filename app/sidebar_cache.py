@@ -0,0 +1,289 @@
+"""Sidebar lists shared by every session, refreshed by change notifications.
+
+Each tab used to run its own queries for the project list and the current
+project's chats, and ran them again after every send, create or delete.
+`sidebar_cache` keeps one copy of each list per process:
+
+- `get(key, fn, *args)` returns the cached list, or loads it with
+  `fn(session, *args)` on a session of its own (concurrent misses share one
+  load). Entries expire after `ttl_seconds`; the least recently used go
+  first beyond `max_entries`.
+- Write units call `lists_changed(session, project_id)` for what they
+  change. When the writer commits, the affected lists are dropped and every
+  tab subscribed to them (`subscribe`) is told to reload, so open sidebars
+  update without polling. The lists are shared: callers must not change them.
+"""
+
+import asyncio
+import contextlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import *
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import db, unit_of_work
+
+PROJECTS = "projects"
+
+# session.info key of the changes a transaction makes, published on commit
+_CHANGES = "sidebar_changes"
+
+
+def project_chats_key(project_id: int) -> Tuple[str, int]:
+    """Cache key of a project's chat list."""
+    return ("project_chats", project_id)
+
+
+@dataclass
+class SidebarCacheConfig:
+    """Bounds of the sidebar cache and how changes are batched into notifications.
+
+    With `enabled` off every tab loads its lists from the database, once
+    per event, as before; tabs are still notified of changes.
+    """
+
+    enabled: bool = True
+    max_entries: int = 256
+    ttl_seconds: float = 300.0
+    notify_window_ms: float = 50.0
+
+    @classmethod
+    def from_env(cls) -> "SidebarCacheConfig":
+        """Build a config from SIDEBAR_CACHE_* environment variables."""
+        defaults = cls()
+        return cls(
+            enabled=os.getenv("SIDEBAR_CACHE_ENABLED", "true").lower()
+            in ("1", "true", "yes"),
+            max_entries=int(
+                os.getenv("SIDEBAR_CACHE_MAX_ENTRIES", defaults.max_entries)
+            ),
+            ttl_seconds=float(
+                os.getenv("SIDEBAR_CACHE_TTL_SECONDS", defaults.ttl_seconds)
+            ),
+            notify_window_ms=float(
+                os.getenv("SIDEBAR_CACHE_NOTIFY_WINDOW_MS", defaults.notify_window_ms)
+            ),
+        )
+
+
+# Reloads a tab's sidebar: (client token, reload projects, reload chats) ->
+# False once the tab is gone
+Refresh = Callable[[str, bool, bool], Awaitable[bool]]
+
+
+class SidebarCache:
+    """Project and chat lists keyed by `PROJECTS` and `project_chats_key`."""
+
+    def __init__(self, config: Optional[SidebarCacheConfig] = None):
+        self.config = config or SidebarCacheConfig.from_env()
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._loading: Dict[Hashable, asyncio.Future] = {}
+        # Bumped by every invalidation, so a load that raced one isn't stored
+        self._generation = 0
+        self._lock = threading.Lock()
+        # Client token -> project whose chats the tab shows
+        self._subscribers: Dict[str, Optional[int]] = {}
+        self._pending: Set[Tuple[Optional[int], bool]] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.notifications = 0
+
+    async def get(self, key: Hashable, fn: Callable[..., Any], *args) -> Any:
+        """The cached list for `key`, loading it with `fn(session, *args)` if needed."""
+        if not self.config.enabled:
+            return await unit_of_work.load(key, fn, *args)
+        with self._lock:
+            entry = self._entries.get(key)
+            fresh = entry is not None and (
+                time.monotonic() - entry[0] < self.config.ttl_seconds
+            )
+            if fresh:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            loading = self._loading.get(key)
+            if loading is None:
+                loading = asyncio.get_running_loop().create_future()
+                self._loading[key] = loading
+                generation = self._generation
+            else:
+                generation = None
+
+        if generation is None:
+            # Another task is loading it already
+            return await asyncio.shield(loading)
+
+        try:
+            value = await db.run(fn, *args)
+        except asyncio.CancelledError:
+            loading.cancel()
+            raise
+        except Exception as e:
+            loading.set_exception(e)
+            # Waiters get the exception; no one else has to retrieve it
+            loading.exception()
+            raise
+        else:
+            loading.set_result(value)
+        finally:
+            with self._lock:
+                if self._loading.get(key) is loading:
+                    del self._loading[key]
+
+        with self._lock:
+            if self._generation == generation:
+                self._entries[key] = (time.monotonic(), value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.config.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def invalidate(self, changes: Iterable[Tuple[Optional[int], bool]]):
+        """Drop the lists changed by a committed write and notify subscribers.
+
+        Args:
+            changes: (project id, whether the project list changed too) pairs;
+                the project's chat list changed in any case
+
+        Safe to call from any thread, e.g. the database writer's.
+        """
+        changes = set(changes)
+        with self._lock:
+            for project_id, projects in changes:
+                keys = [project_chats_key(project_id)]
+                if projects:
+                    keys.append(PROJECTS)
+                for key in keys:
+                    self._entries.pop(key, None)
+                    # Later gets must not join a load that started before the write
+                    self._loading.pop(key, None)
+            self._generation += 1
+            self.invalidations += 1
+            if self._loop is None:
+                return
+            self._pending |= changes
+            loop, wakeup = self._loop, self._wakeup
+        with contextlib.suppress(RuntimeError):  # The loop is closed
+            loop.call_soon_threadsafe(wakeup.set)
+
+    def subscribe(self, token: str, project_id: Optional[int]):
+        """Notify tab `token` when the project list or `project_id`'s chats change."""
+        if token:
+            with self._lock:
+                self._subscribers[token] = project_id
+
+    def unsubscribe(self, token: str):
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+    async def watch(self, refresh: Refresh):
+        """Tell subscribed tabs to reload the lists that changed, until cancelled.
+
+        Changes committed within `notify_window_ms` of each other are sent
+        as one notification per tab.
+        """
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+        try:
+            while True:
+                await self._wakeup.wait()
+                await asyncio.sleep(self.config.notify_window_ms / 1000)
+                self._wakeup.clear()
+                with self._lock:
+                    changes, self._pending = self._pending, set()
+                    subscribers = list(self._subscribers.items())
+                await self._notify(refresh, changes, subscribers)
+        finally:
+            with self._lock:
+                self._loop = self._wakeup = None
+                self._pending = set()
+
+    async def _notify(
+        self,
+        refresh: Refresh,
+        changes: Set[Tuple[Optional[int], bool]],
+        subscribers: List[Tuple[str, Optional[int]]],
+    ):
+        projects = any(projects for _, projects in changes)
+        changed_chats = {project_id for project_id, _ in changes}
+        tabs = [
+            (token, projects, project_id is not None and project_id in changed_chats)
+            for token, project_id in subscribers
+        ]
+        tabs = [tab for tab in tabs if tab[1] or tab[2]]
+        results = await asyncio.gather(
+            *(refresh(*tab) for tab in tabs), return_exceptions=True
+        )
+        for (token, _, _), result in zip(tabs, results):
+            if isinstance(result, Exception):
+                print(f"Sidebar refresh error: {str(result)}")
+            elif result is False:
+                self.unsubscribe(token)
+            else:
+                self.notifications += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "notifications": self.notifications,
+            "entries": len(self._entries),
+            "subscribers": len(self._subscribers),
+        }
+
+
+sidebar_cache = SidebarCache()
+
+
+def lists_changed(session, project_id: Optional[int], projects: bool = False):
+    """Record in a write unit that it changes `project_id`'s chat list.
+
+    With `projects` the project list changes too. The cache is invalidated
+    and subscribers notified once the session commits.
+    """
+    session.info.setdefault(_CHANGES, set()).add((project_id, projects))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_changes(session):
+    changes = session.info.pop(_CHANGES, None)
+    if changes:
+        sidebar_cache.invalidate(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_changes(session):
+    session.info.pop(_CHANGES, None)
+
+
+@contextlib.asynccontextmanager
+async def sidebar_cache_lifespan(refresh: Refresh):
+    """App lifespan task pushing sidebar changes to the open tabs."""
+    task = asyncio.create_task(sidebar_cache.watch(refresh))
+    try:
+        yield
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+
+async def sidebar_cache_stats_endpoint() -> Dict[str, Any]:
+    """API endpoint returning the sidebar cache counters."""
+    return sidebar_cache.stats()
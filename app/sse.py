@@ -0,0 +1,132 @@
+"""Incremental Server-Sent Events parser.
+
+Bytes are appended to a single bytearray that only ever holds the trailing
+partial line, so a stream is parsed in linear time regardless of how it is
+split into reads. Only complete lines are decoded: a newline byte never occurs
+inside a multi-byte UTF-8 sequence, so characters split across reads are
+reassembled before decoding.
+"""
+
+from dataclasses import dataclass
+from typing import *
+
+
+@dataclass
+class SSEEvent:
+    """A dispatched SSE event."""
+
+    data: str
+    event: str = "message"
+    id: Optional[str] = None
+    retry: Optional[int] = None
+
+
+class SSEParser:
+    """Feed raw bytes in, get complete `SSEEvent`s out.
+
+    Follows the SSE field rules: `event:`, `data:` (multiple lines joined with
+    "\\n"), `id:` and `retry:` fields, `:` comment lines (keep-alives), and a
+    blank line to dispatch. LF and CRLF line endings are accepted.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._scan = 0  # Where the next newline search starts
+        self._event = ""
+        self._data: List[str] = []
+        self._id: Optional[str] = None
+        self._retry: Optional[int] = None
+        self.bytes_fed = 0
+        self.comments = 0
+
+    def feed(self, chunk: bytes) -> List[SSEEvent]:
+        """Append a chunk of bytes and return the events it completed."""
+        self.bytes_fed += len(chunk)
+        buffer = self._buffer
+        buffer += chunk
+        last_newline = buffer.rfind(b"\n", self._scan)
+        if last_newline == -1:
+            self._scan = len(buffer)
+            return []
+
+        # Decode every complete line in one pass and keep only the partial tail
+        text = buffer[: last_newline + 1].decode("utf-8", errors="replace")
+        del buffer[: last_newline + 1]
+        self._scan = 0
+
+        if "\r" in text:
+            text = text.replace("\r\n", "\n")
+        lines = text.split("\n")
+        lines.pop()  # Empty string after the final newline
+
+        events = []
+        data = self._data
+        for line in lines:
+            # Fast paths for the data lines and blank lines that make up nearly all traffic
+            if line.startswith("data:"):
+                data.append(line[6:] if line.startswith("data: ") else line[5:])
+                continue
+            if not line:
+                if data:
+                    events.append(self._dispatch())
+                    data = self._data
+                else:
+                    self._event = ""
+                continue
+            event = self._process_line(line)
+            if event is not None:
+                events.append(event)
+                data = self._data
+        return events
+
+    def close(self) -> List[SSEEvent]:
+        """Flush a trailing line and any event not terminated by a blank line."""
+        events = []
+        if self._buffer:
+            line = self._buffer.decode("utf-8", errors="replace")
+            event = self._process_line(line.rstrip("\r"))
+            if event is not None:
+                events.append(event)
+        self._buffer.clear()
+        self._scan = 0
+        event = self._dispatch()
+        if event is not None:
+            events.append(event)
+        return events
+
+    def _process_line(self, line: str) -> Optional[SSEEvent]:
+        if not line:
+            return self._dispatch()
+        if line[0] == ":":
+            self.comments += 1
+            return None
+
+        name, sep, value = line.partition(":")
+        if sep and value.startswith(" "):
+            value = value[1:]
+
+        if name == "data":
+            self._data.append(value)
+        elif name == "event":
+            self._event = value
+        elif name == "id":
+            if "\0" not in value:
+                self._id = value
+        elif name == "retry":
+            if value.isdigit():
+                self._retry = int(value)
+        return None
+
+    def _dispatch(self) -> Optional[SSEEvent]:
+        if not self._data:
+            self._event = ""
+            return None
+        event = SSEEvent(
+            data="\n".join(self._data),
+            event=self._event or "message",
+            id=self._id,
+            retry=self._retry,
+        )
+        self._data = []
+        self._event = ""
+        return event
@@ -1,26 +1,174 @@
+import asyncio
+import contextlib
 import os
-from datetime import datetime, timezone
 from typing import *
 from dotenv import load_dotenv
-from sqlmodel import select, desc
+from sqlmodel import select, desc, func
 from sqlalchemy.orm import selectinload
 import aiohttp
 
 import dataclasses
 
 import reflex as rx
-from .models import Project, Chat, Message, Document
+from reflex.state import _substate_key
+from . import db, unit_of_work, writes
+from .models import Project, Chat, Message, Document, MessageStatus
+from .http_pool import client_registry
+from .sse import SSEEvent, SSEParser
+from .streaming import FlushPolicy, TextAccumulator, coalesce_chunks
+from .checkpoint import CheckpointPolicy, ResponseCheckpointer
+from .prompt_cache import knowledge_version, prompt_cache
+from .retrieval import (
+    RETRIEVAL_CONFIG,
+    Chunk,
+    IndexRegistry,
+    bm25_indexes,
+    fuse_rankings,
+)
+from .summarizer import chat_summary, summarizer
+from .writer import db_writer
+from .row_cache import row_cache
+from .sidebar_cache import PROJECTS, project_chats_key, sidebar_cache
+from .sequence import message_at, page_after, page_before
+from .context import (
+    MESSAGE_OVERHEAD_TOKENS,
+    ContextConfig,
+    ContextReport,
+    context_tokens,
+    estimate_tokens,
+    fit_documents,
+    fit_history,
+    load_history,
+)
+from .provider_cache import add_cache_breakpoints
+from .resilience import (
+    RetryPolicy,
+    UpstreamError,
+    hedged,
+    parse_retry_after,
+    upstream_stats,
+    with_retries,
+)
 from dataclasses import dataclass
 import json
 
 load_dotenv()
 
+# How often streamed text is pushed to the UI
+STREAM_FLUSH_POLICY = FlushPolicy.from_env()
+# How often partial responses are written to the database
+CHECKPOINT_POLICY = CheckpointPolicy.from_env()
+# Upstream API; point at a local mock server for benchmarks
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+# Retries and hedging of upstream requests
+UPSTREAM_RETRY_POLICY = RetryPolicy.from_env()
+# Token budget for the prompt sent to each model
+CONTEXT_CONFIG = ContextConfig.from_env()
+# Messages loaded per page, and the most kept in `State.messages` at once
+MESSAGE_PAGE_SIZE = int(os.getenv("MESSAGE_PAGE_SIZE", "50"))
+MESSAGE_WINDOW_SIZE = int(os.getenv("MESSAGE_WINDOW_SIZE", "200"))
+
+
+def retrieval_indexes(mode: str) -> List[IndexRegistry]:
+    """Indexes searched (and kept up to date) for a retrieval mode.
+
+    The vector index needs numpy (the `vector` extra), which is only imported
+    for the modes that use it.
+    """
+    if mode == "full":
+        return []
+    if mode not in ("vector", "hybrid"):
+        return [bm25_indexes]
+    try:
+        from .vector_index import vector_indexes
+    except ModuleNotFoundError as e:
+        if e.name != "numpy":
+            raise
+        raise RuntimeError(
+            f'RETRIEVAL_MODE="{mode}" needs numpy: install the "vector" extra, '
+            'e.g. pip install ".[vector]"'
+        ) from e
+
+    return [vector_indexes] if mode == "vector" else [bm25_indexes, vector_indexes]
+
+
+RETRIEVAL_INDEXES = retrieval_indexes(RETRIEVAL_CONFIG.mode)
+
+
+def project_documents(project_id: int) -> List[Document]:
+    """A project's documents, read on a session of the calling thread."""
+    with db.session() as session:
+        return list(
+            session.exec(select(Document).where(Document.project_id == project_id))
+        )
+
+
+def search_documents(
+    project_id: int, version: int, documents: Optional[list], query: str
+) -> List[Chunk]:
+    """The chunks most relevant to `query`, fused across `RETRIEVAL_INDEXES`.
+
+    Stale indexes are rebuilt from `documents`, or from the database when the
+    caller didn't load them. Builds and index locks block: run it in a worker
+    thread.
+    """
+    top_k = RETRIEVAL_CONFIG.top_k
+
+    def load() -> list:
+        return documents if documents is not None else project_documents(project_id)
+
+    rankings = [
+        [chunk for _, chunk in indexes.search(project_id, version, load, query, top_k)]
+        for indexes in RETRIEVAL_INDEXES
+    ]
+    return rankings[0] if len(rankings) == 1 else fuse_rankings(rankings, top_k)
+
+
+def index_document_saved(project_id: int, version: Optional[int], document):
+    """Apply a committed document save to `RETRIEVAL_INDEXES` (blocking)."""
+    for indexes in RETRIEVAL_INDEXES:
+        indexes.document_saved(project_id, version, document)
+
+
+def index_document_deleted(project_id: int, version: Optional[int], doc_id: int):
+    """Apply a committed document deletion to `RETRIEVAL_INDEXES` (blocking)."""
+    for indexes in RETRIEVAL_INDEXES:
+        indexes.document_deleted(project_id, version, doc_id)
+
+
+def drop_project_indexes(project_id: int):
+    """Forget a deleted project's `RETRIEVAL_INDEXES` (blocking)."""
+    for indexes in RETRIEVAL_INDEXES:
+        indexes.drop(project_id)
+
 
 @dataclasses.dataclass
 class UIMessage:
     role: str
     content: Optional[str] = None
     reasoning: Optional[str] = None
+    tokens: int = 0  # Stored token estimate of `content`
+
+
+def ui_message(msg: Message) -> UIMessage:
+    return UIMessage(
+        role=msg.role,
+        content=msg.content,
+        reasoning=msg.reasoning,
+        tokens=msg.token_count,
+    )
+
+
+@dataclasses.dataclass
+class FanoutSlot:
+    """One model's response when a question is sent to several models."""
+
+    model: str
+    message_id: Optional[int] = None
+    content: str = ""
+    reasoning: str = ""
+    status: str = MessageStatus.STREAMING.value
+    is_active: bool = False
 
 
 def format_system_prompt(system_instructions: str, documents: list) -> str:
@@ -67,9 +215,9 @@ def format_system_prompt(system_instructions: str, documents: list) -> str:
 {document_sections}
 </documents>"""
 
-    # Format document sections
+    # Format document sections in id order so the prompt prefix is identical every turn
     doc_sections = []
-    for doc in documents:
+    for doc in sorted(documents, key=lambda doc: doc.id or 0):
         doc_section = f"""<document>
 <source>{doc.name}</source>
 <document_content>
@@ -87,22 +235,20 @@ def format_system_prompt(system_instructions: str, documents: list) -> str:
     )
 
 
-def get_messages_with_system_prompt(
-    chat_messages: list, project_documents: list, system_instructions: str
-) -> list:
+# The system prompt without instructions or documents
+SYSTEM_TEMPLATE_TOKENS = estimate_tokens(format_system_prompt("", []))
+
+
+def get_messages_with_system_prompt(chat_messages: list, system_prompt: str) -> list:
     """Get formatted messages list with system prompt for API call.
 
     Args:
         chat_messages: List of chat messages
-        project_documents: List of project documents
-        system_instructions: Project's system instructions
+        system_prompt: Rendered system prompt, see `format_system_prompt`
 
     Returns:
         List of formatted messages including system prompt
     """
-    # Create system prompt
-    system_prompt = format_system_prompt(system_instructions, project_documents)
-
     # Create messages list with system prompt as first message
     messages = [{"role": "system", "content": system_prompt}]
 
@@ -114,6 +260,54 @@ def get_messages_with_system_prompt(
     return messages
 
 
+def list_projects(session) -> List[Project]:
+    """All projects, most recently updated first."""
+    return session.exec(select(Project).order_by(desc(Project.updated_at))).all()
+
+
+def list_project_chats(session, project_id: int) -> List[Chat]:
+    """A project's chats, most recently updated first."""
+    return session.exec(
+        select(Chat).where(Chat.project_id == project_id).order_by(desc(Chat.updated_at))
+    ).all()
+
+
+def get_project(session, project_id: int) -> Optional[Project]:
+    """A project by id."""
+    return session.get(Project, project_id)
+
+
+def get_project_with_knowledge(session, project_id: int) -> Optional[Project]:
+    """A project by id with its knowledge documents eagerly loaded."""
+    return session.exec(
+        select(Project)
+        .options(selectinload(Project.knowledge))
+        .where(Project.id == project_id)
+    ).first()
+
+
+def get_chat(session, chat_id: int) -> Optional[Chat]:
+    """A chat by id."""
+    return session.get(Chat, chat_id)
+
+
+async def refresh_sidebar(
+    reflex_app: rx.App, token: str, projects: bool, chats: bool
+) -> bool:
+    """Push reloaded sidebar lists to the tab with client token `token`.
+
+    Returns:
+        False if the tab has disconnected
+    """
+    namespace = reflex_app.event_namespace
+    if namespace is None or token not in namespace.token_to_sid:
+        return False
+    async with reflex_app.modify_state(_substate_key(token, State)) as root:
+        state = await root.get_state(State)
+        await state._refresh_sidebar(projects, chats)
+    return True
+
+
 @dataclass
 class StreamChunk:
     content: Optional[str] = None
@@ -125,67 +319,96 @@ class StreamChunk:
 class StreamProcessor:
     """Stream processor with proper resource management."""
 
-    def __init__(self, response, client):
+    # Read sizes adapt between these bounds to the rate the upstream delivers bytes
+    MIN_READ_SIZE = 1024
+    MAX_READ_SIZE = 64 * 1024
+
+    def __init__(self, response, client, prefix: bytes = b""):
         self.response = response
         self.client = client
-        self.buffer = ""
+        self.parser = SSEParser()
+        self.read_size = self.MIN_READ_SIZE
+        self._prefix = prefix  # Bytes already read from the response
         self._closed = False
+        self.usage: Optional[Dict[str, Any]] = None  # Usage block sent with the last chunk
 
     async def start(self):
         """Start processing the stream."""
         return self
 
+    def _adapt_read_size(self, received: int):
+        """Grow reads while the upstream fills them, shrink when it trickles."""
+        if received >= self.read_size:
+            self.read_size = min(self.read_size * 2, self.MAX_READ_SIZE)
+        elif received < self.read_size // 4:
+            self.read_size = max(self.read_size // 2, self.MIN_READ_SIZE)
+
+    def _parse_event(self, event: SSEEvent) -> Optional[StreamChunk]:
+        """Turn one SSE event into a StreamChunk, or None if it carries no text."""
+        if event.data == "[DONE]":
+            self._closed = True
+            return None
+
+        try:
+            data_obj = json.loads(event.data)
+        except json.JSONDecodeError:
+            return None
+
+        if "error" in data_obj:
+            error = data_obj["error"]
+            message = error.get("message") if isinstance(error, dict) else error
+            return StreamChunk(error=str(message), is_done=True)
+
+        if data_obj.get("usage"):
+            self.usage = data_obj["usage"]
+
+        try:
+            delta = data_obj["choices"][0]["delta"]
+        except (KeyError, IndexError, TypeError):
+            return None
+        content = delta.get("content")
+        reasoning = delta.get("reasoning")
+        if content or reasoning:
+            return StreamChunk(content=content, reasoning=reasoning, is_done=False)
+        return None
+
     async def __aiter__(self):
         """Iterate over the stream chunks."""
         try:
             while not self._closed:
-                chunk = await self.response.content.read(1024)
+                if self._prefix:
+                    chunk, self._prefix = self._prefix, b""
+                else:
+                    chunk = await self.response.content.read(self.read_size)
                 if not chunk:
-                    break
-
-                self.buffer += chunk.decode("utf-8")
-
-                while True:
-                    line_end = self.buffer.find("\n")
-                    if line_end == -1:
+                    events = self.parser.close()
+                else:
+                    self._adapt_read_size(len(chunk))
+                    events = self.parser.feed(chunk)
+
+                for event in events:
+                    stream_chunk = self._parse_event(event)
+                    if stream_chunk is not None:
+                        yield stream_chunk
+                    if self._closed:
                         break
 
-                    line = self.buffer[:line_end].strip()
-                    self.buffer = self.buffer[line_end + 1 :]
-
-                    if line.startswith("data: "):
-                        data = line[6:]
-                        if data == "[DONE]":
-                            self._closed = True
-                            break
-
-                        try:
-                            data_obj = json.loads(data)
-                            content = data_obj["choices"][0]["delta"].get("content")
-                            reasoning = data_obj["choices"][0]["delta"].get("reasoning")
-
-                            if content or reasoning:
-                                yield StreamChunk(
-                                    content=content, reasoning=reasoning, is_done=False
-                                )
-                        except json.JSONDecodeError:
-                            continue
-                        except Exception as e:
-                            print(f"Error processing chunk: {str(e)}")
-                            continue
+                if not chunk:
+                    break
 
         except Exception as e:
             print(f"Stream error: {str(e)}")
+            # Surface the interruption instead of ending the reply as if it were complete
+            yield StreamChunk(error=f"Stream interrupted: {str(e)}", is_done=True)
         finally:
             await self.close()
 
     async def close(self):
         """Close the stream processor and clean up resources."""
-        if not self._closed:
-            self._closed = True
-            if not self.response.closed:
-                await self.response.release()
-            # Note: Don't close the client session here as it may be reused
+        self._closed = True
+        if not self.response.closed:
+            await self.response.release()
+        # Note: Don't close the client session here as it may be reused
 
 
 class ChatCompletionChunk:
@@ -199,6 +422,8 @@ class ChatCompletionChunk:
 class Choice:
     def __init__(self, choice_data: Dict[str, Any]):
         self.delta = Delta(choice_data.get("delta", {}))
+        # Non-streaming responses carry the whole message instead of a delta
+        self.message = Delta(choice_data.get("message", {}))
         self.index = choice_data.get("index")
         self.finish_reason = choice_data.get("finish_reason")
 
@@ -211,20 +436,39 @@ class Delta:
 
 
 class AsyncOpenRouterAI:
-    def __init__(self, api_key: str, base_url: str = "https://openrouter.ai/api/v1"):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = OPENROUTER_BASE_URL,
+        session: Optional[aiohttp.ClientSession] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+    ):
         self.api_key = api_key
         self.base_url = base_url.rstrip("/")
+        self.retry_policy = retry_policy or UPSTREAM_RETRY_POLICY
         self.chat = self.Chat(self)
-        self._session = None
+        # A session passed in is shared (e.g. the process-wide pool) and never closed here
+        self._session = session
+        self._owns_session = session is None
+
+    @classmethod
+    async def from_pool(cls, api_key: str, **kwargs) -> "AsyncOpenRouterAI":
+        """Create a client that reuses the process-wide pooled session."""
+        return cls(api_key, session=await client_registry.get_session(), **kwargs)
 
     async def get_session(self):
         """Get or create an aiohttp ClientSession."""
         if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession()
+            if not self._owns_session:
+                self._session = await client_registry.get_session()
+            else:
+                self._session = aiohttp.ClientSession()
         return self._session
 
     async def close(self):
-        """Close the client session if it exists."""
+        """Close the client session if this client owns it."""
+        if not self._owns_session:
+            return
         if self._session and not self._session.closed:
             await self._session.close()
             self._session = None
@@ -251,15 +495,47 @@ class AsyncOpenRouterAI:
 
             payload = {
                 "model": model,
-                "messages": messages,
+                "messages": add_cache_breakpoints(model, messages),
                 "stream": stream,
                 "include_reasoning": include_reasoning,
                 **kwargs,
             }
+            if stream:
+                # Ask for token usage (including cached tokens) in the final chunk
+                payload.setdefault("usage", {"include": True})
 
             session = await self.client.get_session()
-            try:
+            policy = self.client.retry_policy
+
+            async def send() -> Tuple[aiohttp.ClientResponse, bytes]:
+                """One try of the request; raises UpstreamError on an error status."""
                 response = await session.post(url, headers=headers, json=payload)
+                try:
+                    if response.status >= 400:
+                        raise UpstreamError(
+                            response.status,
+                            (await response.text())[:500],
+                            parse_retry_after(response.headers.get("Retry-After")),
+                        )
+                    if not stream:
+                        return response, b""
+                    # The first bytes show the upstream has actually started streaming
+                    return response, await response.content.readany()
+                except BaseException:
+                    await response.release()
+                    raise
+
+            async def discard(result: Tuple[aiohttp.ClientResponse, bytes]):
+                await result[0].release()
+
+            upstream_stats.requests += 1
+            try:
+                if stream:
+                    response, prefix = await hedged(
+                        lambda: with_retries(send, policy), policy, discard
+                    )
+                else:
+                    response, prefix = await with_retries(send, policy)
 
                 if not stream:
                     try:
@@ -270,14 +546,29 @@ class AsyncOpenRouterAI:
                         await response.release()
 
                 # For streaming, return StreamProcessor which will handle cleanup
-                return await StreamProcessor(response, self.client).start()
+                return await StreamProcessor(response, self.client, prefix).start()
 
             except Exception as e:
-                # Ensure session is closed on error
+                upstream_stats.failures += 1
+                # Ensure an owned session is closed on error (shared sessions stay pooled)
                 await self.client.close()
                 raise
 
 
+async def complete_text(model: str, messages: List[Dict[str, str]], **kwargs) -> str:
+    """Non-streaming completion through the pooled client, e.g. for chat summaries."""
+    client = await AsyncOpenRouterAI.from_pool(api_key=os.getenv("OPENROUTER_API_KEY"))
+    try:
+        completion = await client.chat.completions.create(
+            model=model, messages=messages, **kwargs
+        )
+        if not completion.choices:
+            return ""
+        return completion.choices[0].message.content or ""
+    finally:
+        await client.close()
+
+
 class State(rx.State):
     # -------------------------------------------------------------------------
     # Existing state fields, events, and computed vars…
@@ -287,6 +578,8 @@ class State(rx.State):
     _project_chats: List[Chat] = []
     current_project_id: Optional[int] = None
     current_chat_id: Optional[int] = None
+    # Bumped after writes to recompute the vars showing rows from `row_cache`
+    _row_version: int = 0
 
     show_project_modal: bool = False
     show_chat_modal: bool = False
@@ -299,72 +592,168 @@ class State(rx.State):
     answer: str = ""  # For editing assistant content
     reasoning: str = ""  # For editing assistant reasoning
 
-    def load_messages(self):
-        """Load messages from database into state."""
+    async def load_messages(self):
+        """Load the latest page of messages from the database into state."""
         if self.current_chat_id is None:
-            self.messages = []
+            self._set_window([])
             return
 
-        with rx.session() as session:
-            chat = session.get(Chat, self.current_chat_id)
-            if chat and chat.messages:
-                self.messages = [
-                    UIMessage(
-                        role=msg.role, content=msg.content, reasoning=msg.reasoning
-                    )
-                    for msg in chat.messages
-                ]
-            else:
-                self.messages = []
+        async with unit_of_work.session() as session:
+            page = await session.run_sync(self._load_latest_window)
+            self.fanout_slots = await session.run_sync(self._load_fanout_slots, page)
+            self.context_estimate = await session.run_sync(self._context_estimate)
+
+    def _set_window(self, page: List[Message], has_newer: bool = False):
+        """Show `page`, a contiguous run of the conversation, as `messages`."""
+        self.messages = [ui_message(msg) for msg in page]
+        self.window_start = page[0].seq if page else 0
+        self.has_older_messages = self.window_start > 0
+        self.has_newer_messages = has_newer
+        # Editing indexes point into the previous window
+        self.editing_user_message_index = None
+        self.editing_assistant_content_index = None
+        self.editing_assistant_reasoning_index = None
+
+    def _load_latest_window(
+        self, session, exclude_id: Optional[int] = None
+    ) -> List[Message]:
+        """Show the latest page, without the in-progress message `exclude_id`."""
+        page = [
+            msg
+            for msg in page_before(
+                session, self.current_chat_id, None, MESSAGE_PAGE_SIZE
+            )
+            if msg.id != exclude_id
+        ]
+        self._set_window(page)
+        return page
+
+    @rx.event
+    @unit_of_work.per_event
+    async def load_older_messages(self):
+        """Prepend the page before the window, dropping the newest beyond the window size."""
+        if self.current_chat_id is None or not self.has_older_messages:
+            return
+        page = await unit_of_work.run(
+            page_before, self.current_chat_id, self.window_start, MESSAGE_PAGE_SIZE
+        )
+        if not page:
+            self.has_older_messages = False
+            return
+        messages = [ui_message(msg) for msg in page] + self.messages
+        self.window_start = page[0].seq
+        self.has_older_messages = self.window_start > 0
+        if len(messages) > MESSAGE_WINDOW_SIZE:
+            messages = messages[:MESSAGE_WINDOW_SIZE]
+            self.has_newer_messages = True
+            self.fanout_slots = []  # They belong to the latest turn, now out of the window
+        self.messages = messages
+        self.editing_user_message_index = None
+        self.editing_assistant_content_index = None
+        self.editing_assistant_reasoning_index = None
+
+    @rx.event
+    @unit_of_work.per_event
+    async def load_newer_messages(self):
+        """Append the page after the window, dropping the oldest beyond the window size."""
+        if self.current_chat_id is None or not self.has_newer_messages:
+            return
+        last_seq = self.window_start + len(self.messages) - 1
+        async with unit_of_work.session() as session:
+            # One extra row tells whether there is more after this page
+            page = await session.run_sync(
+                page_after, self.current_chat_id, last_seq, MESSAGE_PAGE_SIZE + 1
+            )
+            self.has_newer_messages = len(page) > MESSAGE_PAGE_SIZE
+            page = page[:MESSAGE_PAGE_SIZE]
+            if not self.has_newer_messages:
+                self.fanout_slots = await session.run_sync(
+                    self._load_fanout_slots, page
+                )
+        messages = self.messages + [ui_message(msg) for msg in page]
+        if len(messages) > MESSAGE_WINDOW_SIZE:
+            self.window_start += len(messages) - MESSAGE_WINDOW_SIZE
+            messages = messages[-MESSAGE_WINDOW_SIZE:]
+        self.has_older_messages = self.window_start > 0
+        self.messages = messages
+        self.editing_user_message_index = None
+        self.editing_assistant_content_index = None
+        self.editing_assistant_reasoning_index = None
+
+    def _load_fanout_slots(self, session, messages: List[Message]) -> List[FanoutSlot]:
+        """Build slots for the sibling responses to the latest user message, if any."""
+        last_user = next((m for m in reversed(messages) if m.role == "user"), None)
+        if last_user is None:
+            return []
+        siblings = session.exec(
+            select(Message)
+            .where(Message.reply_to_id == last_user.id)
+            .order_by(Message.id)
+        ).all()
+        if len(siblings) < 2:
+            return []
+        return [
+            FanoutSlot(
+                model=m.model or "",
+                message_id=m.id,
+                content=m.content or "",
+                reasoning=m.reasoning or "",
+                status=m.status,
+                is_active=m.is_active,
+            )
+            for m in siblings
+        ]
+
+    @rx.event
+    @unit_of_work.per_event
+    async def promote_response(self, message_id: int):
+        """Make a sibling response the one that continues the conversation."""
+        if self.processing:
+            return
+        if await db_writer.submit(
+            writes.promote_response, self.current_chat_id, message_id
+        ):
+            await self.load_messages()
 
     # -------------------------------------------------------------------------
     # Editing Events (using current_chat messages via the ORM)
     # -------------------------------------------------------------------------
 
     @rx.event
-    def start_editing_user_message(self, index: int):
+    @unit_of_work.per_event
+    async def start_editing_user_message(self, index: int):
         """Start editing a user message from the current chat."""
         if self.current_chat_id is None:
             return
-        with rx.session() as session:
-            chat = session.get(Chat, self.current_chat_id)
-            if not chat or index < 0 or index >= len(chat.messages):
-                return
-            msg = chat.messages[index]
-            if msg.role != "user":
-                return
-            self.editing_user_message_index = index
-            self.question = msg.content or ""
+        msg = await unit_of_work.run(message_at, self.current_chat_id, self.window_start + index)
+        if not msg or msg.role != "user":
+            return
+        self.editing_user_message_index = index
+        self.question = msg.content or ""
 
     @rx.event
-    def start_editing_assistant_content(self, index: int):
+    @unit_of_work.per_event
+    async def start_editing_assistant_content(self, index: int):
         """Start editing the assistant's content message."""
         if self.current_chat_id is None:
             return
-        with rx.session() as session:
-            chat = session.get(Chat, self.current_chat_id)
-            if not chat or index < 0 or index >= len(chat.messages):
-                return
-            msg = chat.messages[index]
-            if msg.role != "assistant":
-                return
-            self.editing_assistant_content_index = index
-            self.answer = msg.content or ""
+        msg = await unit_of_work.run(message_at, self.current_chat_id, self.window_start + index)
+        if not msg or msg.role != "assistant":
+            return
+        self.editing_assistant_content_index = index
+        self.answer = msg.content or ""
 
     @rx.event
-    def start_editing_assistant_reasoning(self, index: int):
+    @unit_of_work.per_event
+    async def start_editing_assistant_reasoning(self, index: int):
         """Start editing the assistant's reasoning."""
         if self.current_chat_id is None:
             return
-        with rx.session() as session:
-            chat = session.get(Chat, self.current_chat_id)
-            if not chat or index < 0 or index >= len(chat.messages):
-                return
-            msg = chat.messages[index]
-            if msg.role != "assistant":
-                return
-            self.editing_assistant_reasoning_index = index
-            self.reasoning = msg.reasoning or ""
+        msg = await unit_of_work.run(message_at, self.current_chat_id, self.window_start + index)
+        if not msg or msg.role != "assistant":
+            return
+        self.editing_assistant_reasoning_index = index
+        self.reasoning = msg.reasoning or ""
 
     @rx.event
     def cancel_editing(self):
@@ -377,85 +766,69 @@ class State(rx.State):
         self.reasoning = ""
 
     @rx.event(background=True)
+    @unit_of_work.per_event
     async def delete_message(self, index: int):
         """Delete a specific message from the current chat."""
         async with self:
             if self.current_chat_id is None:
                 return
 
-            with rx.session() as session:
-                chat = session.get(Chat, self.current_chat_id)
-                if not chat or index < 0 or index >= len(chat.messages):
-                    return
-
-                msg = chat.messages[index]
-                # If deleting user message, also delete the assistant's response
-                if msg.role == "user" and index + 1 < len(chat.messages):
-                    session.delete(chat.messages[index + 1])
-                session.delete(msg)
-
-                # Update chat timestamp
-                chat.updated_at = datetime.now(timezone.utc)
-                session.add(chat)
-                session.commit()
+            # Deleting a user message also deletes the assistant's response
+            if not await db_writer.submit(
+                writes.delete_message_at,
+                self.current_chat_id,
+                self.window_start + index,
+            ):
+                return
 
             # Update the messages in state
-            self.load_messages()
+            await self.load_messages()
 
     @rx.event
+    @unit_of_work.per_event
     async def update_user_message(self):
         """Update an existing user message and regenerate the assistant's answer."""
         if self.editing_user_message_index is None or not self.question.strip():
             return
 
         # Update user message in DB and remove subsequent messages
-        with rx.session() as session:
-            chat = session.get(Chat, self.current_chat_id)
-            if not chat or self.editing_user_message_index >= len(chat.messages):
-                return
-            user_msg = chat.messages[self.editing_user_message_index]
-            if user_msg.role != "user":
-                return
-            user_msg.content = self.question
-            session.add(user_msg)
-            session.commit()
-
-            # Remove all messages after this user message
-            for msg in chat.messages[self.editing_user_message_index + 1 :]:
-                session.delete(msg)
-            session.commit()
+        await db_writer.submit(
+            writes.edit_message,
+            self.current_chat_id,
+            self.window_start + self.editing_user_message_index,
+            role="user",
+            content=self.question,
+            truncate=True,
+        )
 
     @rx.event
-    def update_assistant_content(self):
+    @unit_of_work.per_event
+    async def update_assistant_content(self):
         """Update the assistant's content message."""
         if self.editing_assistant_content_index is None or not self.answer.strip():
             return
-        with rx.session() as session:
-            chat = session.get(Chat, self.current_chat_id)
-            if not chat or self.editing_assistant_content_index >= len(chat.messages):
-                return
-            msg = chat.messages[self.editing_assistant_content_index]
-            if msg.role != "assistant":
-                return
-            msg.content = self.answer
-            session.add(msg)
-            session.commit()
+        await db_writer.submit(
+            writes.edit_message,
+            self.current_chat_id,
+            self.window_start + self.editing_assistant_content_index,
+            role="assistant",
+            content=self.answer,
+        )
 
     @rx.event
-    def update_assistant_reasoning(self):
+    @unit_of_work.per_event
+    async def update_assistant_reasoning(self):
         """Update the assistant's reasoning with the new value in `reasoning`."""
         if self.editing_assistant_reasoning_index is None or not self.reasoning.strip():
             return
-        with rx.session() as session:
-            chat = session.get(Chat, self.current_chat_id)
-            if not chat or self.editing_assistant_reasoning_index >= len(chat.messages):
-                return
-            msg = chat.messages[self.editing_assistant_reasoning_index]
-            if msg.role != "assistant":
-                return
-            msg.reasoning = self.reasoning
-            session.add(msg)
-            session.commit()
+        if not await db_writer.submit(
+            writes.edit_message,
+            self.current_chat_id,
+            self.window_start + self.editing_assistant_reasoning_index,
+            role="assistant",
+            reasoning=self.reasoning,
+        ):
+            return
         self.editing_assistant_reasoning_index = None
         self.reasoning = ""
 
@@ -464,40 +837,73 @@ class State(rx.State):
         """Get list of all projects ordered by last update."""
         return self._projects
 
+    def _rows_changed(self, model: type, row_id: Optional[int] = None):
+        """Drop rows this event wrote from `row_cache`; all rows of `model` if no id."""
+        if row_id is None:
+            row_cache.invalidate_all(model)
+        else:
+            row_cache.invalidate(model, row_id)
+        self._row_version += 1
+
+    async def _load_rows(self):
+        """Load the rows the computed vars below show into `row_cache`.
+
+        Called by handlers after they change the selection or write a row, so
+        recomputing the vars on the event loop finds the rows cached.
+        """
+        for model, row_id, loader in (
+            (Project, self.current_project_id, get_project),
+            (Chat, self.current_chat_id, get_chat),
+            (Project, self.project_to_edit, get_project_with_knowledge),
+            (Chat, self.chat_to_edit, get_chat),
+        ):
+            if row_id is not None:
+                await row_cache.load(model, row_id, loader)
+
     @rx.var
     def current_project(self) -> Optional[Project]:
         """Get the currently selected project."""
+        _ = self._row_version
         if self.current_project_id is None:
             return None
-        with rx.session() as session:
-            return session.get(Project, self.current_project_id)
+        return row_cache.get(Project, self.current_project_id, get_project)
 
     @rx.var
     def current_chat(self) -> Optional[Chat]:
         """Get the currently selected chat."""
+        _ = self._row_version
         if self.current_chat_id is None:
             return None
-        with rx.session() as session:
-            return session.get(Chat, self.current_chat_id)
+        return row_cache.get(Chat, self.current_chat_id, get_chat)
 
     @rx.var
     def project_chats(self) -> List[Chat]:
         """Get chats for current project."""
         return self._project_chats
 
-    def load_project_chats(self):
+    async def load_project_chats(self):
         """Load project chats ordered by last update."""
+        sidebar_cache.subscribe(
+            self.router.session.client_token, self.current_project_id
+        )
         if self.current_project_id is None:
             self._project_chats = []
         else:
-            with rx.session() as session:
-                self._project_chats = session.exec(
-                    select(Chat)
-                    .where(Chat.project_id == self.current_project_id)
-                    .order_by(desc(Chat.updated_at))
-                ).all()
+            self._project_chats = await sidebar_cache.get(
+                project_chats_key(self.current_project_id),
+                list_project_chats,
+                self.current_project_id,
+            )
+
+    async def _refresh_sidebar(self, projects: bool, chats: bool):
+        """Reload the sidebar lists a write in any session changed."""
+        if projects:
+            await self.load_projects()
+        if chats:
+            await self.load_project_chats()
 
     @rx.event
+    @unit_of_work.per_event
     async def handle_project_route(self):
         """Handle project route params."""
         project_id = int(self.router.page.params.get("project_id", 0))
@@ -505,6 +911,7 @@ class State(rx.State):
             await self.select_project(project_id)
 
     @rx.event
+    @unit_of_work.per_event
     async def handle_chat_route(self):
         """Handle chat route params."""
         project_id = int(self.router.page.params.get("project_id", 0))
@@ -515,12 +922,13 @@ class State(rx.State):
             await self.select_chat(chat_id)
 
     @rx.event
-    def load_projects(self):
+    @unit_of_work.per_event
+    async def load_projects(self):
         """Load all projects from the database ordered by last update."""
-        with rx.session() as session:
-            self._projects = session.exec(
-                select(Project).order_by(desc(Project.updated_at))
-            ).all()
+        sidebar_cache.subscribe(
+            self.router.session.client_token, self.current_project_id
+        )
+        self._projects = await sidebar_cache.get(PROJECTS, list_projects)
 
     @rx.event
     def toggle_project_modal(self):
@@ -556,80 +964,73 @@ class State(rx.State):
         self.show_knowledge_base = not self.show_knowledge_base
 
     @rx.event
+    @unit_of_work.per_event
     async def create_project(self, form_data: dict):
         """Create a new project."""
-        with rx.session() as session:
-            # Create new project
-            project = Project(
-                name=form_data["name"],
-                description=form_data.get("description", ""),
-                system_instructions=form_data.get("system_instructions", ""),
-            )
-            session.add(project)
-            session.commit()
-            session.refresh(project)
-
-            # Update current project
-            self.current_project_id = project.id
+        project_id = await db_writer.submit(
+            writes.save_project,
+            None,
+            form_data["name"],
+            form_data.get("description", ""),
+            form_data.get("system_instructions", ""),
+        )
+
+        # Update current project
+        self.current_project_id = project_id
 
         # Close modal and reload projects
         self.show_project_modal = False
-        self.load_project_chats()
-        self.load_projects()
-        return rx.redirect(f"/projects/{project.id}")
+        await self.load_project_chats()
+        await self.load_projects()
+        await self._load_rows()
+        return rx.redirect(f"/projects/{project_id}")
 
     @rx.event
+    @unit_of_work.per_event
     async def create_chat(self, form_data: dict):
         """Create a new chat."""
         if not self.current_project_id:
             return
 
-        with rx.session() as session:
-            chat = Chat(name=form_data["name"], project_id=self.current_project_id)
-            session.add(chat)
-            session.commit()
-            session.refresh(chat)
+        chat_id = await db_writer.submit(
+            writes.save_chat, None, self.current_project_id, form_data["name"]
+        )
 
-            # Set as current chat
-            self.current_chat_id = chat.id
+        # Set as current chat
+        self.current_chat_id = chat_id
 
         # Close modal and refresh chats
         self.show_chat_modal = False
-        self.load_project_chats()
-        return rx.redirect(f"/projects/{self.current_project_id}/chats/{chat.id}")
+        await self.load_project_chats()
+        await self._load_rows()
+        return rx.redirect(f"/projects/{self.current_project_id}/chats/{chat_id}")
 
     @rx.event
+    @unit_of_work.per_event
     async def select_project(self, project_id: int):
         """Select a project."""
 
         self.current_project_id = project_id
         self.current_chat_id = None  # Clear selected chat
-        self.load_project_chats()
-        return self.load_projects()
+        await self.load_project_chats()
+        await self.load_projects()
+        await self._load_rows()
 
     @rx.event
+    @unit_of_work.per_event
     async def send_message(self):
         """Send a chat message."""
         if not self.message.strip() or not self.current_chat_id:
             return
 
-        with rx.session() as session:
-            # Add the message
-            message = Message(
-                role="user", content=self.message, chat_id=self.current_chat_id
-            )
-            session.add(message)
-
-            # Update the chat's timestamp
-            chat = session.get(Chat, self.current_chat_id)
-            chat.updated_at = datetime.now(timezone.utc)
-            session.add(chat)
-
-            session.commit()
+        # Add the message and update the chat's timestamp
+        await db_writer.submit(
+            writes.append_user_message, self.current_chat_id, self.message
+        )
 
         # Clear the input and refresh chats to update order
         self.message = ""
-        self.load_project_chats()
+        await self.load_project_chats()
 
     # Project modal state
     show_project_modal: bool = False
@@ -644,83 +1045,56 @@ class State(rx.State):
     def project_to_edit_data(self) -> Optional[Project]:
         """Get the project being edited with its knowledge documents eagerly loaded."""
 
-        # Adding a dependency to force recomputation. This enables re-render after uploading a new document
-        _ = self.doc_list_version
+        # Recomputed after writes, e.g. to show a newly uploaded document
+        _ = self._row_version
 
         if self.project_to_edit is None:
             return None
-        with rx.session() as session:
-            statement = (
-                select(Project)
-                .options(selectinload(Project.knowledge))
-                .where(Project.id == self.project_to_edit)
-            )
-            return session.exec(statement).first()
+        return row_cache.get(Project, self.project_to_edit, get_project_with_knowledge)
 
     @rx.event
-    def handle_project_submit(self, form_data: dict):
+    @unit_of_work.per_event
+    async def handle_project_submit(self, form_data: dict):
         """Handle project form submission - create or edit."""
-        with rx.session() as session:
-            was_editing = self.project_to_edit  # Store edit state
-            project_id = self.project_to_edit  # Store project id being edited
-
-            if self.project_to_edit:
-                # Edit existing project
-                project = session.get(Project, self.project_to_edit)
-                if project:
-                    project.name = form_data["name"]
-                    project.description = form_data.get("description", "")
-                    project.system_instructions = form_data.get(
-                        "system_instructions", ""
-                    )
-                    project.updated_at = datetime.now(timezone.utc)
-                    session.add(project)
-                    session.commit()
-                    # Update current project if editing current
-                    if self.current_project_id == project.id:
-                        self.current_project_id = project.id
-            else:
-                # Create new project
-                project = Project(
-                    name=form_data["name"],
-                    description=form_data.get("description", ""),
-                    system_instructions=form_data.get("system_instructions", ""),
-                )
-                session.add(project)
-                session.commit()
-                session.refresh(project)
-                # Register pending documents for the new project
-                for pending in self.pending_documents:
-                    document = Document(
-                        project_id=project.id,
-                        name=pending.get("name", ""),
-                        content=pending.get("content", ""),
-                        type=pending.get("type", "text"),
-                    )
-                    session.add(document)
-                session.commit()
-                # Set as current project
-                self.current_project_id = project.id
+        was_editing = self.project_to_edit  # Store edit state
+        project_id = self.project_to_edit  # Store project id being edited
+
+        # Edit the existing project, or create one with the pending documents
+        saved_id = await db_writer.submit(
+            writes.save_project,
+            self.project_to_edit or None,
+            form_data["name"],
+            form_data.get("description", ""),
+            form_data.get("system_instructions", ""),
+            [] if self.project_to_edit else list(self.pending_documents),
+        )
+        self._rows_changed(Project, saved_id)
+        if not was_editing:
+            # Set as current project
+            self.current_project_id = saved_id
 
         # Clear form data (including pending documents)
         self.clear_project_form()
-        self.load_project_chats()
-        self.load_projects()
+        await self.load_project_chats()
+        await self.load_projects()
+        await self._load_rows()
 
         # Redirect appropriately
         if not was_editing:
-            return rx.redirect(f"/projects/{project.id}")
+            return rx.redirect(f"/projects/{saved_id}")
         else:
             return rx.redirect(f"/projects/{project_id}")
 
     @rx.event
+    @unit_of_work.per_event
     async def delete_project(self, project_id: int):
         """Delete a project."""
-        with rx.session() as session:
-            project = session.get(Project, project_id)
-            if project:
-                session.delete(project)
-                session.commit()
+        await db_writer.submit(writes.delete_project, project_id)
+        self._rows_changed(Project, project_id)
+        self._rows_changed(Chat)
+        prompt_cache.invalidate(project_id)
+        if RETRIEVAL_INDEXES:
+            await asyncio.to_thread(drop_project_indexes, project_id)
 
         # Clear current if deleted
         if project_id == self.current_project_id:
@@ -728,13 +1102,15 @@ class State(rx.State):
             self.current_chat_id = None
 
         # Reload and redirect
-        self.load_projects()
+        await self.load_projects()
+        await self._load_rows()
         return rx.redirect("/projects")
 
     @rx.event
     async def set_project_to_edit(self, project_id: int):
         """Set which project to edit."""
         self.project_to_edit = project_id
+        await self._load_rows()
 
     # Form data state
     project_name: str = ""
@@ -765,10 +1141,10 @@ class State(rx.State):
     @rx.var
     def chat_to_edit_data(self) -> Optional[Chat]:
         """Get the chat being edited."""
+        _ = self._row_version
         if self.chat_to_edit is None:
             return None
-        with rx.session() as session:
-            return session.get(Chat, self.chat_to_edit)
+        return row_cache.get(Chat, self.chat_to_edit, get_chat)
 
     def toggle_chat_modal(self):
         """Toggle the chat modal."""
@@ -793,63 +1169,51 @@ class State(rx.State):
     async def set_chat_to_edit(self, chat_id: int):
         """Set which chat to edit."""
         self.chat_to_edit = chat_id
+        await self._load_rows()
 
     @rx.event
+    @unit_of_work.per_event
     async def handle_chat_submit(self, form_data: dict):
         """Handle chat form submission - create or edit."""
-        with rx.session() as session:
-            if self.chat_to_edit:
-                # Edit existing chat
-                chat = session.get(Chat, self.chat_to_edit)
-                if chat:
-                    chat.name = form_data["name"]
-                    chat.updated_at = datetime.now(timezone.utc)
-                    session.add(chat)
-                    session.commit()
-                    # Update current chat if editing current
-                    if self.current_chat_id == chat.id:
-                        self.current_chat_id = chat.id
-            else:
-                # Create new chat
-                chat = Chat(
-                    name=form_data["name"],
-                    project_id=self.current_project_id,
-                )
-                session.add(chat)
-                session.commit()
-                session.refresh(chat)
-                # Set as current chat
-                self.current_chat_id = chat.id
+        # Rename the existing chat, or create a new one
+        chat_id = await db_writer.submit(
+            writes.save_chat,
+            self.chat_to_edit or None,
+            self.current_project_id,
+            form_data["name"],
+        )
+        self._rows_changed(Chat, chat_id)
+        if not self.chat_to_edit:
+            # Set as current chat
+            self.current_chat_id = chat_id
 
-            # Clear form data
-            self.chat_name = ""
+        # Clear form data
+        self.chat_name = ""
 
-            # Close modal and reload
-            self.show_chat_modal = False
-            self.chat_to_edit = None
-            self.load_project_chats()
+        # Close modal and reload
+        self.show_chat_modal = False
+        self.chat_to_edit = None
+        await self.load_project_chats()
+        await self._load_rows()
 
-            # Redirect if creating new
-            if not self.chat_to_edit:
-                return rx.redirect(
-                    f"/projects/{self.current_project_id}/chats/{chat.id}"
-                )
+        # Redirect if creating new
+        if not self.chat_to_edit:
+            return rx.redirect(f"/projects/{self.current_project_id}/chats/{chat_id}")
 
     @rx.event
+    @unit_of_work.per_event
     async def delete_chat(self, chat_id: int):
         """Delete a chat."""
-        with rx.session() as session:
-            chat = session.get(Chat, chat_id)
-            if chat:
-                session.delete(chat)
-                session.commit()
+        await db_writer.submit(writes.delete_chat, chat_id)
+        self._rows_changed(Chat, chat_id)
 
         # Clear current if deleted
         if chat_id == self.current_chat_id:
             self.current_chat_id = None
 
         # Reload and redirect to project
-        self.load_project_chats()
+        await self.load_project_chats()
+        await self._load_rows()
         return rx.redirect(f"/projects/{self.current_project_id}")
 
     doc_list_version: int = 0
@@ -861,15 +1225,22 @@ class State(rx.State):
     doc_list_version: int = 0  # Add this version counter
 
     @rx.event
+    @unit_of_work.per_event
     async def delete_document(self, doc_id: int):
         """Delete a document from the knowledge base."""
-        with rx.session() as session:
-            document = session.get(Document, doc_id)
-            if document and document.project_id == self.current_project_id:
-                session.delete(document)
-                session.commit()
-                # Increment version to trigger re-render after delete
-                self.doc_list_version += 1
+        project_id = self.current_project_id
+        deleted, version = await db_writer.submit(
+            writes.delete_document, doc_id, project_id
+        )
+        if deleted:
+            self._rows_changed(Project, project_id)
+            if RETRIEVAL_INDEXES:
+                await asyncio.to_thread(
+                    index_document_deleted, project_id, version, doc_id
+                )
+            # Increment version to trigger re-render after delete
+            self.doc_list_version += 1
+            await self._load_rows()
 
     # Document form state
     document_to_edit_id: Optional[int] = None
@@ -898,31 +1269,30 @@ class State(rx.State):
         self.document_content = ""
 
     @rx.event
+    @unit_of_work.per_event
     async def handle_document_submit(self):
         """Handle document form submission."""
         # If editing an existing project, write to the database
         if self.project_to_edit:
-            with rx.session() as session:
-                if self.document_to_edit_id:
-                    document = session.get(Document, self.document_to_edit_id)
-                    if document:
-                        document.name = self.document_name
-                        document.content = self.document_content
-                        document.updated_at = datetime.now(timezone.utc)
-                        session.add(document)
-                        session.commit()
-                else:
-                    document = Document(
-                        project_id=self.project_to_edit,
-                        name=self.document_name,
-                        content=self.document_content,
-                        type="text",
+            saved = await db_writer.submit(
+                writes.save_document,
+                self.document_to_edit_id or None,
+                self.project_to_edit,
+                self.document_name,
+                self.document_content,
+            )
+            if saved:
+                # Keep the retrieval index in step without a rebuild
+                version, document = saved
+                self._rows_changed(Project, document.project_id)
+                if RETRIEVAL_INDEXES:
+                    await asyncio.to_thread(
+                        index_document_saved, document.project_id, version, document
                     )
-                    session.add(document)
-                    session.commit()
             # Trigger a re-render if needed.
             self.doc_list_version += 1
             self.clear_document_form()
+            await self._load_rows()
         else:
             # For new projects, add document info to pending_documents
             self.pending_documents.append(
@@ -959,23 +1329,24 @@ class State(rx.State):
     # Chat state
     _temp_messages: List[UIMessage] = []  # Temporary list for streaming
     previous_keydown_character: str = ""
-    messages: List[UIMessage] = []  # For UI display
+    messages: List[UIMessage] = []  # For UI display: a window of the conversation
+    window_start: int = 0  # Position (Message.seq) of messages[0]
+    has_older_messages: bool = False
+    has_newer_messages: bool = False
     ui_messages: list[UIMessage] = []
     current_question: str = ""
     model: str = "mistralai/codestral-2501"
     processing: bool = False
-
-    @rx.var
-    def chat_messages(self) -> List[Message]:
-        """Get messages for current chat from database."""
-        if self.current_chat_id is None:
-            return []
-
-        with rx.session() as session:
-            chat = session.get(Chat, self.current_chat_id)
-            if chat:
-                return chat.messages
-        return []
+    # In-progress assistant message, kept out of `messages` while it streams
+    streaming: bool = False
+    stream_content: str = ""
+    stream_reasoning: str = ""
+    # Extra models to ask alongside `model`, and their responses for the latest turn
+    compare_models: List[str] = []
+    fanout_slots: List[FanoutSlot] = []
+    # Stored-token size of the project prompt and chat, and what the last send left out
+    context_estimate: int = 0
+    context_notice: str = ""
 
     # Editing state
     editing_user_message_index: Optional[int] = None
@@ -983,34 +1354,189 @@ class State(rx.State):
     editing_assistant_reasoning_index: Optional[int] = None
     edit_content: str = ""
 
-    def format_messages(self, messages) -> List[Dict[str, str]]:
-        """Format chat history with system prompt for the API."""
-        # Get current project and its documents
-        with rx.session() as session:
+    async def format_messages(
+        self, model: Optional[str] = None
+    ) -> List[Dict[str, str]]:
+        """Format the chat history with system prompt for the API within the model's budget.
+
+        History is read from the database rather than `messages`, which only
+        holds the window shown in the UI.
+        """
+        model = model or self.model
+        report = ContextReport(model=model, budget=CONTEXT_CONFIG.budget(model))
+        system_prompt, retrieval, chat_messages, skipped, summary = (
+            await unit_of_work.run(self._load_prompt, report)
+        )
+        if retrieval is not None:
+            # Index searches and rebuilds block; keep them off the event loop
+            system_prompt = await asyncio.to_thread(retrieval)
+            report.system_tokens = estimate_tokens(system_prompt)
+
+        if summary:
+            chat_messages.insert(
+                0,
+                {
+                    "role": "system",
+                    "content": f"Summary of the earlier conversation:\n{summary}",
+                    "tokens": estimate_tokens(summary),
+                },
+            )
+        history = fit_history(
+            chat_messages, report.budget - report.system_tokens, report
+        )
+        report.dropped_messages += skipped
+        self.context_notice = report.summary()
+        if report.trimmed:
+            print(f"Context trimmed: {report}")
+
+        if system_prompt is None:
+            return history
+        # Get messages with system prompt
+        return get_messages_with_system_prompt(history, system_prompt)
+
+    def _load_prompt(
+        self, session, report: ContextReport
+    ) -> Tuple[
+        Optional[str],
+        Optional[Callable[[], str]],
+        List[Dict[str, Any]],
+        int,
+        Optional[str],
+    ]:
+        """Read the system prompt, the history that fits and the chat summary.
+
+        Returns:
+            The system prompt (None without a project or with retrieval), the
+            blocking call building it from the retrieval indexes (None without
+            retrieval), the history messages, how many older messages were not
+            loaded, and the summary
+        """
+        retrieval = None
+        system_prompt = None
+        skipped = 0
+        # Turns folded into the chat summary are replaced by it
+        summary, covered = chat_summary(session, self.current_chat_id)
+        chat_messages = []
+        if self.current_chat_id is not None:
+            chat_messages, skipped = load_history(
+                session, self.current_chat_id, covered, report.budget
+            )
+        # Only the version is read on a cache hit
+        version = knowledge_version(session, self.current_project_id)
+        system_budget = int(report.budget * CONTEXT_CONFIG.max_document_share)
+        cached = None
+        if version is not None and RETRIEVAL_CONFIG.mode == "full":
+            cached = prompt_cache.get(self.current_project_id, version)
+        if cached is not None and cached.tokens <= system_budget:
+            system_prompt, report.system_tokens = cached.prompt, cached.tokens
+        elif version is not None and RETRIEVAL_CONFIG.mode != "full":
+            retrieval = self._retrieval_system_prompt(
+                session, version, chat_messages, system_budget
+            )
+        elif version is not None:
             # Get project with documents
             project = session.exec(
                 select(Project)
                 .options(selectinload(Project.knowledge))
                 .where(Project.id == self.current_project_id)
             ).first()
-
-            if not project:
-                return [
-                    {"role": msg.role, "content": msg.content}
-                    for msg in messages
-                    if msg.content
-                ]
-
-            # Get messages with system prompt
-            return get_messages_with_system_prompt(
-                chat_messages=[
-                    {"role": msg.role, "content": msg.content}
-                    for msg in messages
-                    if msg.content
-                ],
-                project_documents=project.knowledge,
-                system_instructions=project.system_instructions,
+            if project:
+                base_tokens = SYSTEM_TEMPLATE_TOKENS + estimate_tokens(
+                    project.system_instructions
+                )
+                documents, dropped = fit_documents(
+                    project.knowledge, system_budget, base_tokens
+                )
+                system_prompt = format_system_prompt(
+                    project.system_instructions, documents
+                )
+                report.system_tokens = estimate_tokens(system_prompt)
+                report.dropped_documents = [doc.name for doc in dropped]
+                # Only complete prompts are shared with other turns and models
+                if not dropped:
+                    prompt_cache.put(
+                        project.id,
+                        project.knowledge_version,
+                        system_prompt,
+                        report.system_tokens,
+                    )
+        return system_prompt, retrieval, chat_messages, skipped, summary
+
+    def _retrieval_system_prompt(
+        self,
+        session,
+        version: int,
+        chat_messages: List[Dict[str, Any]],
+        system_budget: int,
+    ) -> Optional[Callable[[], str]]:
+        """Blocking call building the system prompt from the most relevant chunks.
+
+        Only reads the database here; the documents are loaded only when an
+        index has to be rebuilt.
+        """
+        project = session.get(Project, self.current_project_id)
+        if not project:
+            return None
+        project_id, instructions = project.id, project.system_instructions
+        query = next(
+            (m["content"] for m in reversed(chat_messages) if m["role"] == "user"), ""
+        )
+        documents = None
+        if not all(i.is_current(project_id, version) for i in RETRIEVAL_INDEXES):
+            documents = list(project.knowledge)
+
+        def build() -> str:
+            ranked = search_documents(project_id, version, documents, query)
+            # Most relevant first, as long as they fit
+            used = SYSTEM_TEMPLATE_TOKENS + estimate_tokens(instructions)
+            chunks = []
+            for chunk in ranked:
+                if used + chunk.token_count > system_budget:
+                    break
+                chunks.append(chunk)
+                used += chunk.token_count
+            return format_system_prompt(instructions, chunks)
+
+        return build
+
+    async def _refresh_context_estimate(self):
+        """Recompute the stored-token size of the project prompt and chat history."""
+        self.context_estimate = await unit_of_work.run(self._context_estimate)
+
+    def _context_estimate(self, session) -> int:
+        """Stored-token size of the project prompt and chat history."""
+        tokens = SYSTEM_TEMPLATE_TOKENS + 2 * MESSAGE_OVERHEAD_TOKENS
+        project = (
+            session.get(Project, self.current_project_id)
+            if self.current_project_id is not None
+            else None
+        )
+        if project:
+            tokens += estimate_tokens(project.system_instructions)
+        # Both sums in one statement; each is 0 without a project or chat
+        stored = (
+            Message.chat_id == self.current_chat_id,
+            Message.is_active == True,
+            Message.content != None,
+        )
+        document_tokens, message_tokens, count = session.exec(
+            select(
+                select(func.coalesce(func.sum(Document.token_count), 0))
+                .where(Document.project_id == self.current_project_id)
+                .scalar_subquery(),
+                select(func.coalesce(func.sum(Message.token_count), 0))
+                .where(*stored)
+                .scalar_subquery(),
+                select(func.count(Message.id)).where(*stored).scalar_subquery(),
             )
+        ).one()
+        return tokens + document_tokens + message_tokens + count * MESSAGE_OVERHEAD_TOKENS
+
+    @rx.var
+    def prompt_size_label(self) -> str:
+        """Estimated size of the next prompt against the selected model's context."""
+        tokens = self.context_estimate + estimate_tokens(self.current_question)
+        return f"~{tokens:,} / {context_tokens(self.model):,} tokens"
 
     @rx.event(background=True)
     async def handle_action_bar_keydown(self, keydown_character: str):
@@ -1025,29 +1551,155 @@ class State(rx.State):
                 yield State.process_question
             self.previous_keydown_character = keydown_character
 
-    @rx.var
-    def chat_messages(self) -> List[UIMessage]:
-        """Get messages for current chat from database and convert to UIMessage objects."""
-        if self.current_chat_id is None:
-            return []
+    def _end_stream(self):
+        """Hide the in-progress message once it is part of `messages`."""
+        self.streaming = False
+        self.stream_content = ""
+        self.stream_reasoning = ""
+
+    async def _stream_reply(
+        self, processor, assistant_id: Optional[int], slot: Optional[int] = None
+    ) -> Tuple[str, str, str]:
+        """Stream a reply into the in-progress message, or into a fan-out slot.
+
+        Chunks are coalesced outside the state lock and pushed to the UI once per
+        flush of STREAM_FLUSH_POLICY rather than once per token. Only the
+        `stream_content`/`stream_reasoning` vars (or `fanout_slots`) change while
+        streaming, so each update never carries the chat history.
+        Partial text is checkpointed to the placeholder row per CHECKPOINT_POLICY.
+
+        Returns:
+            The full answer, the full reasoning and the final MessageStatus value
+        """
+        answer = TextAccumulator()
+        reasoning = TextAccumulator()
+        status = MessageStatus.COMPLETE
+        checkpointer = ResponseCheckpointer(assistant_id, CHECKPOINT_POLICY)
+        if slot is None:
+            async with self:
+                self.stream_content = ""
+                self.stream_reasoning = ""
+                self.streaming = True
+
+        try:
+            deltas = coalesce_chunks(
+                processor, STREAM_FLUSH_POLICY, content=answer, reasoning=reasoning
+            )
+            async with contextlib.aclosing(deltas):
+                async for delta in deltas:
+                    if delta.error:
+                        raise RuntimeError(delta.error)
+                    # Stop if processing was canceled
+                    if not self.processing:
+                        status = MessageStatus.ABORTED
+                        break
 
-        with rx.session() as session:
-            chat = session.get(Chat, self.current_chat_id)
-            if chat and chat.messages:
-                # Convert DB messages to UIMessage objects
-                return [
-                    UIMessage(
-                        role=msg.role, content=msg.content, reasoning=msg.reasoning
+                    async with self:
+                        if slot is not None:
+                            slots = self.fanout_slots[:]  # Create a copy
+                            slots[slot].content += delta.content
+                            slots[slot].reasoning += delta.reasoning
+                            self.fanout_slots = slots
+                        else:
+                            # Append only the new text to the in-progress message
+                            if delta.content:
+                                self.stream_content += delta.content
+                            if delta.reasoning:
+                                self.stream_reasoning += delta.reasoning
+
+                    checkpointer.maybe_checkpoint(answer, reasoning)
+        finally:
+            await checkpointer.drain()
+
+        return answer.getvalue(), reasoning.getvalue(), status.value
+
+    def _selected_models(self) -> List[str]:
+        """The main model followed by any distinct models picked for comparison."""
+        return [self.model] + [m for m in self.compare_models if m != self.model]
+
+    async def _generate_into_slot(
+        self, slot: int, model: str, assistant_id: int, messages_for_api: list
+    ):
+        """Stream one model's answer into its slot and persist it; never raises."""
+        client = await AsyncOpenRouterAI.from_pool(
+            api_key=os.getenv("OPENROUTER_API_KEY")
+        )
+        processor = None
+        try:
+            processor = await client.chat.completions.create(
+                model=model,
+                messages=messages_for_api,
+                stream=True,
+                include_reasoning=True,
+            )
+            answer, reasoning, status = await self._stream_reply(
+                processor, assistant_id, slot=slot
+            )
+        except Exception as e:
+            answer, reasoning = f"Error: {str(e)}", None
+            status = MessageStatus.ERROR.value
+        finally:
+            await client.close()
+
+        try:
+            await db_writer.submit(
+                writes.finish_reply,
+                assistant_id,
+                answer,
+                reasoning,
+                status,
+                processor and processor.usage,
+            )
+        except Exception as e:
+            print(f"Error saving response: {str(e)}")
+
+        async with self:
+            slots = self.fanout_slots[:]
+            slots[slot].content = answer
+            slots[slot].reasoning = reasoning or ""
+            slots[slot].status = status
+            self.fanout_slots = slots
+
+    async def _fan_out(
+        self, models: List[str], assistant_ids: List[int], messages_for_api: list
+    ):
+        """Send the same prompt to several models concurrently, one slot each.
+
+        All requests share the pooled HTTP session, so wall time is roughly that
+        of the slowest model. The first model's response is the active one.
+        """
+        async with self:
+            self.fanout_slots = [
+                FanoutSlot(model=model, message_id=assistant_id, is_active=i == 0)
+                for i, (model, assistant_id) in enumerate(zip(models, assistant_ids))
+            ]
+
+        try:
+            await asyncio.gather(
+                *(
+                    self._generate_into_slot(i, model, assistant_id, messages_for_api)
+                    for i, (model, assistant_id) in enumerate(
+                        zip(models, assistant_ids)
                     )
-                    for msg in chat.messages
-                ]
-        return []
+                )
+            )
+        finally:
+            async with self:
+                await db_writer.submit(writes.touch_chat, self.current_chat_id)
+                await self.load_messages()
+                self.processing = False
+                summarizer.schedule(self.current_chat_id)
 
-    def load_chat_messages(self):
-        """Load messages from database into state."""
-        self.messages = self.chat_messages
+    @rx.event
+    def toggle_compare_model(self, model: str):
+        """Add or remove a model from the comparison set."""
+        if model in self.compare_models:
+            self.compare_models = [m for m in self.compare_models if m != model]
+        else:
+            self.compare_models = self.compare_models + [model]
 
     @rx.event(background=True)
+    @unit_of_work.per_event
     async def process_question(self):
         """Process message with AI and handle database storage."""
         if not self.current_question.strip():
@@ -1060,40 +1712,34 @@ class State(rx.State):
             message_text = self.current_question
             self.processing = True
             self.current_question = ""
-            answer = ""  # Initialize answer within context
-            reasoning = ""  # Initialize reasoning within context
-
-            # Get existing database messages and create new ones
-            with rx.session() as session:
-                chat = session.get(Chat, self.current_chat_id)
-                if not chat:
-                    return
-
-                # Add user message to database
-                user_msg = Message(
-                    role="user", content=message_text, chat_id=self.current_chat_id
-                )
-                session.add(user_msg)
-
-                # Create placeholder assistant message
-                assistant_msg = Message(role="assistant", chat_id=self.current_chat_id)
-                session.add(assistant_msg)
-                session.commit()
-                assistant_id = assistant_msg.id
-
-                # Load fresh messages
-                self.messages = [
-                    UIMessage(
-                        role=msg.role, content=msg.content, reasoning=msg.reasoning
-                    )
-                    for msg in chat.messages
-                ]
+            self.fanout_slots = []
+            models = self._selected_models()
+
+            # Add the user message and a placeholder assistant message per
+            # model; the first one is active
+            assistant_ids = await db_writer.submit(
+                writes.start_turn, self.current_chat_id, message_text, models
+            )
+            if assistant_ids is None:
+                return
+            assistant_id = assistant_ids[0]
+
+            # Load the latest page; the placeholder is shown as the in-progress message
+            await unit_of_work.run(self._load_latest_window, exclude_id=assistant_id)
+
+            # Prepare messages for API, within the budget of the smallest model
+            messages_for_api = await self.format_messages(
+                min(models, key=context_tokens)
+            )
 
-            # Prepare messages for API
-            messages_for_api = self.format_messages(self.messages)
+        if len(models) > 1:
+            await self._fan_out(models, assistant_ids, messages_for_api)
+            return
 
         # Process with AI
-        client = AsyncOpenRouterAI(api_key=os.getenv("OPENROUTER_API_KEY"))
+        client = await AsyncOpenRouterAI.from_pool(
+            api_key=os.getenv("OPENROUTER_API_KEY")
+        )
 
         try:
             processor = await client.chat.completions.create(
@@ -1103,82 +1749,54 @@ class State(rx.State):
                 include_reasoning=True,
             )
 
-            async for chunk in processor:
-                if not self.processing:
-                    break
-
-                async with self:
-                    # Update answer and reasoning within context
-                    if chunk.content:
-                        answer = answer + chunk.content if answer else chunk.content
-                    if chunk.reasoning:
-                        reasoning = (
-                            reasoning + chunk.reasoning
-                            if reasoning
-                            else chunk.reasoning
-                        )
-
-                    # Update last message with current progress
-                    messages = self.messages[:]  # Create a copy
-                    if messages:
-                        messages[-1].content = answer
-                        messages[-1].reasoning = reasoning
-                        self.messages = messages
+            answer, reasoning, status = await self._stream_reply(
+                processor, assistant_id
+            )
 
-            # After streaming completes, update database
+            # After streaming completes, update database and the chat timestamp
             async with self:
-                with rx.session() as session:
-                    assistant_msg = session.get(Message, assistant_id)
-                    if assistant_msg:
-                        assistant_msg.content = answer
-                        assistant_msg.reasoning = reasoning
-                        session.add(assistant_msg)
-
-                        # Update chat timestamp
-                        chat = session.get(Chat, self.current_chat_id)
-                        if chat:
-                            chat.updated_at = datetime.now(timezone.utc)
-                            session.add(chat)
-                        session.commit()
-
-                        # Refresh messages from database
-                        self.messages = [
-                            UIMessage(
-                                role=msg.role,
-                                content=msg.content,
-                                reasoning=msg.reasoning,
-                            )
-                            for msg in chat.messages
-                        ]
+                if await db_writer.submit(
+                    writes.finish_reply,
+                    assistant_id,
+                    answer,
+                    reasoning,
+                    status,
+                    processor.usage,
+                    chat_id=self.current_chat_id,
+                ):
+                    # Refresh messages from database
+                    await unit_of_work.run(self._load_latest_window)
+                    self._end_stream()
 
         except Exception as e:
             async with self:
                 error_message = f"Error: {str(e)}"
-                messages = self.messages[:]
-                if messages:
-                    messages[-1].content = error_message
-                    self.messages = messages
-
-                with rx.session() as session:
-                    assistant_msg = session.get(Message, assistant_id)
-                    if assistant_msg:
-                        assistant_msg.content = error_message
-                        session.add(assistant_msg)
-                        session.commit()
+                self.messages = self.messages + [
+                    UIMessage(role="assistant", content=error_message)
+                ]
+                self._end_stream()
+
+                await db_writer.submit(writes.fail_reply, assistant_id, error_message)
 
         finally:
             await client.close()
             async with self:
                 self.processing = False
+                self._end_stream()
+                await self._refresh_context_estimate()
+                summarizer.schedule(self.current_chat_id)
 
     # Update the select_chat method to use load_messages
     @rx.event
+    @unit_of_work.per_event
     async def select_chat(self, chat_id: int):
         """Select chat and load its messages."""
         self.current_chat_id = chat_id
-        self.load_messages()  # Use the new load_messages method
+        await self.load_messages()
+        summarizer.schedule(chat_id)  # Catch up chats from before summaries
 
-        self.load_project_chats()  # Refresh to update order
+        await self.load_project_chats()  # Refresh to update order
+        await self._load_rows()
 
     @rx.event
     def start_editing(self, index: int, field: str):
@@ -1196,6 +1814,7 @@ class State(rx.State):
                 self.editing_assistant_reasoning_index = index
 
     @rx.event(background=True)
+    @unit_of_work.per_event
     async def regenerate_response(self, user_message_index: int):
         """
         Regenerate the AI response for a user message after editing it.
@@ -1210,47 +1829,28 @@ class State(rx.State):
                 return
 
             self.processing = True
-            answer = ""
-            reasoning = ""
-
-            # Grab DB objects and verify we have the correct chat and user message
-            with rx.session() as session:
-                chat = session.get(Chat, self.current_chat_id)
-                if not chat:
-                    return
-
-                # Get messages up to and including the user message
-                messages_before = chat.messages[: user_message_index + 1]
-
-                # The target for regeneration must be a user message
-                if not messages_before or messages_before[-1].role != "user":
-                    return
-
-                # Delete all messages after this user message
-                for msg in chat.messages[user_message_index + 1 :]:
-                    session.delete(msg)
-
-                # Create a new assistant message placeholder
-                assistant_msg = Message(role="assistant", chat_id=self.current_chat_id)
-                session.add(assistant_msg)
-                session.commit()
-                assistant_id = assistant_msg.id
-
-                # Load current state of messages
-                self.messages = [
-                    UIMessage(role=m.role, content=m.content, reasoning=m.reasoning)
-                    for m in chat.messages
-                ]
+            self.fanout_slots = []
+
+            # Delete all messages after the user message (the target for
+            # regeneration must be one) and add a new placeholder reply
+            assistant_id = await db_writer.submit(
+                writes.restart_reply,
+                self.current_chat_id,
+                self.window_start + user_message_index,
+                self.model,
+            )
+            if assistant_id is None:
+                return
 
-            messages_for_api = self.format_messages(self.messages)
+            # Load the latest page; the placeholder is shown as the in-progress message
+            await unit_of_work.run(self._load_latest_window, exclude_id=assistant_id)
 
-            # Include the new placeholder
-            self.messages = self.messages + [
-                UIMessage(role="assistant", content="", reasoning="")
-            ]
+            messages_for_api = await self.format_messages()
 
         # Prepare the streaming client
-        client = AsyncOpenRouterAI(api_key=os.getenv("OPENROUTER_API_KEY"))
+        client = await AsyncOpenRouterAI.from_pool(
+            api_key=os.getenv("OPENROUTER_API_KEY")
+        )
 
         try:
             # Start streaming the response
@@ -1262,76 +1862,48 @@ class State(rx.State):
             )
 
             # Stream the chunks back into our UI
-            async for chunk in processor:
-                # Stop if processing was canceled
-                if not self.processing:
-                    break
+            answer, reasoning, status = await self._stream_reply(
+                processor, assistant_id
+            )
 
-                # For each chunk, lock state to push partial updates
+            # Once the stream finishes, save the final answer & reasoning to the
+            # database and update the chat's last modified timestamp
+            if await db_writer.submit(
+                writes.finish_reply,
+                assistant_id,
+                answer,
+                reasoning,
+                status,
+                processor.usage,
+                chat_id=self.current_chat_id,
+            ):
                 async with self:
-                    if chunk.content:
-                        answer = answer + chunk.content if answer else chunk.content
-                    if chunk.reasoning:
-                        reasoning = (
-                            reasoning + chunk.reasoning
-                            if reasoning
-                            else chunk.reasoning
-                        )
-
-                    # Update the last assistant message in the UI
-                    messages = self.messages[:]
-                    if messages:
-                        messages[-1].content = answer
-                        messages[-1].reasoning = reasoning
-                        self.messages = messages
-
-            # Once the stream finishes, save the final answer & reasoning to the database
-            with rx.session() as session:
-                assistant_msg = session.get(Message, assistant_id)
-                if assistant_msg:
-                    assistant_msg.content = answer
-                    assistant_msg.reasoning = reasoning
-                    session.add(assistant_msg)
-
-                    # Update the chat's last modified timestamp
-                    chat = session.get(Chat, self.current_chat_id)
-                    if chat:
-                        chat.updated_at = datetime.now(timezone.utc)
-                        session.add(chat)
-
-                    session.commit()
-                    async with self:
-                        # Reload messages from DB to keep them in sync
-                        self.messages = [
-                            UIMessage(
-                                role=m.role, content=m.content, reasoning=m.reasoning
-                            )
-                            for m in chat.messages
-                        ]
+                    # Reload messages from DB to keep them in sync
+                    await unit_of_work.run(self._load_latest_window)
+                    self._end_stream()
 
         except Exception as e:
             # If there's an error, record it in the UI and database
             error_message = f"Error: {str(e)}"
             async with self:
-                messages = self.messages[:]
-                if messages:
-                    messages[-1].content = error_message
-                    self.messages = messages
-
-            with rx.session() as session:
-                assistant_msg = session.get(Message, assistant_id)
-                if assistant_msg:
-                    assistant_msg.content = error_message
-                    session.add(assistant_msg)
-                    session.commit()
+                self.messages = self.messages + [
+                    UIMessage(role="assistant", content=error_message)
+                ]
+                self._end_stream()
+
+            await db_writer.submit(writes.fail_reply, assistant_id, error_message)
 
         finally:
             # Clean up regardless of success or error
             await client.close()
             async with self:
                 self.processing = False
+                self._end_stream()
+                await self._refresh_context_estimate()
+                summarizer.schedule(self.current_chat_id)
 
     @rx.event(background=True)
+    @unit_of_work.per_event
     async def save_edit(self):
         """Save the current edit."""
         async with self:
@@ -1341,13 +1913,12 @@ class State(rx.State):
                 )
 
                 # Save changes to database
-                with rx.session() as session:
-                    chat = session.get(Chat, self.current_chat_id)
-                    if chat and self.editing_user_message_index < len(chat.messages):
-                        msg = chat.messages[self.editing_user_message_index]
-                        msg.content = self.edit_content
-                        session.add(msg)
-                        session.commit()
+                await db_writer.submit(
+                    writes.edit_message,
+                    self.current_chat_id,
+                    self.window_start + self.editing_user_message_index,
+                    content=self.edit_content,
+                )
 
                 # Store the index before clearing
                 index_to_regenerate = self.editing_user_message_index
@@ -1368,30 +1939,24 @@ class State(rx.State):
                     self.edit_content
                 )
                 # Save changes to database
-                with rx.session() as session:
-                    chat = session.get(Chat, self.current_chat_id)
-                    if chat and self.editing_assistant_content_index < len(
-                        chat.messages
-                    ):
-                        msg = chat.messages[self.editing_assistant_content_index]
-                        msg.content = self.edit_content
-                        session.add(msg)
-                        session.commit()
+                await db_writer.submit(
+                    writes.edit_message,
+                    self.current_chat_id,
+                    self.window_start + self.editing_assistant_content_index,
+                    content=self.edit_content,
+                )
 
             elif self.editing_assistant_reasoning_index is not None:
                 self.messages[self.editing_assistant_reasoning_index].reasoning = (
                     self.edit_content
                 )
                 # Save changes to database
-                with rx.session() as session:
-                    chat = session.get(Chat, self.current_chat_id)
-                    if chat and self.editing_assistant_reasoning_index < len(
-                        chat.messages
-                    ):
-                        msg = chat.messages[self.editing_assistant_reasoning_index]
-                        msg.reasoning = self.edit_content
-                        session.add(msg)
-                        session.commit()
+                await db_writer.submit(
+                    writes.edit_message,
+                    self.current_chat_id,
+                    self.window_start + self.editing_assistant_reasoning_index,
+                    reasoning=self.edit_content,
+                )
 
             # Cancel editing for non-user message edits
             # When chaining events in Reflex, you should reference the event handler via the state class (State) rather than self
@@ -0,0 +1,177 @@
+"""Coalescing of streamed token deltas before they are pushed to the UI."""
+
+import asyncio
+import contextlib
+import os
+from dataclasses import dataclass
+from typing import *
+
+
+@dataclass
+class FlushPolicy:
+    """When buffered deltas are pushed to the state: whichever limit is hit first."""
+
+    interval_ms: float = 80.0  # Max time text waits in the buffer
+    max_chars: int = 512  # Max buffered characters (content + reasoning)
+
+    @classmethod
+    def from_env(cls) -> "FlushPolicy":
+        """Build a policy from STREAM_FLUSH_* environment variables."""
+        defaults = cls()
+        return cls(
+            interval_ms=float(
+                os.getenv("STREAM_FLUSH_INTERVAL_MS", defaults.interval_ms)
+            ),
+            max_chars=int(os.getenv("STREAM_FLUSH_MAX_CHARS", defaults.max_chars)),
+        )
+
+
+@dataclass
+class StreamDelta:
+    """Text accumulated since the previous flush."""
+
+    content: str = ""
+    reasoning: str = ""
+    error: Optional[str] = None
+
+
+class TextAccumulator:
+    """Append-only text buffer for streamed output.
+
+    Appends are O(1) amortised (a list of parts instead of repeated string
+    concatenation), `take_delta` returns only the text added since the previous
+    call, and `getvalue` joins the parts handed out so far into one string.
+    """
+
+    def __init__(self):
+        self._parts: List[str] = []
+        self._flushed = 0  # Number of parts already returned by take_delta
+        self._length = 0
+
+    def append(self, text: str):
+        if text:
+            self._parts.append(text)
+            self._length += len(text)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __bool__(self) -> bool:
+        return self._length > 0
+
+    def take_delta(self) -> str:
+        """Return the text appended since the previous call."""
+        delta = "".join(self._parts[self._flushed :])
+        self._flushed = len(self._parts)
+        return delta
+
+    def getvalue(self) -> str:
+        """Return the full text."""
+        if self._flushed > 1:
+            # Collapse the parts already handed out so repeated calls stay cheap
+            self._parts[: self._flushed] = ["".join(self._parts[: self._flushed])]
+            self._flushed = 1
+        return "".join(self._parts)
+
+
+_END = object()
+
+
+async def coalesce_chunks(
+    chunks: AsyncIterable,
+    policy: FlushPolicy,
+    content: Optional[TextAccumulator] = None,
+    reasoning: Optional[TextAccumulator] = None,
+) -> AsyncIterator[StreamDelta]:
+    """Group stream chunks into deltas according to `policy`.
+
+    Chunks are read by a separate task into a queue so buffered text is flushed
+    on time even when the upstream stalls between chunks. The remaining buffer
+    is always flushed when the stream ends, and an error chunk is yielded on its
+    own after the text that preceded it. The first text of a stream is never
+    held back.
+
+    Text is appended to the `content`/`reasoning` accumulators, so callers that
+    pass their own get the full text from them once the stream ends.
+
+    Callers that may stop early should wrap the generator in
+    `contextlib.aclosing`, which stops the reader task and closes `chunks`
+    right away instead of whenever the generator is garbage collected.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    source = aiter(chunks)
+
+    async def pump():
+        try:
+            async for chunk in source:
+                await queue.put(chunk)
+        except Exception as e:
+            await queue.put(e)
+        finally:
+            await queue.put(_END)
+
+    loop = asyncio.get_running_loop()
+    interval = policy.interval_ms / 1000
+    content = TextAccumulator() if content is None else content
+    reasoning = TextAccumulator() if reasoning is None else reasoning
+    pending_chars = 0
+    last_flush = loop.time()
+    first_flush = True  # The first text is pushed immediately to keep time-to-first-token
+
+    def flush() -> StreamDelta:
+        nonlocal pending_chars, last_flush
+        delta = StreamDelta(
+            content=content.take_delta(), reasoning=reasoning.take_delta()
+        )
+        pending_chars = 0
+        last_flush = loop.time()
+        return delta
+
+    pump_task = asyncio.create_task(pump())
+    try:
+        while True:
+            timeout = None
+            if pending_chars:
+                timeout = max(0.0, interval - (loop.time() - last_flush))
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield flush()
+                continue
+
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                if pending_chars:
+                    yield flush()
+                raise item
+            if item.error:
+                if pending_chars:
+                    yield flush()
+                yield StreamDelta(error=item.error)
+                break
+
+            if item.content:
+                content.append(item.content)
+                pending_chars += len(item.content)
+            if item.reasoning:
+                reasoning.append(item.reasoning)
+                pending_chars += len(item.reasoning)
+
+            if (
+                first_flush
+                or pending_chars >= policy.max_chars
+                or loop.time() - last_flush >= interval
+            ):
+                first_flush = False
+                yield flush()
+
+        if pending_chars:
+            yield flush()
+    finally:
+        pump_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await pump_task
+        aclose = getattr(source, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -0,0 +1,311 @@
+"""Rolling background summaries of older chat turns.
+
+Long chats would otherwise resend their whole history on every turn. Once a
+chat has more than `keep_recent` active messages, a background worker folds
+the older turns into `Chat.summary` with a cheap model, and prompts are built
+from the summary plus the turns after `Chat.summary_through_id`. Each run
+only sends the previous summary and the turns added since, and nothing on the
+request path waits for it: until a summary exists the chat is sent in full
+(and trimmed to the budget as before).
+
+Summaries call the model in the background and change what is sent, so they
+are off unless SUMMARY_ENABLED=1 (see `SummaryConfig` for the other
+SUMMARY_* settings).
+"""
+
+import asyncio
+import contextlib
+import os
+from dataclasses import dataclass
+from typing import *
+
+from sqlalchemy import case
+from sqlmodel import select, update
+
+from . import db
+from .context import truncate_to_tokens
+from .models import Chat, Message, MessageStatus
+from .writer import db_writer
+
+SUMMARY_INSTRUCTIONS = """You maintain a running summary of a conversation between a user and an AI assistant.
+Update the summary with the new turns below. Keep every fact, decision, name, number, code identifier and open question that later turns may refer to; drop pleasantries and repetition.
+Write in the language of the conversation, in plain prose or short bullet points, and reply with the updated summary only."""
+
+
+@dataclass
+class SummaryConfig:
+    """When and how older turns are folded into the chat summary."""
+
+    enabled: bool = False
+    model: str = "openai/gpt-4o-mini"  # Cheap model used for summaries
+    keep_recent: int = 12  # Latest messages always sent verbatim
+    min_batch: int = 6  # Older messages needed before a summary call is worth it
+    max_batch_tokens: int = 16_000  # Turns folded per call
+    max_summary_tokens: int = 1024
+
+    @classmethod
+    def from_env(cls) -> "SummaryConfig":
+        """Build a config from SUMMARY_* environment variables."""
+        defaults = cls()
+        return cls(
+            enabled=os.getenv("SUMMARY_ENABLED", "0").lower() in ("1", "true", "yes"),
+            model=os.getenv("SUMMARY_MODEL", defaults.model),
+            keep_recent=int(os.getenv("SUMMARY_KEEP_RECENT", defaults.keep_recent)),
+            min_batch=int(os.getenv("SUMMARY_MIN_BATCH", defaults.min_batch)),
+            max_batch_tokens=int(
+                os.getenv("SUMMARY_MAX_BATCH_TOKENS", defaults.max_batch_tokens)
+            ),
+            max_summary_tokens=int(
+                os.getenv("SUMMARY_MAX_TOKENS", defaults.max_summary_tokens)
+            ),
+        )
+
+
+def pending_turns(session, chat_id: int, config: SummaryConfig) -> List[Message]:
+    """Old messages not yet in the summary, if there are enough to fold.
+
+    The batch leaves the latest `keep_recent` messages alone, stops before any
+    response still streaming and ends with an assistant message, so the
+    summary always covers whole turns.
+
+    Args:
+        session: Database session
+        chat_id: Chat to summarise
+        config: Summary settings
+
+    Returns:
+        The messages to fold, oldest first; empty if a call isn't worth it yet
+    """
+    chat = session.get(Chat, chat_id)
+    if not chat:
+        return []
+    messages = session.exec(
+        select(Message)
+        .where(
+            Message.chat_id == chat_id,
+            Message.is_active == True,
+            Message.seq >= summary_coverage(session, chat),
+        )
+        .order_by(Message.seq)
+    ).all()
+
+    batch: List[Message] = []
+    used = 0
+    full = False
+    for msg in messages[: max(0, len(messages) - config.keep_recent)]:
+        if msg.status == MessageStatus.STREAMING.value:
+            break
+        if batch and used + msg.token_count > config.max_batch_tokens:
+            full = True
+            break
+        batch.append(msg)
+        used += msg.token_count
+    while batch and batch[-1].role != "assistant":
+        batch.pop()
+    return batch if full or len(batch) >= config.min_batch else []
+
+
+def summary_request(
+    previous: Optional[str], turns: List[Message], config: SummaryConfig
+) -> List[Dict[str, str]]:
+    """Messages asking the summary model to fold `turns` into `previous`."""
+    # Cap a single huge message
+    transcript = "\n\n".join(
+        f"{msg.role.upper()}: "
+        f"{truncate_to_tokens(msg.content or '', config.max_batch_tokens)}"
+        for msg in turns
+    )
+    return [
+        {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+        {
+            "role": "user",
+            "content": f"<summary>\n{previous or ''}\n</summary>\n\n"
+            f"<new_turns>\n{transcript}\n</new_turns>",
+        },
+    ]
+
+
+def store_summary(
+    session, chat_id: int, expected_version: int, summary: str, through_id: int
+) -> bool:
+    """Save a summary unless the chat's messages were edited since it was started.
+
+    `Chat.updated_at` is left alone so summarising doesn't reorder the sidebar.
+    The caller commits it.
+
+    Returns:
+        Whether the summary was stored
+    """
+    result = session.exec(
+        update(Chat)
+        .where(Chat.id == chat_id, Chat.summary_version == expected_version)
+        .values(
+            summary=summary,
+            summary_through_id=through_id,
+            summary_version=Chat.summary_version + 1,
+            updated_at=Chat.updated_at,
+        )
+    )
+    return result.rowcount == 1
+
+
+def reset_summary(session, chat_id: int, message_id: int):
+    """Note that `message_id` is being edited or deleted.
+
+    The summary is dropped if it covers the message, and a summary being
+    computed meanwhile is discarded. The caller commits it together with the
+    change.
+    """
+    covers = Chat.summary_through_id >= message_id
+    session.exec(
+        update(Chat)
+        .where(Chat.id == chat_id)
+        .values(
+            summary=case((covers, None), else_=Chat.summary),
+            summary_through_id=case((covers, None), else_=Chat.summary_through_id),
+            summary_version=Chat.summary_version + 1,
+            updated_at=Chat.updated_at,
+        )
+    )
+
+
+def summary_coverage(session, chat: Chat) -> int:
+    """How many leading messages of the conversation the chat's summary replaces."""
+    if chat.summary_through_id is None:
+        return 0
+    through = session.get(Message, chat.summary_through_id)
+    return through.seq + 1 if through is not None else 0
+
+
+def chat_summary(session, chat_id: Optional[int]) -> Tuple[Optional[str], int]:
+    """A chat's summary and how many leading active messages it replaces.
+
+    Summaries stored while they were enabled aren't used once they're off.
+    """
+    if chat_id is None or not SUMMARY_CONFIG.enabled:
+        return None, 0
+    chat = session.get(Chat, chat_id)
+    if not chat or not chat.summary:
+        return None, 0
+    covered = summary_coverage(session, chat)
+    return (chat.summary, covered) if covered else (None, 0)
+
+
+def _next_batch(session, chat_id: int, config: SummaryConfig):
+    chat = session.get(Chat, chat_id)
+    if not chat:
+        return None
+    turns = pending_turns(session, chat_id, config)
+    if not turns:
+        return None
+    return (
+        chat.summary_version,
+        summary_request(chat.summary, turns, config),
+        turns[-1].id,
+        len(turns),
+    )
+
+
+class Summarizer:
+    """Background worker that keeps chat summaries up to date.
+
+    `schedule` only enqueues the chat id, so it is safe to call from any event
+    handler. One chat is summarised at a time and database work goes through
+    the async driver, so the worker never holds up interactive requests.
+    """
+
+    def __init__(self, config: SummaryConfig):
+        self.config = config
+        self._queue: Optional[asyncio.Queue] = None
+        self._queued: Set[int] = set()
+        self.runs = 0
+        self.folded_messages = 0
+        self.conflicts = 0  # Summaries discarded because the chat changed meanwhile
+        self.failures = 0
+
+    def schedule(self, chat_id: Optional[int]):
+        """Queue a chat for summarising; a no-op if it is already queued."""
+        if self._queue is None or chat_id is None or chat_id in self._queued:
+            return
+        self._queued.add(chat_id)
+        self._queue.put_nowait(chat_id)
+
+    async def run(self, complete: Callable[..., Awaitable[str]]):
+        """Process queued chats until cancelled.
+
+        Args:
+            complete: Non-streaming completion, called as
+                `complete(model, messages, max_tokens=...)`
+        """
+        self._queue = asyncio.Queue()
+        try:
+            while True:
+                chat_id = await self._queue.get()
+                self._queued.discard(chat_id)
+                try:
+                    await self._summarize(chat_id, complete)
+                except Exception as e:
+                    self.failures += 1
+                    print(f"Summary error: {str(e)}")
+        finally:
+            self._queue = None
+            self._queued.clear()
+
+    async def _summarize(self, chat_id: int, complete: Callable[..., Awaitable[str]]):
+        # A chat far behind (e.g. from before summaries) catches up one batch per call
+        while True:
+            batch = await db.run(_next_batch, chat_id, self.config)
+            if batch is None:
+                return
+            expected_version, request, through_id, count = batch
+            summary = await complete(
+                self.config.model,
+                request,
+                max_tokens=self.config.max_summary_tokens,
+            )
+            if not summary or not summary.strip():
+                return
+            self.runs += 1
+            stored = await db_writer.submit(
+                store_summary, chat_id, expected_version, summary.strip(), through_id
+            )
+            if not stored:
+                self.conflicts += 1
+                return
+            self.folded_messages += count
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.config.enabled,
+            "model": self.config.model,
+            "queued": len(self._queued),
+            "runs": self.runs,
+            "folded_messages": self.folded_messages,
+            "conflicts": self.conflicts,
+            "failures": self.failures,
+        }
+
+
+SUMMARY_CONFIG = SummaryConfig.from_env()
+
+summarizer = Summarizer(SUMMARY_CONFIG)
+
+
+@contextlib.asynccontextmanager
+async def summarizer_lifespan(complete: Callable[..., Awaitable[str]]):
+    """App lifespan task running the summary worker, if summaries are enabled."""
+    if not SUMMARY_CONFIG.enabled:
+        yield
+        return
+    worker = asyncio.create_task(summarizer.run(complete))
+    try:
+        yield
+    finally:
+        worker.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await worker
+
+
+async def summary_stats_endpoint() -> Dict[str, Any]:
+    """API endpoint returning the summary worker counters."""
+    return summarizer.stats()
@@ -0,0 +1,246 @@
+"""Per-event unit of work: one shared session, deduplicated loads, SQL counts.
+
+Event handlers used to open a session per helper. Opening a chat through
+`handle_chat_route` loaded the project's chats twice, plus the project list
+and the message window, each in a session of its own, and re-read the same
+project and chat rows along the way. Handlers decorated with `per_event` get
+one scope for the whole event:
+
+- `session()` and `run()` use the event's session, so rows read earlier in
+  the event come from its identity map instead of another SELECT
+- `load(key, fn, *args)` runs a loader once per event; later calls with the
+  same key get the first result
+- every SQL statement executed for the event is counted, per handler, in
+  `query_stats`
+
+The session is committed (ending the read transaction and returning its
+connection to the pool) when each outermost `session()` block exits, so a
+long background handler never holds a connection while it streams. Objects
+stay loaded. Once `writer.db_writer` commits a write for the event, the event
+is marked stale: memoized loads are dropped and the session's rows expire
+before its next use, so reads after a write see it.
+
+Outside a decorated handler, `session()` opens a fresh session and `load()`
+just calls the loader. `count_statements()` counts any block of code, e.g.
+to assert a statement budget for a handler in a test.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import functools
+import inspect
+from dataclasses import dataclass, field
+from typing import *
+
+import sqlalchemy
+from sqlalchemy import event
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import db
+
+
+@dataclass
+class StatementCounter:
+    """SQL statements executed while the counter was active."""
+
+    statements: int = 0
+
+
+# Counters of the running event and of enclosing `count_statements` blocks
+_counters: contextvars.ContextVar[Tuple[StatementCounter, ...]] = (
+    contextvars.ContextVar("statement_counters", default=())
+)
+
+
+@event.listens_for(sqlalchemy.engine.Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    for counter in _counters.get():
+        counter.statements += 1
+
+
+@contextlib.contextmanager
+def count_statements() -> Iterator[StatementCounter]:
+    """Count the SQL statements executed by the enclosed code, on any engine.
+
+    with count_statements() as counter:
+        await state.handle_chat_route()
+    assert counter.statements <= 8
+
+    Statements of tasks started inside the block are counted too; writes
+    committed by the database writer are not.
+    """
+    counter = StatementCounter()
+    token = _counters.set(_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _counters.reset(token)
+
+
+@dataclass
+class HandlerQueries:
+    """Statement counts of one event handler."""
+
+    events: int = 0
+    statements: int = 0
+    max_statements: int = 0
+
+    def add(self, statements: int):
+        self.events += 1
+        self.statements += statements
+        self.max_statements = max(self.max_statements, statements)
+
+
+class QueryStats:
+    """SQL statements per event handler, for spotting N+1 regressions."""
+
+    def __init__(self):
+        self.handlers: Dict[str, HandlerQueries] = {}
+
+    def record(self, handler: str, statements: int):
+        self.handlers.setdefault(handler, HandlerQueries()).add(statements)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "events": queries.events,
+                "mean_statements": round(queries.statements / queries.events, 2),
+                "max_statements": queries.max_statements,
+            }
+            for name, queries in sorted(self.handlers.items())
+        }
+
+
+query_stats = QueryStats()
+
+
+@dataclass
+class _Scope:
+    handler: str
+    counter: StatementCounter = field(default_factory=StatementCounter)
+    memo: Dict[Hashable, Any] = field(default_factory=dict)
+    session: Optional[AsyncSession] = None
+    # Task inside an outermost `session()` block; others get their own session
+    owner: Optional[asyncio.Task] = None
+    stale: bool = False
+
+
+_scope: contextvars.ContextVar[Optional[_Scope]] = contextvars.ContextVar(
+    "unit_of_work", default=None
+)
+
+
+@contextlib.asynccontextmanager
+async def _event_scope(handler: str):
+    if _scope.get() is not None:
+        # Handlers calling other handlers share the outer event's scope
+        yield
+        return
+    scope = _Scope(handler)
+    scope_token = _scope.set(scope)
+    counters_token = _counters.set(_counters.get() + (scope.counter,))
+    try:
+        yield
+    finally:
+        _counters.reset(counters_token)
+        _scope.reset(scope_token)
+        if scope.session is not None:
+            await scope.session.close()
+        query_stats.record(handler, scope.counter.statements)
+
+
+def per_event(fn: Callable) -> Callable:
+    """Run an event handler in a unit of work of its own.
+
+    Goes under `@rx.event`; handlers that are async generators stay so.
+    """
+    handler = fn.__qualname__
+
+    if inspect.isasyncgenfunction(fn):
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            async with _event_scope(handler):
+                async for update in fn(*args, **kwargs):
+                    yield update
+
+    else:
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            async with _event_scope(handler):
+                return await fn(*args, **kwargs)
+
+    return wrapper
+
+
+@contextlib.asynccontextmanager
+async def session() -> AsyncIterator[AsyncSession]:
+    """The event's session, or a fresh one outside a unit of work.
+
+    A task other than the one using the event's session (e.g. concurrent
+    fan-out slots) also gets a fresh one: a session is not safe for
+    concurrent use.
+    """
+    scope = _scope.get()
+    task = asyncio.current_task()
+    if scope is None or scope.owner not in (None, task):
+        async with db.asession() as fresh:
+            yield fresh
+        return
+
+    if scope.session is None:
+        scope.session = db.asession()
+    elif scope.stale:
+        scope.session.expire_all()
+    scope.stale = False
+    outermost = scope.owner is None
+    scope.owner = task
+    try:
+        yield scope.session
+    except BaseException:
+        if outermost:
+            await scope.session.rollback()
+        raise
+    else:
+        if outermost:
+            # Ends the read transaction; objects stay loaded for the next block
+            await scope.session.commit()
+    finally:
+        if outermost:
+            scope.owner = None
+
+
+async def run(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run `fn(session, *args, **kwargs)` on the event's session; see `db.run`."""
+    async with session() as s:
+        return await s.run_sync(fn, *args, **kwargs)
+
+
+async def load(key: Hashable, fn: Callable[..., Any], *args) -> Any:
+    """`fn(session, *args)`, run at most once per event for `key`.
+
+    For loads several helpers of one event need, like a project's chat list.
+    The result is shared, so callers must not change it in place.
+    """
+    scope = _scope.get()
+    if scope is not None and key in scope.memo:
+        return scope.memo[key]
+    result = await run(fn, *args)
+    if scope is not None:
+        scope.memo[key] = result
+    return result
+
+
+def invalidate():
+    """Note that the event's writes were committed; see the module docstring."""
+    scope = _scope.get()
+    if scope is not None:
+        scope.memo.clear()
+        scope.stale = True
+
+
+async def query_stats_endpoint() -> Dict[str, Any]:
+    """API endpoint returning the SQL statement counts per event handler."""
+    return query_stats.stats()
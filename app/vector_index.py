@@ -0,0 +1,330 @@
+"""Hashed n-gram vector index over project documents, memory-mapped on disk.
+
+Chunks (see `app.retrieval`) are embedded with a deterministic local
+featuriser: character n-grams are hashed into a fixed number of signed
+buckets with sublinear term frequency. Inverse document frequency is kept
+per bucket and applied at query time, so adding a document never requires
+re-embedding the others.
+
+Each committed version of a project's index has its own files in
+VECTOR_INDEX_DIR, never changed once written:
+  project-<id>.<version>.<tag>.f32   float32 matrix, one row per chunk
+  project-<id>.<version>.<tag>.txt   chunk texts, UTF-8
+and `project-<id>.json` names the current ones, with the row metadata,
+bucket document frequencies and the `Project.knowledge_version` they
+reflect. Opening an index reads only the JSON; matrix pages are loaded by
+the OS as queries touch them.
+
+Changes are made to an in-memory copy. `commit` writes the live rows to new
+files (temp file plus rename), so deleted and replaced chunks are dropped,
+then swaps the JSON and deletes the files it replaced. Other workers keep
+reading the files they have mapped until they reload.
+"""
+
+import glob
+import json
+import mmap
+import os
+import uuid
+from dataclasses import dataclass
+from typing import *
+
+import numpy as np
+
+from .context import estimate_tokens
+from .retrieval import RETRIEVAL_CONFIG, Chunk, IndexRegistry, chunk_spans
+
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "vector_index")
+
+
+@dataclass
+class VectorConfig:
+    """Featuriser settings; changing them invalidates stored indexes."""
+
+    dim: int = 1024
+    min_n: int = 2  # Bigrams carry most of the signal in CJK text
+    max_n: int = 4
+
+    @classmethod
+    def from_env(cls) -> "VectorConfig":
+        """Build a config from VECTOR_* environment variables."""
+        defaults = cls()
+        return cls(
+            dim=int(os.getenv("VECTOR_DIM", defaults.dim)),
+            min_n=int(os.getenv("VECTOR_MIN_N", defaults.min_n)),
+            max_n=int(os.getenv("VECTOR_MAX_N", defaults.max_n)),
+        )
+
+
+_MULTIPLIER = np.uint64(1_000_003)
+
+
+def _mix(h: np.ndarray) -> np.ndarray:
+    """splitmix64 finaliser, so every output bit depends on every input bit."""
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+
+def featurize(text: str, config: VectorConfig) -> np.ndarray:
+    """Signed hashed character n-gram counts with sublinear tf, float32[dim].
+
+    N-grams are hashed with a polynomial rolling hash over code points, so the
+    result is the same in every process (unlike the builtin `hash`).
+    """
+    vector = np.zeros(config.dim, dtype=np.float32)
+    normalized = " " + " ".join(text.lower().split()) + " "
+    codes = np.frombuffer(normalized.encode("utf-32-le"), dtype=np.uint32).astype(
+        np.uint64
+    )
+    hashes = []
+    for n in range(config.min_n, config.max_n + 1):
+        if len(codes) < n:
+            break
+        h = np.zeros(len(codes) - n + 1, dtype=np.uint64)
+        for offset in range(n):
+            h = h * _MULTIPLIER + codes[offset : offset + len(h)]
+        hashes.append(h ^ np.uint64(n << 56))  # Keep n-grams of different n apart
+    if not hashes:
+        return vector
+
+    grams, counts = np.unique(np.concatenate(hashes), return_counts=True)
+    mixed = _mix(grams)
+    buckets = (mixed % np.uint64(config.dim)).astype(np.intp)
+    signs = np.where((mixed >> np.uint64(63)) & np.uint64(1), 1.0, -1.0)
+    weights = signs * (1.0 + np.log(counts))
+    vector += np.bincount(buckets, weights=weights, minlength=config.dim).astype(
+        np.float32
+    )
+    return vector
+
+
+class VectorIndex:
+    """Per-project chunk vectors in a memory-mapped float32 matrix.
+
+    Not safe to search while another thread changes or commits it: the app
+    only uses it under `IndexRegistry`'s lock.
+    """
+
+    def __init__(self, project_id: int, config: VectorConfig, directory: str):
+        self.config = config
+        self.directory = directory
+        self.path = os.path.join(directory, f"project-{project_id}")
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    # -- persistence ---------------------------------------------------------
+
+    def _reset(self):
+        self.version: Optional[int] = None
+        self._rows: List[Optional[list]] = []  # [doc_id, name, position, offset, length]
+        self._free: List[int] = []
+        self._df = np.zeros(self.config.dim, dtype=np.float64)
+        self._live = 0
+        # Read-only maps of the committed files, replaced by a private copy
+        # (`_reserve`) on the first change
+        self._matrix: Optional[np.ndarray] = None
+        self._texts: Optional[mmap.mmap] = None
+        self._new_texts: Dict[int, bytes] = {}  # Rows added since the last commit
+        self._norms: Optional[np.ndarray] = None  # Weighted row norms, reset on change
+        self._files: Optional[str] = None  # Base name of the committed files in use
+
+    def _load(self):
+        self._reset()
+        meta = self._read_meta()
+        if meta is None or meta.get("config") != self.config.__dict__:
+            return  # None yet, or other featuriser settings; rebuilt on first use
+        try:
+            self._matrix, self._texts = self._open_files(
+                meta["files"], len(meta["rows"])
+            )
+        except OSError:
+            return  # Replaced and deleted meanwhile; reloaded or rebuilt on first use
+        self._files = meta["files"]
+        self.version = meta["version"]
+        self._rows = meta["rows"]
+        self._df = np.asarray(meta["df"], dtype=np.float64)
+        self._live = len(self._rows)
+
+    def _read_meta(self) -> Optional[dict]:
+        try:
+            with open(self.path + ".json", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if "files" in meta else None  # Written by an older version
+
+    def _open_files(
+        self, files: str, rows: int
+    ) -> Tuple[Optional[np.memmap], Optional[mmap.mmap]]:
+        """Map a committed version's matrix and texts, readable even once deleted."""
+        path = os.path.join(self.directory, files)
+        matrix = texts = None
+        if rows:
+            matrix = np.memmap(
+                path + ".f32", dtype=np.float32, mode="r", shape=(rows, self.config.dim)
+            )
+        with open(path + ".txt", "rb") as f:
+            if os.fstat(f.fileno()).st_size:
+                texts = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return matrix, texts
+
+    def reload(self):
+        """Pick up the version another worker committed."""
+        self._load()
+
+    def close(self):
+        self._matrix = self._texts = None
+
+    def _reserve(self, rows: int):
+        """Make the matrix a private in-memory copy with room for `rows` rows."""
+        matrix = self._matrix
+        if isinstance(matrix, np.ndarray) and not isinstance(matrix, np.memmap):
+            if rows <= matrix.shape[0]:
+                return
+        capacity = matrix.shape[0] if matrix is not None else 0
+        copy = np.zeros((max(rows, 64, capacity * 2), self.config.dim), np.float32)
+        if matrix is not None:
+            copy[:capacity] = matrix
+        self._matrix = copy
+
+    def commit(self, version: int):
+        """Write the live rows to new files and make them the current version."""
+        files = f"{os.path.basename(self.path)}.{version}.{uuid.uuid4().hex[:8]}"
+        path = os.path.join(self.directory, files)
+        live = [row for row, meta in enumerate(self._rows) if meta is not None]
+        rows = []
+        with open(path + ".txt.tmp", "wb") as texts:
+            for row in live:
+                doc_id, name, position, _, length = self._rows[row]
+                rows.append([doc_id, name, position, texts.tell(), length])
+                texts.write(self._text(row))
+        matrix = self._matrix[live] if live else np.zeros((0, self.config.dim))
+        matrix.astype(np.float32).tofile(path + ".f32.tmp")
+        for suffix in (".f32", ".txt"):
+            os.replace(path + suffix + ".tmp", path + suffix)
+
+        replaced = {self._files}
+        meta = self._read_meta()
+        if meta is not None:
+            replaced.add(meta["files"])
+        meta = {
+            "version": version,
+            "config": self.config.__dict__,
+            "files": files,
+            "rows": rows,
+            "df": self._df.tolist(),
+        }
+        with open(path + ".json.tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(path + ".json.tmp", self.path + ".json")
+
+        matrix, texts = self._open_files(files, len(rows))
+        self._matrix, self._texts, self._rows = matrix, texts, rows
+        self._free, self._new_texts, self._norms = [], {}, None
+        self._files, self.version = files, version
+        for old in replaced - {None, files}:
+            _remove(os.path.join(self.directory, old), (".f32", ".txt"))
+
+    def clear(self):
+        """Empty the index; the files in use are replaced by the next commit."""
+        files = self._files
+        self._reset()
+        self._files = files
+
+    # -- updates -------------------------------------------------------------
+
+    def add_document(self, doc_id: int, name: str, content: str):
+        """Embed a document's chunks, replacing any previous version of it."""
+        self.remove_document(doc_id)
+        content = content or ""
+        spans = chunk_spans(
+            content, RETRIEVAL_CONFIG.chunk_chars, RETRIEVAL_CONFIG.chunk_overlap
+        )
+        if not spans:
+            return
+        self._reserve(len(self._rows) + max(0, len(spans) - len(self._free)))
+        for position, (start, end) in enumerate(spans):
+            data = content[start:end].encode("utf-8")
+            vector = featurize(content[start:end], self.config)
+            row = self._free.pop() if self._free else len(self._rows)
+            if row == len(self._rows):
+                self._rows.append(None)
+            self._matrix[row] = vector
+            self._rows[row] = [doc_id, name, position, None, len(data)]
+            self._new_texts[row] = data
+            self._df += vector != 0
+            self._live += 1
+        self._norms = None
+
+    def remove_document(self, doc_id: int):
+        for row, meta in enumerate(self._rows):
+            if meta is not None and meta[0] == doc_id:
+                self._reserve(len(self._rows))
+                self._df -= self._matrix[row] != 0
+                self._matrix[row] = 0
+                self._rows[row] = None
+                self._new_texts.pop(row, None)
+                self._free.append(row)
+                self._live -= 1
+                self._norms = None
+
+    # -- queries -------------------------------------------------------------
+
+    def _idf(self) -> np.ndarray:
+        return (np.log((self._live + 1) / (self._df + 1)) + 1).astype(np.float32)
+
+    def search(self, query: str, k: int) -> List[Tuple[float, Chunk]]:
+        """Top `k` chunks by cosine similarity of idf-weighted vectors, best first."""
+        count = len(self._rows)
+        if not self._live or self._matrix is None:
+            return []
+        matrix = self._matrix[:count]
+        weights = self._idf()
+        query_vector = featurize(query, self.config) * weights
+        query_norm = float(np.linalg.norm(query_vector))
+        if not query_norm:
+            return []
+        if self._norms is None:
+            # ||row * idf|| for every row; recomputed only after the index changes
+            self._norms = np.sqrt(np.square(matrix) @ np.square(weights))
+        scores = matrix @ (query_vector * weights) / (self._norms * query_norm + 1e-9)
+        scores[[row for row in self._free if row < count]] = -np.inf
+
+        k = min(k, self._live)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[row]), self._chunk(row)) for row in top]
+
+    def _text(self, row: int) -> bytes:
+        if row in self._new_texts:
+            return self._new_texts[row]
+        _, _, _, offset, length = self._rows[row]
+        return self._texts[offset : offset + length]
+
+    def _chunk(self, row: int) -> Chunk:
+        doc_id, name, position, _, _ = self._rows[row]
+        text = self._text(row).decode("utf-8")
+        return Chunk(doc_id, name, position, text, estimate_tokens(text))
+
+
+def _remove(path: str, suffixes: Iterable[str]):
+    for suffix in suffixes:
+        try:
+            os.remove(path + suffix)
+        except OSError:
+            pass  # Already gone, or still open on a platform that forbids it
+
+
+def _remove_files(project_id: int):
+    path = os.path.join(VECTOR_INDEX_DIR, f"project-{project_id}")
+    _remove(path, [".json"] + [name[len(path) :] for name in glob.glob(path + ".*")])
+
+
+VECTOR_CONFIG = VectorConfig.from_env()
+
+vector_indexes = IndexRegistry(
+    lambda project_id: VectorIndex(project_id, VECTOR_CONFIG, VECTOR_INDEX_DIR),
+    RETRIEVAL_CONFIG.max_indexes,
+    on_drop=_remove_files,
+)
@@ -0,0 +1,219 @@
+"""Single database writer that commits queued writes in shared transactions.
+
+SQLite takes one writer at a time. Handlers that each open a session and
+commit race for the write lock (failing with "database is locked" once
+busy_timeout runs out) and pay a WAL sync for every tiny transaction.
+Instead, writes are submitted to one writer task. It takes whatever has
+queued up, waits up to `window_ms` for more, applies the batch in a single
+transaction on its own connection, and resolves each caller's future once
+that transaction has committed.
+
+A write is a unit of work `fn(session, *args)` against a plain session, like
+the helpers in `sequence` and `summarizer`. It adds, changes or deletes rows,
+may flush to get ids, and returns ids, flags or loaded objects: the session
+is closed by the time the caller gets them. It must not commit. Each write
+runs in its own SAVEPOINT. A write that raises is rolled back alone, its
+caller gets the exception and the rest of the batch still commits.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import os
+from dataclasses import dataclass
+from typing import *
+
+from . import db, unit_of_work
+
+
+@dataclass
+class WriterConfig:
+    """How queued writes are grouped into transactions.
+
+    After taking a write off the queue the writer waits `window_ms` for more,
+    then commits up to `max_batch` of them together. With `enabled` off every
+    write gets a session and commit of its own, as before.
+    """
+
+    enabled: bool = True
+    window_ms: float = 2.0
+    max_batch: int = 128
+
+    @classmethod
+    def from_env(cls) -> "WriterConfig":
+        """Build a config from DB_WRITER_* environment variables."""
+        defaults = cls()
+        return cls(
+            enabled=os.getenv("DB_WRITER_ENABLED", "true").lower()
+            in ("1", "true", "yes"),
+            window_ms=float(os.getenv("DB_WRITER_WINDOW_MS", defaults.window_ms)),
+            max_batch=int(os.getenv("DB_WRITER_MAX_BATCH", defaults.max_batch)),
+        )
+
+
+@dataclass
+class _Write:
+    fn: Callable[..., Any]
+    args: tuple
+    kwargs: Dict[str, Any]
+    future: asyncio.Future
+
+
+def _apply_one(session, fn: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]):
+    result = fn(session, *args, **kwargs)
+    session.commit()
+    return result
+
+
+class DatabaseWriter:
+    """Owns the app's database writes and commits them in batches."""
+
+    def __init__(self, config: WriterConfig):
+        self.config = config
+        self.batches = 0
+        self.writes = 0
+        self.failed_writes = 0
+        self.failed_batches = 0
+        self.largest_batch = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Queue `fn(session, *args, **kwargs)` and wait until it is committed.
+
+        Returns:
+            What `fn` returned
+
+        Raises:
+            What `fn` raised, or the error that failed its batch's commit
+        """
+        try:
+            if not self.config.enabled:
+                return await db.run(_apply_one, fn, args, kwargs)
+            self._ensure_running()
+            future = self._loop.create_future()
+            self._queue.put_nowait(_Write(fn, args, kwargs, future))
+            return await future
+        finally:
+            # Reads later in the caller's event must see the write
+            unit_of_work.invalidate()
+
+    def _ensure_running(self):
+        """Start the writer task on the current event loop if it isn't running."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            # A context of its own, so the task doesn't count its statements
+            # towards the event that happened to start it
+            self._task = loop.create_task(self.run(), context=contextvars.Context())
+
+    async def run(self):
+        """Commit queued writes until cancelled, one transaction per batch."""
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._commit(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _next_batch(self) -> List[_Write]:
+        """Wait for a write, then collect what arrives within the window."""
+        batch = [await self._queue.get()]
+        full = 1 + self._queue.qsize() >= self.config.max_batch
+        if self.config.window_ms > 0 and not full:
+            await asyncio.sleep(self.config.window_ms / 1000)
+        while len(batch) < self.config.max_batch and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _commit(self, batch: List[_Write]):
+        try:
+            # The writer owns one connection, so the whole batch runs on a
+            # thread instead of hopping to the async driver per statement
+            outcomes = await asyncio.to_thread(self._apply, batch)
+        except Exception as e:
+            print(f"Database writer error: {str(e)}")
+            self.failed_batches += 1
+            self.failed_writes += len(batch)
+            for write in batch:
+                if not write.future.done():
+                    write.future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for write, (ok, value) in zip(batch, outcomes):
+            if ok:
+                self.writes += 1
+            else:
+                self.failed_writes += 1
+            if write.future.done():  # The caller was cancelled
+                continue
+            if ok:
+                write.future.set_result(value)
+            else:
+                write.future.set_exception(value)
+
+    @staticmethod
+    def _apply(batch: List[_Write]) -> List[Tuple[bool, Any]]:
+        """Run each write in its own savepoint and commit them all.
+
+        Returns:
+            (True, result) or (False, error) per write
+        """
+        outcomes = []
+        with db.writer_session() as session:
+            for write in batch:
+                try:
+                    with session.begin_nested():
+                        outcomes.append(
+                            (True, write.fn(session, *write.args, **write.kwargs))
+                        )
+                except Exception as e:
+                    outcomes.append((False, e))
+            session.commit()
+        return outcomes
+
+    async def close(self):
+        """Commit the writes still queued, then stop the writer task."""
+        if self._task is None or self._loop is not asyncio.get_running_loop():
+            return
+        await self._queue.join()
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.config.enabled,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "batches": self.batches,
+            "writes": self.writes,
+            "failed_writes": self.failed_writes,
+            "failed_batches": self.failed_batches,
+            "largest_batch": self.largest_batch,
+            "mean_batch": round(self.writes / self.batches, 2) if self.batches else 0,
+        }
+
+
+WRITER_CONFIG = WriterConfig.from_env()
+
+db_writer = DatabaseWriter(WRITER_CONFIG)
+
+
+@contextlib.asynccontextmanager
+async def db_writer_lifespan():
+    """App lifespan task committing writes still queued at shutdown."""
+    try:
+        yield
+    finally:
+        await db_writer.close()
+
+
+async def db_writer_stats_endpoint() -> Dict[str, Any]:
+    """API endpoint returning the database writer counters."""
+    return db_writer.stats()
@@ -0,0 +1,344 @@
+"""Units of work State submits to the database writer (see `writer`).
+
+Each takes the writer's session, then plain values read from the state
+before submitting: the write runs a little later, inside the writer's
+transaction, when the state may have moved on. None of them commits.
+"""
+
+from datetime import datetime, timezone
+from typing import *
+
+from sqlmodel import delete, select
+
+from .models import Chat, Document, Message, MessageStatus, Project
+from .prompt_cache import bump_knowledge_version, knowledge_version
+from .provider_cache import record_usage
+from .sequence import delete_after, delete_positions, message_at, next_seq
+from .sidebar_cache import lists_changed
+from .summarizer import reset_summary
+
+
+def touch_chat(session, chat_id: int):
+    """Move a chat to the top of its project's list."""
+    chat = session.get(Chat, chat_id)
+    if chat:
+        chat.updated_at = datetime.now(timezone.utc)
+        session.add(chat)
+        lists_changed(session, chat.project_id)
+
+
+def append_user_message(session, chat_id: int, content: str):
+    """Add a user message at the end of the chat."""
+    session.add(
+        Message(
+            role="user",
+            content=content,
+            chat_id=chat_id,
+            seq=next_seq(session, chat_id),
+        )
+    )
+    touch_chat(session, chat_id)
+
+
+def start_turn(
+    session, chat_id: int, content: str, models: List[str]
+) -> Optional[List[int]]:
+    """Add a user message and a streaming placeholder reply per model.
+
+    Returns:
+        The placeholder ids, the first one active; None if the chat is gone
+    """
+    if not session.get(Chat, chat_id):
+        return None
+    user_msg = Message(
+        role="user",
+        content=content,
+        chat_id=chat_id,
+        seq=next_seq(session, chat_id),
+    )
+    session.add(user_msg)
+    session.flush()
+
+    placeholders = [
+        Message(
+            role="assistant",
+            chat_id=chat_id,
+            status=MessageStatus.STREAMING.value,
+            model=model,
+            reply_to_id=user_msg.id,
+            is_active=i == 0,
+            seq=user_msg.seq + 1,
+        )
+        for i, model in enumerate(models)
+    ]
+    session.add_all(placeholders)
+    session.flush()
+    return [m.id for m in placeholders]
+
+
+def restart_reply(session, chat_id: int, seq: int, model: str) -> Optional[int]:
+    """Drop everything after the user message at `seq` and add a new placeholder reply.
+
+    Returns:
+        The placeholder's id; None if there is no user message at `seq`
+    """
+    if not session.get(Chat, chat_id):
+        return None
+    user_msg = message_at(session, chat_id, seq)
+    if not user_msg or user_msg.role != "user":
+        return None
+    delete_after(session, chat_id, user_msg.seq)
+    reset_summary(session, chat_id, user_msg.id)
+
+    placeholder = Message(
+        role="assistant",
+        chat_id=chat_id,
+        status=MessageStatus.STREAMING.value,
+        model=model,
+        reply_to_id=user_msg.id,
+        seq=user_msg.seq + 1,
+    )
+    session.add(placeholder)
+    session.flush()
+    return placeholder.id
+
+
+def finish_reply(
+    session,
+    message_id: int,
+    content: str,
+    reasoning: Optional[str],
+    status: str,
+    usage: Optional[Dict[str, Any]] = None,
+    chat_id: Optional[int] = None,
+) -> bool:
+    """Store a reply's final text and status, and touch `chat_id` if given."""
+    message = session.get(Message, message_id)
+    if not message:
+        return False
+    message.content = content
+    message.reasoning = reasoning
+    message.status = status
+    record_usage(message, usage)
+    session.add(message)
+    if chat_id is not None:
+        touch_chat(session, chat_id)
+    return True
+
+
+def fail_reply(session, message_id: int, error_message: str):
+    """Mark a reply as failed, keeping any checkpointed reasoning."""
+    message = session.get(Message, message_id)
+    if message:
+        message.content = error_message
+        message.status = MessageStatus.ERROR.value
+        session.add(message)
+
+
+def edit_message(
+    session,
+    chat_id: int,
+    seq: int,
+    role: Optional[str] = None,
+    content: Optional[str] = None,
+    reasoning: Optional[str] = None,
+    truncate: bool = False,
+) -> bool:
+    """Change the text of the active message at `seq`.
+
+    New content invalidates the chat's summary from that message on. With
+    `truncate`, the messages after it are deleted.
+
+    Returns:
+        Whether there was a message at `seq` with the given role
+    """
+    message = message_at(session, chat_id, seq)
+    if not message or (role is not None and message.role != role):
+        return False
+    if content is not None:
+        message.content = content
+        reset_summary(session, chat_id, message.id)
+    if reasoning is not None:
+        message.reasoning = reasoning
+    session.add(message)
+    if truncate:
+        delete_after(session, chat_id, message.seq)
+    return True
+
+
+def delete_message_at(session, chat_id: int, seq: int) -> bool:
+    """Delete the active message at `seq`.
+
+    A user message goes together with the response after it and that
+    response's alternatives, which share its position. The message after it
+    is only such a response if it replies to the user message: after its
+    response was deleted, it is the next user message.
+    """
+    if not session.get(Chat, chat_id):
+        return False
+    message = message_at(session, chat_id, seq)
+    if not message:
+        return False
+    count = 1
+    if message.role == "user":
+        following = message_at(session, chat_id, message.seq + 1)
+        if following and following.reply_to_id == message.id:
+            count = 2
+    delete_positions(session, chat_id, message.seq, count)
+    reset_summary(session, chat_id, message.id)
+    touch_chat(session, chat_id)
+    return True
+
+
+def promote_response(session, chat_id: int, message_id: int) -> bool:
+    """Make a sibling response the one that continues the conversation."""
+    target = session.get(Message, message_id)
+    if not target or target.chat_id != chat_id or target.reply_to_id is None:
+        return False
+    siblings = session.exec(
+        select(Message).where(Message.reply_to_id == target.reply_to_id)
+    ).all()
+    for sibling in siblings:
+        sibling.is_active = sibling.id == target.id
+        session.add(sibling)
+    reset_summary(session, chat_id, target.reply_to_id)
+    return True
+
+
+def save_project(
+    session,
+    project_id: Optional[int],
+    name: str,
+    description: str,
+    system_instructions: str,
+    documents: Sequence[Dict[str, str]] = (),
+) -> Optional[int]:
+    """Edit project `project_id`, or create a project with `documents` if it is None.
+
+    Returns:
+        The project's id; None if the project to edit is gone
+    """
+    if project_id is not None:
+        project = session.get(Project, project_id)
+        if not project:
+            return None
+        if system_instructions != project.system_instructions:
+            bump_knowledge_version(session, project.id)
+        project.name = name
+        project.description = description
+        project.system_instructions = system_instructions
+        project.updated_at = datetime.now(timezone.utc)
+        session.add(project)
+        lists_changed(session, project.id, projects=True)
+        return project.id
+
+    project = Project(
+        name=name, description=description, system_instructions=system_instructions
+    )
+    session.add(project)
+    session.flush()
+    lists_changed(session, project.id, projects=True)
+    for pending in documents:
+        session.add(
+            Document(
+                project_id=project.id,
+                name=pending.get("name", ""),
+                content=pending.get("content", ""),
+                type=pending.get("type", "text"),
+            )
+        )
+    return project.id
+
+
+def delete_project(session, project_id: int) -> bool:
+    """Delete a project with its chats, messages and documents."""
+    project = session.get(Project, project_id)
+    if not project:
+        return False
+    # Messages go in one statement: replies reference the messages they
+    # answer, which a row-by-row cascade could delete first
+    session.exec(
+        delete(Message).where(
+            Message.chat_id.in_(select(Chat.id).where(Chat.project_id == project_id))
+        )
+    )
+    session.delete(project)
+    lists_changed(session, project_id, projects=True)
+    return True
+
+
+def save_chat(
+    session, chat_id: Optional[int], project_id: Optional[int], name: str
+) -> Optional[int]:
+    """Rename chat `chat_id`, or create a chat in `project_id` if it is None.
+
+    Returns:
+        The chat's id; None if the chat to rename is gone
+    """
+    if chat_id is not None:
+        chat = session.get(Chat, chat_id)
+        if not chat:
+            return None
+        chat.name = name
+        chat.updated_at = datetime.now(timezone.utc)
+        session.add(chat)
+        lists_changed(session, chat.project_id)
+        return chat.id
+
+    chat = Chat(name=name, project_id=project_id)
+    session.add(chat)
+    session.flush()
+    lists_changed(session, project_id)
+    return chat.id
+
+
+def delete_chat(session, chat_id: int) -> bool:
+    """Delete a chat with its messages."""
+    chat = session.get(Chat, chat_id)
+    if not chat:
+        return False
+    # One statement, so replies go together with what they answer
+    session.exec(delete(Message).where(Message.chat_id == chat_id))
+    session.delete(chat)
+    lists_changed(session, chat.project_id)
+    return True
+
+
+def save_document(
+    session, document_id: Optional[int], project_id: int, name: str, content: str
+) -> Optional[Tuple[Optional[int], Document]]:
+    """Edit document `document_id`, or add a text document to `project_id` if it is None.
+
+    Returns:
+        The project's new knowledge version and the saved document; None if
+        the document to edit is gone
+    """
+    if document_id is not None:
+        document = session.get(Document, document_id)
+        if not document:
+            return None
+        document.name = name
+        document.content = content
+        document.updated_at = datetime.now(timezone.utc)
+    else:
+        document = Document(project_id=project_id, name=name, content=content, type="text")
+    session.add(document)
+    bump_knowledge_version(session, document.project_id)
+    session.flush()
+    return knowledge_version(session, document.project_id), document
+
+
+def delete_document(
+    session, document_id: int, project_id: int
+) -> Tuple[bool, Optional[int]]:
+    """Delete a document of `project_id`.
+
+    Returns:
+        Whether it was deleted, and the project's new knowledge version
+    """
+    document = session.get(Document, document_id)
+    if not document or document.project_id != project_id:
+        return False, None
+    session.delete(document)
+    bump_knowledge_version(session, project_id)
+    return True, knowledge_version(session, project_id)
@@ -0,0 +1,68 @@
+"""Benchmark: building streamed answers by string concatenation vs TextAccumulator.
+
+The legacy pattern is the one the generation loops used, including the UI
+message keeping a reference to the current string, which defeats CPython's
+in-place concatenation shortcut.
+
+    python -m benchmarks.accumulator
+"""
+
+import argparse
+import time
+
+from app.streaming import TextAccumulator
+
+
+class _UIMessage:
+    content = None
+
+
+def legacy(chunks, flush_every: int) -> str:
+    answer = ""
+    ui = _UIMessage()
+    for chunk in chunks:
+        answer = answer + chunk if answer else chunk
+        ui.content = answer
+    return answer
+
+
+def accumulated(chunks, flush_every: int) -> str:
+    answer = TextAccumulator()
+    ui = _UIMessage()
+    ui.content = ""
+    for i, chunk in enumerate(chunks):
+        answer.append(chunk)
+        if i % flush_every == 0:
+            ui.content = answer.take_delta()
+    answer.take_delta()
+    return answer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--chunk-chars", type=int, default=4)
+    parser.add_argument(
+        "--flush-every", type=int, default=64, help="Chunks per UI flush"
+    )
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        chunks = ["あいう考"[: args.chunk_chars]] * (size // args.chunk_chars)
+        results = {}
+        for name, fn in (("legacy", legacy), ("accumulator", accumulated)):
+            started = time.perf_counter()
+            text = fn(chunks, args.flush_every)
+            results[name] = time.perf_counter() - started
+            assert len(text) == len(chunks) * args.chunk_chars
+        speedup = results["legacy"] / results["accumulator"]
+        print(
+            f"{size:>9} chars: legacy {results['legacy'] * 1000:9.2f} ms  "
+            f"accumulator {results['accumulator'] * 1000:7.2f} ms  ({speedup:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""Record/replay cassettes for upstream SSE streams.
+
+A cassette is a gzip-compressed JSON-lines file: a header line describing the
+request, then one line per network read with its offset from the start of the
+response in milliseconds and the raw bytes (base64). Bytes are stored exactly
+as received, including reads that split multi-byte characters.
+
+    # Record a real OpenRouter stream (needs OPENROUTER_API_KEY)
+    python -m benchmarks.cassette record -m deepseek/deepseek-r1 \\
+        -p "Explain SSE in Japanese" -o cassettes/r1-ja.jsonl.gz
+
+    # Replay through StreamProcessor, as fast as possible or at original speed
+    python -m benchmarks.cassette replay cassettes/r1-ja.jsonl.gz --speed 0
+    python -m benchmarks.cassette replay cassettes/r1-ja.jsonl.gz --speed 1
+
+Cassettes can also be served over HTTP with
+`python -m benchmarks.mock_openrouter --cassette <path>` to replay them through
+the full `State.process_question` pipeline.
+"""
+
+import argparse
+import asyncio
+import base64
+import gzip
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import *
+
+CASSETTE_VERSION = 1
+
+
+@dataclass
+class Cassette:
+    """A recorded response: request metadata plus timed raw reads."""
+
+    header: Dict[str, Any] = field(default_factory=dict)
+    chunks: List[Tuple[float, bytes]] = field(default_factory=list)  # (offset ms, bytes)
+
+    @property
+    def size(self) -> int:
+        return sum(len(data) for _, data in self.chunks)
+
+    @property
+    def duration_ms(self) -> float:
+        return self.chunks[-1][0] if self.chunks else 0.0
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(json.dumps({"version": CASSETTE_VERSION, **self.header}) + "\n")
+            for offset, data in self.chunks:
+                record = {"t": round(offset, 3), "b": base64.b64encode(data).decode()}
+                f.write(json.dumps(record) + "\n")
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if header.get("version") != CASSETTE_VERSION:
+                raise ValueError(f"Unsupported cassette version: {header.get('version')}")
+            chunks = []
+            for line in f:
+                record = json.loads(line)
+                chunks.append((record["t"], base64.b64decode(record["b"])))
+        return cls(header=header, chunks=chunks)
+
+    async def iter_chunks(self, speed: float = 1.0) -> AsyncIterator[bytes]:
+        """Yield the recorded reads, paced at `speed` x original timing (0 = no delay)."""
+        started = time.perf_counter()
+        for offset, data in self.chunks:
+            if speed > 0:
+                delay = offset / 1000 / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield data
+
+
+class _ReplayContent:
+    """Stand-in for aiohttp's StreamReader backed by a cassette."""
+
+    def __init__(self, cassette: Cassette, speed: float):
+        self._chunks = cassette.iter_chunks(speed)
+        self._pending = b""
+
+    async def read(self, n: int = -1) -> bytes:
+        if not self._pending:
+            try:
+                self._pending = await self._chunks.__anext__()
+            except StopAsyncIteration:
+                return b""
+        if n < 0 or n >= len(self._pending):
+            data, self._pending = self._pending, b""
+        else:
+            data, self._pending = self._pending[:n], self._pending[n:]
+        return data
+
+
+class ReplayResponse:
+    """Minimal aiohttp.ClientResponse replacement accepted by StreamProcessor."""
+
+    def __init__(self, cassette: Cassette, speed: float = 1.0):
+        self.content = _ReplayContent(cassette, speed)
+        self.closed = False
+
+    async def release(self):
+        self.closed = True
+
+
+async def record(
+    model: str,
+    prompt: str,
+    output: str,
+    base_url: str = "https://openrouter.ai/api/v1",
+    include_reasoning: bool = True,
+) -> Cassette:
+    """Stream one real completion and store every read with its timing."""
+    import aiohttp
+
+    payload = {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "stream": True,
+        "include_reasoning": include_reasoning,
+    }
+    headers = {
+        "Authorization": f"Bearer {os.getenv('OPENROUTER_API_KEY')}",
+        "Content-Type": "application/json",
+    }
+    cassette = Cassette(
+        header={
+            "model": model,
+            "prompt": prompt,
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+        }
+    )
+    async with aiohttp.ClientSession() as session:
+        started = time.perf_counter()
+        async with session.post(
+            f"{base_url.rstrip('/')}/chat/completions", headers=headers, json=payload
+        ) as response:
+            cassette.header["status"] = response.status
+            async for data in response.content.iter_any():
+                offset = (time.perf_counter() - started) * 1000
+                cassette.chunks.append((offset, data))
+    cassette.save(output)
+    return cassette
+
+
+async def replay(path: str, speed: float, repeat: int):
+    from app.state import StreamProcessor
+
+    cassette = Cassette.load(path)
+    size_mb = cassette.size / (1024 * 1024)
+    print(
+        f"{path}: {cassette.header.get('model')} "
+        f"{len(cassette.chunks)} reads, {cassette.size} bytes, "
+        f"{cassette.duration_ms:.0f} ms recorded"
+    )
+    for _ in range(repeat):
+        content_chars = reasoning_chars = chunks = 0
+        errors = []
+        started = time.perf_counter()
+        processor = StreamProcessor(ReplayResponse(cassette, speed), None)
+        async for chunk in processor:
+            chunks += 1
+            if chunk.error:
+                errors.append(chunk.error)
+            content_chars += len(chunk.content or "")
+            reasoning_chars += len(chunk.reasoning or "")
+        elapsed = time.perf_counter() - started
+        print(
+            f"  {elapsed * 1000:9.1f} ms  {size_mb / elapsed:8.2f} MB/s  "
+            f"{chunks} chunks, {content_chars} content / "
+            f"{reasoning_chars} reasoning chars"
+            + (f", errors: {errors}" if errors else "")
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = commands.add_parser("record", help="Record a real upstream stream")
+    record_parser.add_argument("-m", "--model", required=True)
+    record_parser.add_argument("-p", "--prompt", required=True)
+    record_parser.add_argument("-o", "--output", required=True)
+    record_parser.add_argument(
+        "--base-url",
+        default=os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1"),
+    )
+
+    replay_parser = commands.add_parser("replay", help="Replay through StreamProcessor")
+    replay_parser.add_argument("path")
+    replay_parser.add_argument(
+        "--speed", type=float, default=0.0, help="1 = original timing, 0 = no delay"
+    )
+    replay_parser.add_argument("--repeat", type=int, default=3)
+
+    args = parser.parse_args()
+    if args.command == "record":
+        cassette = asyncio.run(
+            record(args.model, args.prompt, args.output, base_url=args.base_url)
+        )
+        print(
+            f"Recorded {len(cassette.chunks)} reads, {cassette.size} bytes, "
+            f"{cassette.duration_ms:.0f} ms to {args.output}"
+        )
+    else:
+        asyncio.run(replay(args.path, args.speed, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""Streaming throughput while another session writes heavily to the database.
+
+Concurrent users stream replies from the in-process mock OpenRouter server and
+persist each finished reply, as process_question does. Meanwhile one writer
+keeps rewriting a large chat. Both run on one event loop, as they do in a
+Reflex worker. With --mode sync every write goes through a blocking
+`db.session()`, the way the handlers used to. With --mode async it goes
+through `db.asession()`. Both use the same tuned engine. Reports stream
+latency, aggregate tokens/s, failed writes and how late the event loop ran.
+
+    python -m benchmarks.db_contention --mode both --users 20 --rows 50000
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import *
+
+# Point the app at a throwaway database before it is configured
+_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="db-contention-"), "bench.db")
+os.environ["DB_URL"] = f"sqlite:///{_DB_PATH}"
+
+import reflex as rx
+import sqlalchemy
+from sqlmodel import insert, update
+
+from app import db
+from app.http_pool import client_registry
+from app.models import Chat, Message, Project
+from app.streaming import FlushPolicy
+from benchmarks.mock_openrouter import (
+    add_config_arguments,
+    config_from_args,
+    start_server,
+)
+from benchmarks.stream_e2e import one_request, percentile
+
+
+def seed(rows: int) -> Tuple[int, int]:
+    """A project with a large chat for the writer and a chat for the streams."""
+    with rx.session() as session:
+        project = Project(name="bench")
+        session.add(project)
+        session.flush()
+        big = Chat(name="big", project_id=project.id)
+        target = Chat(name="streams", project_id=project.id)
+        session.add_all([big, target])
+        session.flush()
+        session.exec(
+            insert(Message),
+            params=[
+                {
+                    "role": "user" if i % 2 == 0 else "assistant",
+                    "content": "filler " * 40,
+                    "chat_id": big.id,
+                    "seq": i,
+                }
+                for i in range(rows)
+            ],
+        )
+        session.commit()
+        return big.id, target.id
+
+
+def rewrite_statement(chat_id: int, round: int):
+    return (
+        update(Message)
+        .where(Message.chat_id == chat_id)
+        .values(token_count=round, content=Message.content + "")
+    )
+
+
+async def writer(
+    mode: str, chat_id: int, gap_s: float, done: asyncio.Event, stats: Dict[str, Any]
+):
+    """Rewrite every row of the big chat, one transaction at a time.
+
+    The gap between transactions lets other writers take SQLite's write lock.
+    """
+    while not done.is_set():
+        started = time.perf_counter()
+        if mode == "sync":
+            with db.session() as session:
+                session.exec(rewrite_statement(chat_id, stats["writes"]))
+                session.commit()
+        else:
+            async with db.asession() as session:
+                await session.exec(rewrite_statement(chat_id, stats["writes"]))
+                await session.commit()
+        stats["writes"] += 1
+        stats["write_ms"].append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(gap_s)
+
+
+async def persist(mode: str, chat_id: int, seq: int, content: str):
+    """Store a finished reply, as process_question does."""
+    message = Message(role="assistant", content=content, chat_id=chat_id, seq=seq)
+    if mode == "sync":
+        with db.session() as session:
+            session.add(message)
+            session.commit()
+    else:
+        async with db.asession() as session:
+            session.add(message)
+            await session.commit()
+
+
+async def ticker(done: asyncio.Event, lags: List[float], interval: float = 0.01):
+    """Record how late the loop wakes up from short sleeps."""
+    loop = asyncio.get_running_loop()
+    while not done.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lags.append((loop.time() - started - interval) * 1000)
+
+
+async def user(
+    mode: str,
+    base_url: str,
+    chat_id: int,
+    requests: int,
+    policy: FlushPolicy,
+    results: list,
+):
+    for _ in range(requests):
+        result = await one_request(base_url, policy)
+        started = time.perf_counter()
+        try:
+            await persist(mode, chat_id, len(results), "reply " * result["tokens"])
+        except sqlalchemy.exc.OperationalError as e:
+            result["error"] = str(e.orig)
+        result["persist"] = time.perf_counter() - started
+        results.append(result)
+
+
+async def run_mode(mode: str, args, base_url: str, big_chat: int, target_chat: int):
+    policy = FlushPolicy(interval_ms=args.flush_ms, max_chars=args.flush_chars)
+    results: List[Dict[str, Any]] = []
+    lags: List[float] = []
+    stats: Dict[str, Any] = {"writes": 0, "write_ms": []}
+    done = asyncio.Event()
+
+    background = [asyncio.create_task(ticker(done, lags))]
+    if not args.no_writer:
+        background.append(
+            asyncio.create_task(
+                writer(mode, big_chat, args.write_gap_ms / 1000, done, stats)
+            )
+        )
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(
+            *(
+                user(mode, base_url, target_chat, args.requests, policy, results)
+                for _ in range(args.users)
+            )
+        )
+    finally:
+        wall = time.perf_counter() - started
+        done.set()
+        await asyncio.gather(*background)
+
+    latency = [r["latency"] * 1000 for r in results]
+    ttft = [r["ttft"] * 1000 for r in results]
+    persisted = [r["persist"] * 1000 for r in results]
+    tokens = sum(r["tokens"] for r in results)
+    errors = sum(1 for r in results if r["error"])
+    print(f"[{mode}] {len(results)} streams ({errors} failed) in {wall:.2f} s")
+    print(f"  throughput: {tokens / wall:.1f} tokens/s aggregate")
+    for name, values in (
+        ("ttft", ttft),
+        ("latency", latency),
+        ("persist", persisted),
+        ("loop lag", lags),
+    ):
+        print(
+            f"  {name:>8} ms: p50 {percentile(values, 50):8.1f}  "
+            f"p99 {percentile(values, 99):8.1f}  max {max(values, default=0):8.1f}"
+        )
+    if stats["writes"]:
+        print(
+            f"  writer: {stats['writes']} rewrites of {args.rows} rows, "
+            f"p50 {percentile(stats['write_ms'], 50):.1f} ms"
+        )
+
+
+async def run(args):
+    rx.Model.migrate()
+    big_chat, target_chat = seed(args.rows)
+    runner, base_url = await start_server(config_from_args(args))
+    try:
+        modes = ["sync", "async"] if args.mode == "both" else [args.mode]
+        for mode in modes:
+            await run_mode(mode, args, base_url, big_chat, target_chat)
+    finally:
+        await client_registry.close()
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=["sync", "async", "both"], default="both")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=3, help="Requests per user")
+    parser.add_argument("--rows", type=int, default=50000, help="Rows the writer rewrites")
+    parser.add_argument("--write-gap-ms", type=float, default=50.0)
+    parser.add_argument("--no-writer", action="store_true", help="Baseline without writes")
+    parser.add_argument("--flush-ms", type=float, default=FlushPolicy.interval_ms)
+    parser.add_argument("--flush-chars", type=int, default=FlushPolicy.max_chars)
+    add_config_arguments(parser)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""SQL statements per event handler: a budget check against N+1 regressions.
+
+Seeds a throwaway database through the alembic migrations, then runs the
+navigation and paging handlers on a real State instance and counts the SQL
+statements each one executes (`unit_of_work.count_statements`). Each handler
+runs twice:
+
+- "separate": its nested helpers and handlers each get their own unit of
+  work, as when every helper opened a session of its own
+- "unit of work": it runs the way Reflex runs it, with one session and
+  deduplicated loads for the whole event
+
+Exits with status 1 if a handler goes over its budget in BUDGETS. Statements
+of writes committed by the database writer are not counted. The sidebar
+cache is disabled and the row cache emptied before each run, so each run
+reads the lists it needs and loads the rows it shows.
+
+    python -m benchmarks.event_queries --chats 20 --messages 300
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from typing import *
+
+# Point the app at a throwaway database before it is configured
+_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="event-queries-"), "events.db")
+os.environ["DB_URL"] = f"sqlite:///{_DB_PATH}"
+
+import reflex as rx
+from reflex.istate.data import RouterData
+from sqlmodel import insert
+
+from app import writes
+from app.models import Chat, Message, Project
+from app.row_cache import row_cache
+from app.sidebar_cache import SidebarCacheConfig, sidebar_cache
+from app.state import State
+from app.unit_of_work import count_statements
+from app.writer import db_writer
+
+# Most statements each handler may execute in one event, including loading
+# the selected project and chat into the row cache
+BUDGETS = {
+    "handle_project_route": 3,
+    "handle_chat_route": 7,
+    "select_chat": 4,
+    "load_projects": 1,
+    "load_older_messages": 1,
+    "load_newer_messages": 2,
+    "start_editing_user_message": 1,
+}
+
+
+async def seed(chats: int, messages: int) -> Tuple[int, int]:
+    """A project with documents and chats; returns its id and a chat's id."""
+    project_id = await db_writer.submit(
+        writes.save_project,
+        None,
+        "bench",
+        "",
+        "Answer briefly.",
+        [{"name": f"doc {d}", "content": "lorem ipsum " * 50} for d in range(5)],
+    )
+    chat_ids = [
+        await db_writer.submit(writes.save_chat, None, project_id, f"chat {c}")
+        for c in range(chats)
+    ]
+
+    def add_messages(session, chat_id: int):
+        session.exec(
+            insert(Message),
+            params=[
+                {
+                    "role": "user" if m % 2 == 0 else "assistant",
+                    "content": f"message {m}",
+                    "chat_id": chat_id,
+                    "seq": m,
+                }
+                for m in range(messages)
+            ],
+        )
+
+    await db_writer.submit(add_messages, chat_ids[0])
+    return project_id, chat_ids[0]
+
+
+def new_state(project_id: int, chat_id: int) -> State:
+    """A State as a fresh browser tab on the chat's page would have it."""
+    root = rx.State(_reflex_internal_init=True)
+    root.router = RouterData(
+        {
+            "pathname": f"/projects/{project_id}/chats/{chat_id}",
+            "query": {"project_id": str(project_id), "chat_id": str(chat_id)},
+        }
+    )
+    return root.substates[State.get_name()]
+
+
+def scenarios(project_id: int, chat_id: int) -> Dict[str, Tuple[Callable, tuple]]:
+    """Handler name -> (setup on a fresh state, handler arguments)."""
+
+    async def on_chat(state: State):
+        await state.handle_chat_route()
+
+    async def scrolled_back(state: State):
+        # Far enough that the newest messages dropped out of the window
+        await state.handle_chat_route()
+        while state.has_older_messages and not state.has_newer_messages:
+            await state.load_older_messages()
+
+    async def nothing(state: State):
+        pass
+
+    return {
+        "handle_project_route": (nothing, ()),
+        "handle_chat_route": (nothing, ()),
+        "select_chat": (nothing, (chat_id,)),
+        "load_projects": (nothing, ()),
+        "load_older_messages": (on_chat, ()),
+        "load_newer_messages": (scrolled_back, ()),
+        "start_editing_user_message": (on_chat, (0,)),
+    }
+
+
+async def count(
+    name: str, setup: Callable, args: tuple, ids: Tuple[int, int], separate: bool
+) -> int:
+    state = new_state(*ids)
+    await setup(state)
+    handler = State.event_handlers[name].fn
+    if separate:
+        handler = handler.__wrapped__
+    row_cache.invalidate_all(Project)
+    row_cache.invalidate_all(Chat)
+    with count_statements() as counter:
+        await handler(state, *args)
+    return counter.statements
+
+
+async def run(args) -> int:
+    rx.Model.migrate()
+    sidebar_cache.config = SidebarCacheConfig(enabled=False)
+    ids = await seed(args.chats, args.messages)
+
+    failures = 0
+    print(f"{'handler':<28} {'separate':>8} {'unit of work':>12} {'budget':>6}")
+    for name, (setup, handler_args) in scenarios(*ids).items():
+        separate = await count(name, setup, handler_args, ids, separate=True)
+        shared = await count(name, setup, handler_args, ids, separate=False)
+        budget = BUDGETS[name]
+        ok = shared <= budget
+        failures += not ok
+        print(
+            f"{name:<28} {separate:>8} {shared:>12} {budget:>6}"
+            + ("" if ok else "  OVER BUDGET")
+        )
+    await db_writer.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=300)
+    failures = asyncio.run(run(parser.parse_args()))
+    if failures:
+        print(f"{failures} handlers are over their statement budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
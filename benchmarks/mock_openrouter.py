@@ -0,0 +1,306 @@
+"""Local OpenRouter-compatible mock server for deterministic streaming benchmarks.
+
+Implements POST /chat/completions (streaming SSE and non-streaming JSON) with
+configurable pacing and failure modes. Point the app at it with
+
+    python -m benchmarks.mock_openrouter --port 8787 --tokens-per-sec 80
+    OPENROUTER_BASE_URL=http://127.0.0.1:8787 reflex run
+
+Server-wide defaults come from the command line. A request can override any of
+them with a "mock" object in its JSON body, e.g. {"mock": {"error_after": 20}}.
+With --cassette the recorded bytes of a real stream are served instead (see
+benchmarks/cassette.py).
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import hashlib
+import json
+import random
+import time
+from dataclasses import dataclass
+from typing import *
+
+from aiohttp import web
+
+from benchmarks.cassette import Cassette
+
+WORDS = [
+    "the", "stream", "parser", "token", "latency", "buffer", "model", "reply",
+    "日本語", "テスト", "こんにちは", "世界", "推論", "応答",
+]
+
+
+@dataclass
+class MockConfig:
+    """Pacing and failure injection for generated streams."""
+
+    tokens: int = 256  # Content tokens per response
+    reasoning_tokens: int = 0  # Reasoning tokens per response
+    tokens_per_sec: float = 100.0  # 0 sends as fast as possible
+    ttft_ms: float = 200.0  # Delay before the first chunk
+    tokens_per_chunk: int = 1
+    interleave: bool = False  # Alternate reasoning/content chunks instead of reasoning first
+    keepalive_every_s: float = 0.0  # Send ": OPENROUTER PROCESSING" comments while waiting
+    error_after: int = -1  # Send an error payload after this many tokens (-1 disables)
+    disconnect_after: int = -1  # Drop the connection after this many tokens (-1 disables)
+    fail_first: int = 0  # Answer this many requests with fail_status before succeeding
+    fail_status: int = 503
+    slow_first: int = 0  # Use slow_ttft_ms instead of ttft_ms for this many requests
+    slow_ttft_ms: float = 5000.0
+    seed: int = 0
+    cassette: str = ""  # Serve this recorded stream instead of generated tokens
+    replay_speed: float = 1.0  # Cassette pacing, 1 = original timing, 0 = no delay
+
+    def merged(self, overrides: Optional[Dict[str, Any]]) -> "MockConfig":
+        if not overrides:
+            return self
+        known = {f.name for f in dataclasses.fields(self)}
+        return dataclasses.replace(
+            self, **{k: v for k, v in overrides.items() if k in known}
+        )
+
+
+def _plan(config: MockConfig) -> List[Tuple[str, str]]:
+    """Deterministic list of (field, text) chunks for one response."""
+    rng = random.Random(config.seed)
+
+    def words(count: int) -> List[str]:
+        return [rng.choice(WORDS) + " " for _ in range(count)]
+
+    def chunked(field: str, tokens: List[str]) -> List[Tuple[str, str]]:
+        size = max(1, config.tokens_per_chunk)
+        return [
+            (field, "".join(tokens[i : i + size])) for i in range(0, len(tokens), size)
+        ]
+
+    reasoning = chunked("reasoning", words(config.reasoning_tokens))
+    content = chunked("content", words(config.tokens))
+    if not config.interleave:
+        return reasoning + content
+
+    plan = []
+    for i in range(max(len(reasoning), len(content))):
+        if i < len(reasoning):
+            plan.append(reasoning[i])
+        if i < len(content):
+            plan.append(content[i])
+    return plan
+
+
+def _sse(payload: Dict[str, Any]) -> bytes:
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode()
+
+
+def _chunk_payload(model: str, field: str, text: str) -> Dict[str, Any]:
+    return {
+        "id": "gen-mock",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": {"role": "assistant", field: text}}],
+    }
+
+
+def _text(content: Any) -> str:
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content)
+    return content or ""
+
+
+def _usage(
+    app: web.Application, body: Dict[str, Any], config: MockConfig
+) -> Dict[str, Any]:
+    """Usage block at ~4 chars per token; a repeated system prompt counts as cached."""
+    messages = body.get("messages", [])
+    prompt_tokens = sum(len(_text(m.get("content"))) for m in messages) // 4
+    cached_tokens = 0
+    if messages and messages[0].get("role") == "system":
+        system = _text(messages[0].get("content"))
+        key = hashlib.sha256(system.encode()).hexdigest()
+        if key in app["prefix_cache"]:
+            cached_tokens = len(system) // 4
+        app["prefix_cache"].add(key)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": config.tokens + config.reasoning_tokens,
+        "total_tokens": prompt_tokens + config.tokens + config.reasoning_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached_tokens},
+    }
+
+
+async def _sleep_with_keepalive(
+    response: web.StreamResponse, seconds: float, keepalive_every: float
+):
+    """Sleep, writing SSE comments every `keepalive_every` seconds if enabled."""
+    if keepalive_every <= 0:
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+        return
+    deadline = time.perf_counter() + seconds
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return
+        await asyncio.sleep(min(keepalive_every, remaining))
+        if time.perf_counter() < deadline:
+            await response.write(b": OPENROUTER PROCESSING\n\n")
+
+
+async def chat_completions(request: web.Request) -> web.StreamResponse:
+    body = await request.json()
+    config: MockConfig = request.app["config"].merged(body.get("mock"))
+    model = body.get("model", "mock/model")
+    plan = _plan(config)
+    number = request.app["stats"]["requests"]
+    request.app["stats"]["requests"] += 1
+
+    if number < config.fail_first:
+        return web.json_response(
+            {"error": {"code": config.fail_status, "message": "Mock upstream failure"}},
+            status=config.fail_status,
+            headers={"Retry-After": "0"},
+        )
+    if number < config.fail_first + config.slow_first:
+        config = dataclasses.replace(config, ttft_ms=config.slow_ttft_ms)
+
+    usage = _usage(request.app, body, config)
+
+    if not body.get("stream"):
+        await asyncio.sleep(config.ttft_ms / 1000)
+        content = "".join(text for field, text in plan if field == "content")
+        reasoning = "".join(text for field, text in plan if field == "reasoning")
+        return web.json_response(
+            {
+                "id": "gen-mock",
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {
+                            "role": "assistant",
+                            "content": content,
+                            "reasoning": reasoning or None,
+                        },
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            }
+        )
+
+    response = web.StreamResponse(
+        headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+    )
+    await response.prepare(request)
+
+    try:
+        # Streams only carry usage when asked for, as on OpenRouter
+        stream_usage = usage if (body.get("usage") or {}).get("include") else None
+        await _write_stream(request, response, config, model, plan, stream_usage)
+    except ConnectionResetError:
+        pass  # The client went away, e.g. a hedged request that lost the race
+    return response
+
+
+async def _write_stream(
+    request: web.Request,
+    response: web.StreamResponse,
+    config: MockConfig,
+    model: str,
+    plan: List[Tuple[str, str]],
+    usage: Optional[Dict[str, Any]],
+):
+    if config.cassette:
+        cassettes = request.app["cassettes"]
+        if config.cassette not in cassettes:
+            cassettes[config.cassette] = Cassette.load(config.cassette)
+        async for data in cassettes[config.cassette].iter_chunks(config.replay_speed):
+            await response.write(data)
+        await response.write_eof()
+        return
+
+    await _sleep_with_keepalive(
+        response, config.ttft_ms / 1000, config.keepalive_every_s
+    )
+
+    started = time.perf_counter()
+    sent_tokens = 0
+    for field, text in plan:
+        if 0 <= config.error_after <= sent_tokens:
+            await response.write(
+                _sse({"error": {"code": 502, "message": "Mock upstream error"}})
+            )
+            return
+        if 0 <= config.disconnect_after <= sent_tokens:
+            request.transport.close()
+            return
+
+        await response.write(_sse(_chunk_payload(model, field, text)))
+        sent_tokens += max(1, len(text.split()))
+
+        if config.tokens_per_sec > 0:
+            due = started + sent_tokens / config.tokens_per_sec
+            await _sleep_with_keepalive(
+                response, due - time.perf_counter(), config.keepalive_every_s
+            )
+
+    final = {"choices": [{"delta": {}, "finish_reason": "stop"}]}
+    if usage:
+        final["usage"] = usage
+    await response.write(_sse(final))
+    await response.write(b"data: [DONE]\n\n")
+    await response.write_eof()
+
+
+def create_app(config: Optional[MockConfig] = None) -> web.Application:
+    app = web.Application()
+    app["config"] = config or MockConfig()
+    app["stats"] = {"requests": 0}
+    app["cassettes"] = {}
+    app["prefix_cache"] = set()
+    app.router.add_post("/chat/completions", chat_completions)
+    app.router.add_post("/api/v1/chat/completions", chat_completions)
+    return app
+
+
+async def start_server(
+    config: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0
+) -> Tuple[web.AppRunner, str]:
+    """Start the mock server in the running loop and return (runner, base_url)."""
+    runner = web.AppRunner(create_app(config))
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}"
+
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    """Expose every MockConfig field as a command line option."""
+    for f in dataclasses.fields(MockConfig):
+        flag = "--" + f.name.replace("_", "-")
+        if f.type is bool:
+            parser.add_argument(flag, action="store_true", default=f.default)
+        else:
+            parser.add_argument(flag, type=type(f.default), default=f.default)
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        **{f.name: getattr(args, f.name) for f in dataclasses.fields(MockConfig)}
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    web.run_app(create_app(config_from_args(args)), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
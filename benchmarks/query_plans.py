@@ -0,0 +1,238 @@
+"""Query-plan check: the hot queries must be answered from indexes.
+
+Seeds a throwaway SQLite database through the alembic migrations, runs the
+app's hot lookups through the ORM while recording the SQL they emit, then runs
+EXPLAIN QUERY PLAN on each statement. Prints per-query timings and exits with
+status 1 if any of them scans a whole table without an index or sorts in a
+temporary b-tree.
+
+    python -m benchmarks.query_plans --projects 20 --chats 50 --messages 200
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import *
+
+# Point the app at a throwaway database before it is configured
+_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="query-plans-"), "plans.db")
+os.environ["DB_URL"] = f"sqlite:///{_DB_PATH}"
+
+import reflex as rx
+from sqlalchemy import event
+from sqlalchemy.orm import selectinload
+from sqlmodel import select
+
+from app.models import Chat, Document, Message, Project
+from app.checkpoint import abort_stale_responses
+from app.context import load_history
+from app.sequence import (
+    delete_after,
+    delete_positions,
+    message_at,
+    next_seq,
+    page_after,
+    page_before,
+)
+from app.state import State, list_project_chats, list_projects
+
+
+def seed(projects: int, chats: int, messages: int, seed: int):
+    rng = random.Random(seed)
+    with rx.session() as session:
+        for p in range(projects):
+            project = Project(name=f"project {p}")
+            session.add(project)
+            session.flush()
+            for d in range(5):
+                session.add(
+                    Document(
+                        project_id=project.id,
+                        name=f"doc {d}",
+                        type="text",
+                        content="lorem ipsum " * rng.randint(10, 100),
+                    )
+                )
+            for c in range(chats):
+                chat = Chat(name=f"chat {c}", project_id=project.id)
+                session.add(chat)
+                session.flush()
+                previous_user = None
+                for m in range(messages):
+                    msg = Message(
+                        role="user" if m % 2 == 0 else "assistant",
+                        content="hello " * rng.randint(5, 50),
+                        chat_id=chat.id,
+                        reply_to_id=previous_user if m % 2 else None,
+                        seq=m,
+                    )
+                    session.add(msg)
+                    if m % 2 == 0:
+                        session.flush()
+                        previous_user = msg.id
+            session.commit()
+    with rx.model.get_engine().connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+        conn.commit()
+
+
+def hot_queries(
+    project_id: int, chat_id: int, user_msg_id: int, middle: int
+) -> Dict[str, Callable]:
+    """The lookups behind the sidebars, chat view, edits, prompts and summaries.
+
+    Writes run in a session that is never committed.
+    """
+    return {
+        # State.load_projects
+        "load_projects": list_projects,
+        # State.load_project_chats
+        "load_project_chats": lambda s: list_project_chats(s, project_id),
+        # Chat.messages
+        "chat_messages": lambda s: s.get(Chat, chat_id).messages,
+        # Message windows (app.sequence), used by load_messages and paging
+        "latest_page": lambda s: page_before(s, chat_id, None, 50),
+        "older_page": lambda s: page_before(s, chat_id, middle, 50),
+        "newer_page": lambda s: page_after(s, chat_id, middle, 50),
+        # State.format_messages
+        "load_history": lambda s: load_history(s, chat_id, 0, 2000),
+        # Project.knowledge via selectinload in format_messages
+        "project_knowledge": lambda s: s.exec(
+            select(Project)
+            .options(selectinload(Project.knowledge))
+            .where(Project.id == project_id)
+        ).first(),
+        # State._load_fanout_slots / promote_response
+        "sibling_responses": lambda s: s.exec(
+            select(Message)
+            .where(Message.reply_to_id == user_msg_id)
+            .order_by(Message.id)
+        ).all(),
+        # Positional edits (app.sequence), used by every edit handler
+        "message_at": lambda s: message_at(s, chat_id, middle),
+        "next_seq": lambda s: next_seq(s, chat_id),
+        "delete_after": lambda s: delete_after(s, chat_id, middle),
+        "delete_positions": lambda s: delete_positions(s, chat_id, middle, 2),
+        # State._refresh_context_estimate: document and history token sums
+        "context_estimate": lambda s: State._context_estimate(
+            SimpleNamespace(current_project_id=project_id, current_chat_id=chat_id), s
+        ),
+        # app.checkpoint: responses left streaming by dead workers
+        "stale_responses": lambda s: abort_stale_responses(
+            s, datetime.now(timezone.utc)
+        ),
+        # app.summarizer.pending_turns
+        "summary_pending": lambda s: s.exec(
+            select(Message)
+            .where(
+                Message.chat_id == chat_id,
+                Message.is_active == True,
+                Message.seq >= middle,
+            )
+            .order_by(Message.seq)
+        ).all(),
+    }
+
+
+def bad_plan_steps(plan: List[str]) -> List[str]:
+    """Plan steps that read a whole table without an index or sort outside one.
+
+    "SCAN t USING INDEX" is fine: it walks the table in index order, which is
+    what an unfiltered ordered listing (e.g. load_projects) has to do.
+    "SCAN CONSTANT ROW" is the single row of a SELECT without a FROM, like
+    the one wrapping the context estimate's subqueries.
+    """
+    bad = []
+    for step in plan:
+        if step == "SCAN CONSTANT ROW":
+            continue
+        if step.startswith("SCAN ") and "USING" not in step:
+            bad.append(step)
+        elif "USE TEMP B-TREE" in step:
+            bad.append(step)
+    return bad
+
+
+def plan_problems(engine, query: Callable) -> List[str]:
+    """Bad plan steps (`bad_plan_steps`) of the statements `query(session)` runs."""
+    statements: List[Tuple[str, Any]] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        with rx.session() as session:
+            query(session)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    bad = []
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            plan = [
+                row[-1]
+                for row in conn.exec_driver_sql(
+                    f"EXPLAIN QUERY PLAN {statement}", parameters
+                )
+            ]
+            bad.extend(bad_plan_steps(plan))
+    return bad
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rx.Model.migrate()
+    started = time.perf_counter()
+    seed(args.projects, args.chats, args.messages, args.seed)
+    print(
+        f"seeded {args.projects} projects x {args.chats} chats x "
+        f"{args.messages} messages in {time.perf_counter() - started:.1f}s"
+    )
+
+    engine = rx.model.get_engine()
+    with rx.session() as session:
+        project_id = args.projects // 2 + 1
+        chat_id = session.exec(
+            select(Chat.id).where(Chat.project_id == project_id)
+        ).first()
+        user_msg_id = session.exec(
+            select(Message.id).where(Message.chat_id == chat_id, Message.role == "user")
+        ).first()
+
+    failures = 0
+    queries = hot_queries(project_id, chat_id, user_msg_id, args.messages // 2)
+    for name, query in queries.items():
+        bad = plan_problems(engine, query)
+        timings = []
+        for _ in range(args.repeat):
+            with rx.session() as session:
+                started = time.perf_counter()
+                query(session)
+                timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        status = "FAIL" if bad else "ok"
+        print(f"{status:4} {name:24} p50 {timings[len(timings) // 2]:7.2f} ms")
+        for step in bad:
+            print(f"       {step}")
+        failures += bool(bad)
+
+    if failures:
+        print(f"{failures} hot queries are not served by an index")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Benchmark: BM25 and hashed-vector chunk retrieval vs sending every document.
+
+Generates a synthetic knowledge base (English and Japanese text with a few
+planted facts), then reports index build time, incremental update time,
+query latency and recall for the bm25, vector and hybrid modes, the cost of
+reopening the memory-mapped vector index, and the size of the system prompt
+in full vs bm25 mode.
+
+    python -m benchmarks.retrieval --docs 200 --doc-kb 20
+"""
+
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from dataclasses import dataclass
+
+from app.context import estimate_tokens
+from app.retrieval import BM25Index, RetrievalConfig, fuse_rankings
+from app.vector_index import VectorConfig, VectorIndex
+
+WORDS = (
+    "stream parser token latency buffer model reply index query chunk cache "
+    "project document context budget session worker database migration "
+    "推論 応答 検索 文書 データベース 設定 性能 遅延"
+).split()
+
+
+@dataclass
+class FakeDocument:
+    id: int
+    name: str
+    content: str
+
+
+def make_corpus(docs: int, doc_kb: int, seed: int):
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(docs):
+        lines = []
+        size = 0
+        while size < doc_kb * 1024:
+            line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20)))
+            if rng.random() < 0.01:
+                line += f" secret-code-{i} is stored here"
+            lines.append(line)
+            size += len(line) + 1
+            if rng.random() < 0.1:
+                lines.append("")
+        corpus.append(FakeDocument(i + 1, f"doc-{i + 1}.md", "\n".join(lines)))
+    return corpus
+
+
+def render(documents) -> str:
+    # Same layout as app.state.format_system_prompt, without the guidelines
+    return "\n\n".join(
+        f"<document>\n<source>{doc.name}</source>\n<document_content>\n"
+        f"{doc.content}\n</document_content>\n</document>"
+        for doc in documents
+    )
+
+
+def build_index(index, corpus, total_mb: float, label: str):
+    started = time.perf_counter()
+    for doc in corpus:
+        index.add_document(doc.id, doc.name, doc.content)
+    build = time.perf_counter() - started
+    print(
+        f"{label}: {len(corpus)} docs, {total_mb:.1f} MB indexed in "
+        f"{build * 1000:.0f} ms ({total_mb / build:.1f} MB/s)"
+    )
+
+
+def time_update(index, corpus, label: str):
+    doc = corpus[len(corpus) // 2]
+    started = time.perf_counter()
+    index.add_document(doc.id, doc.name, doc.content + "\nedited")
+    index.remove_document(corpus[0].id)
+    index.add_document(corpus[0].id, corpus[0].name, corpus[0].content)
+    update = time.perf_counter() - started
+    print(f"{label}: edit + delete + add of one document in {update * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--doc-kb", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.docs, args.doc_kb, args.seed)
+    total_mb = sum(len(doc.content) for doc in corpus) / (1024 * 1024)
+    config = RetrievalConfig(top_k=args.top_k)
+
+    index = BM25Index(config)
+    build_index(index, corpus, total_mb, "bm25")
+    time_update(index, corpus, "bm25")
+
+    directory = tempfile.mkdtemp(prefix="vector-index-")
+    vectors = VectorIndex(1, VectorConfig(), directory)
+    build_index(vectors, corpus, total_mb, "vector")
+    vectors.commit(1)
+    time_update(vectors, corpus, "vector")
+    vectors.commit(2)
+    vectors.close()
+    started = time.perf_counter()
+    vectors = VectorIndex(1, VectorConfig(), directory)
+    print(f"vector: reopened from disk in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    searches = {
+        "bm25": lambda query: [c for _, c in index.search(query, args.top_k)],
+        "vector": lambda query: [c for _, c in vectors.search(query, args.top_k)],
+        "hybrid": lambda query: fuse_rankings(
+            [
+                [c for _, c in index.search(query, args.top_k)],
+                [c for _, c in vectors.search(query, args.top_k)],
+            ],
+            args.top_k,
+        ),
+    }
+    for mode, search in searches.items():
+        rng = random.Random(args.seed + 1)
+        latencies = []
+        found = 0
+        for _ in range(args.queries):
+            target = rng.randrange(len(corpus))
+            query = f"where is secret-code-{target + 1} {rng.choice(WORDS)}"
+            started = time.perf_counter()
+            results = search(query)
+            latencies.append((time.perf_counter() - started) * 1000)
+            found += any(f"secret-code-{target + 1} " in c.content for c in results)
+        latencies.sort()
+        print(
+            f"{mode} query ms: p50 {statistics.median(latencies):.2f}  "
+            f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.2f}  "
+            f"(planted fact in top {args.top_k}: {found}/{args.queries})"
+        )
+
+    full_tokens = estimate_tokens(render(corpus))
+    chunks = [chunk for _, chunk in index.search("secret-code-7 latency", args.top_k)]
+    retrieved_tokens = estimate_tokens(render(sorted(chunks, key=lambda c: c.id)))
+    print(
+        f"prompt tokens: full {full_tokens:,}  bm25 {retrieved_tokens:,}  "
+        f"({full_tokens / max(1, retrieved_tokens):.0f}x smaller)"
+    )
+
+
+if __name__ == "__main__":
+    main()
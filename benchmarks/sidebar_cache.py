@@ -0,0 +1,145 @@
+"""Sidebar queries with and without the shared sidebar cache.
+
+Opens tabs (real states in the app's state manager) spread over a few
+projects, then has every tab send messages concurrently. Each send moves
+its chat to the top of the project's list, so every tab showing that
+project is told to reload its sidebar (`sidebar_cache.watch`). Counts the
+SQL statements run by the handlers and the sidebar refreshes (writes,
+committed by the database writer, are not counted), and checks that every
+tab ends up with the project's current chat order.
+
+With --mode uncached the cache is disabled (`enabled=False`): every tab
+reads its lists from the database, as before, but is still notified.
+
+    python -m benchmarks.sidebar_cache --tabs 20 --projects 4 --sends 5
+"""
+
+import argparse
+import asyncio
+import functools
+import os
+import tempfile
+from typing import *
+
+# Point the app at a throwaway database before it is configured
+_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="sidebar-cache-"), "sidebar.db")
+os.environ["DB_URL"] = f"sqlite:///{_DB_PATH}"
+
+import reflex as rx
+from reflex.istate.data import RouterData
+from reflex.state import _substate_key
+
+from app import db, writes
+from app.app import app
+from app.sidebar_cache import SidebarCacheConfig, sidebar_cache
+from app.state import State, list_project_chats, refresh_sidebar
+from app.unit_of_work import count_statements
+from app.writer import db_writer
+
+
+async def open_tab(token: str, project_id: int):
+    """Connect tab `token` and open a project page in it."""
+    app.event_namespace.token_to_sid[token] = f"sid-{token}"
+    async with app.modify_state(_substate_key(token, State)) as root:
+        root.router = RouterData(
+            {
+                "token": token,
+                "sid": f"sid-{token}",
+                "pathname": f"/projects/{project_id}",
+                "query": {"project_id": str(project_id)},
+            }
+        )
+        state = await root.get_state(State)
+        await state.handle_project_route()
+        await state.select_chat(state._project_chats[-1].id)
+
+
+async def send(token: str, sends: int):
+    """Send messages from tab `token`, each handled like a browser event."""
+    for i in range(sends):
+        async with app.modify_state(_substate_key(token, State)) as root:
+            state = await root.get_state(State)
+            # What send_message does: add the message, which touches the
+            # chat, then reload the chat list
+            await db_writer.submit(
+                writes.append_user_message, state.current_chat_id, f"message {i}"
+            )
+            await state.load_project_chats()
+
+
+async def stale_tabs(tokens: List[str]) -> int:
+    """Tabs whose chat list differs from the database's."""
+    stale = 0
+    for token in tokens:
+        root = await app.state_manager.get_state(_substate_key(token, State))
+        state = await root.get_state(State)
+        fresh = await db.run(list_project_chats, state.current_project_id)
+        stale += [c.id for c in state._project_chats] != [c.id for c in fresh]
+    return stale
+
+
+async def run_mode(mode: str, args, project_ids: List[int]):
+    sidebar_cache.config = SidebarCacheConfig(enabled=mode == "cached")
+    sidebar_cache.invalidate([(project_id, True) for project_id in project_ids])
+    before = sidebar_cache.stats()
+    tokens = [f"{mode}-{tab}" for tab in range(args.tabs)]
+
+    with count_statements() as counter:
+        watcher = asyncio.create_task(
+            sidebar_cache.watch(functools.partial(refresh_sidebar, app))
+        )
+        for tab, token in enumerate(tokens):
+            await open_tab(token, project_ids[tab % len(project_ids)])
+        opened = counter.statements
+        await asyncio.gather(*(send(token, args.sends) for token in tokens))
+        # Let the last notifications go out
+        await asyncio.sleep(sidebar_cache.config.notify_window_ms / 1000 + 0.5)
+        watcher.cancel()
+    stats = sidebar_cache.stats()
+
+    print(f"[{mode}] {args.tabs} tabs, {args.tabs * args.sends} sends")
+    print(f"  statements opening tabs: {opened}")
+    print(f"  statements sending and refreshing: {counter.statements - opened}")
+    print(
+        f"  sidebar refreshes pushed: "
+        f"{stats['notifications'] - before['notifications']}, "
+        f"cache hits {stats['hits'] - before['hits']}, "
+        f"misses {stats['misses'] - before['misses']}"
+    )
+    print(f"  tabs with a stale chat list: {await stale_tabs(tokens)}")
+    for token in tokens:
+        sidebar_cache.unsubscribe(token)
+
+
+async def run(args):
+    rx.Model.migrate()
+    app._enable_state()
+    project_ids = []
+    for p in range(args.projects):
+        project_id = await db_writer.submit(
+            writes.save_project, None, f"p{p}", "", ""
+        )
+        for c in range(args.chats):
+            await db_writer.submit(writes.save_chat, None, project_id, f"chat {c}")
+        project_ids.append(project_id)
+
+    modes = ["uncached", "cached"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        await run_mode(mode, args, project_ids)
+    await db_writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--mode", choices=["uncached", "cached", "both"], default="both"
+    )
+    parser.add_argument("--tabs", type=int, default=20)
+    parser.add_argument("--projects", type=int, default=4)
+    parser.add_argument("--chats", type=int, default=10, help="Chats per project")
+    parser.add_argument("--sends", type=int, default=5, help="Messages per tab")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Concurrent read/write throughput with and without the SQLite engine profile.
+
+Seeds two identical databases, one for an engine built the way Reflex builds
+it (default pragmas, pre-ping, SQLAlchemy's default pool) and one tuned by
+app.db_profile. Then runs the chat workload against each from concurrent
+threads for a fixed time:
+
+- readers open a chat the way the UI does: the project's chat list, the
+  latest message page and the history that fits a prompt budget
+- writers send turns the way process_question does: a user message and a
+  placeholder in one commit, then the finished reply and the chat timestamp
+  in another
+
+Reports operations per second, latency percentiles and "database is locked"
+errors for each engine.
+
+    python -m benchmarks.sqlite_profile --readers 8 --writers 4 --seconds 5
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import *
+
+import reflex as rx
+import sqlalchemy
+import sqlmodel
+from sqlmodel import Session, SQLModel, desc, insert, select
+
+from app.context import load_history
+from app.db_profile import SQLiteProfile, create_engine
+from app.models import Chat, Message, Project
+from app.sequence import next_seq, page_before
+from benchmarks.stream_e2e import percentile
+
+
+def seed(engine, projects: int, chats: int, messages: int) -> List[Tuple[int, int]]:
+    """Fill the database and return (project_id, chat_id) pairs."""
+    SQLModel.metadata.create_all(engine)
+    rng = random.Random(0)
+    pairs = []
+    with Session(engine) as session:
+        for p in range(projects):
+            project = Project(name=f"project {p}")
+            session.add(project)
+            session.flush()
+            for c in range(chats):
+                chat = Chat(name=f"chat {c}", project_id=project.id)
+                session.add(chat)
+                session.flush()
+                pairs.append((project.id, chat.id))
+                session.exec(
+                    insert(Message),
+                    params=[
+                        {
+                            "role": "user" if m % 2 == 0 else "assistant",
+                            "content": "hello " * rng.randint(5, 200),
+                            "token_count": 100,
+                            "chat_id": chat.id,
+                            "seq": m,
+                        }
+                        for m in range(messages)
+                    ],
+                )
+        session.commit()
+    return pairs
+
+
+def read_chat(session: Session, project_id: int, chat_id: int):
+    session.exec(
+        select(Chat).where(Chat.project_id == project_id).order_by(desc(Chat.updated_at))
+    ).all()
+    page_before(session, chat_id, None, 50)
+    load_history(session, chat_id, 0, 8000)
+
+
+def send_turn(session: Session, chat_id: int):
+    user = Message(
+        role="user", content="question " * 20, chat_id=chat_id, seq=next_seq(session, chat_id)
+    )
+    session.add(user)
+    session.flush()
+    reply = Message(role="assistant", chat_id=chat_id, reply_to_id=user.id, seq=user.seq + 1)
+    session.add(reply)
+    session.commit()
+
+    reply.content = "answer " * 200
+    chat = session.get(Chat, chat_id)
+    chat.updated_at = datetime.now(timezone.utc)
+    session.add_all([reply, chat])
+    session.commit()
+
+
+def worker(
+    engine,
+    op: Callable,
+    pairs: List[Tuple[int, int]],
+    deadline: float,
+    seed: int,
+    latencies: List[float],
+    errors: List[str],
+):
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        project_id, chat_id = rng.choice(pairs)
+        started = time.perf_counter()
+        try:
+            with Session(engine) as session:
+                op(session, project_id, chat_id)
+        except sqlalchemy.exc.OperationalError as e:
+            errors.append(str(e.orig))
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+
+
+def run(label: str, engine, pairs, args) -> Dict[str, Any]:
+    reads: List[float] = []
+    writes: List[float] = []
+    errors: List[str] = []
+    deadline = time.perf_counter() + args.seconds
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(engine, read_chat, pairs, deadline, i, reads, errors),
+        )
+        for i in range(args.readers)
+    ] + [
+        threading.Thread(
+            target=worker,
+            args=(
+                engine,
+                lambda session, _, chat_id: send_turn(session, chat_id),
+                # Each writer has its own chats, as each user has their own
+                pairs[i :: args.writers],
+                deadline,
+                1000 + i,
+                writes,
+                errors,
+            ),
+        )
+        for i in range(args.writers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f"[{label}]")
+    for name, values in (("reads", reads), ("turns", writes)):
+        print(
+            f"  {name}: {len(values) / args.seconds:8.1f}/s  "
+            f"p50 {percentile(values, 50):7.1f} ms  p99 {percentile(values, 99):7.1f} ms"
+        )
+    print(f"  errors: {len(errors)}" + (f" ({errors[0]})" if errors else ""))
+    return {"reads": len(reads), "turns": len(writes), "errors": len(errors)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--projects", type=int, default=4)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=200)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="sqlite-profile-")
+    engines = {
+        # What rx.model.get_engine() creates
+        "reflex default": lambda url: sqlmodel.create_engine(
+            url, **rx.model.get_engine_args(url)
+        ),
+        "tuned profile": lambda url: create_engine(url, SQLiteProfile.from_config()),
+    }
+    results = {}
+    for label, build in engines.items():
+        url = f"sqlite:///{os.path.join(directory, label.replace(' ', '-'))}.db"
+        engine = build(url)
+        pairs = seed(engine, args.projects, args.chats, args.messages)
+        results[label] = run(label, engine, pairs, args)
+        engine.dispose()
+
+    before, after = results.values()
+    for name in ("reads", "turns"):
+        if before[name]:
+            print(f"{name}: {after[name] / before[name]:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Micro-benchmark: SSE parse throughput in MB/s.
+
+Parses a multi-megabyte OpenRouter-style stream (or a raw recorded stream given
+with --file) split into fixed-size reads, comparing the previous str-buffer loop
+with `app.sse.SSEParser`. The legacy loop only counts data lines; the parser
+also assembles events. Its cost per read grows with the read size, which is
+where the quadratic slicing shows up.
+
+    python -m benchmarks.sse_parser --size-mb 8
+"""
+
+import argparse
+import json
+import time
+
+from app.sse import SSEParser
+
+
+def synthetic_stream(size_mb: float) -> bytes:
+    """Build a stream of content/reasoning deltas with CJK text and keep-alives."""
+    target = int(size_mb * 1024 * 1024)
+    parts = []
+    total = 0
+    i = 0
+    while total < target:
+        if i % 200 == 0:
+            line = b": OPENROUTER PROCESSING\n\n"
+        else:
+            field = "reasoning" if i % 3 == 0 else "content"
+            text = "日本語のトークン " if i % 2 else "token chunk "
+            payload = {
+                "id": "gen-bench",
+                "model": "bench/model",
+                "choices": [{"index": 0, "delta": {field: f"{text}{i}"}}],
+            }
+            line = f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode()
+        parts.append(line)
+        total += len(line)
+        i += 1
+    parts.append(b"data: [DONE]\n\n")
+    return b"".join(parts)
+
+
+def legacy_parse(raw: bytes, read_size: int) -> int:
+    """The previous StreamProcessor loop (decode per read, str buffer slicing)."""
+    buffer = ""
+    events = 0
+    for start in range(0, len(raw), read_size):
+        # errors="ignore" so split multi-byte characters don't abort the run
+        buffer += raw[start : start + read_size].decode("utf-8", errors="ignore")
+        while True:
+            line_end = buffer.find("\n")
+            if line_end == -1:
+                break
+            line = buffer[:line_end].strip()
+            buffer = buffer[line_end + 1 :]
+            if line.startswith("data: "):
+                events += 1
+    return events
+
+
+def incremental_parse(raw: bytes, read_size: int) -> int:
+    parser = SSEParser()
+    events = 0
+    for start in range(0, len(raw), read_size):
+        events += len(parser.feed(raw[start : start + read_size]))
+    events += len(parser.close())
+    return events
+
+
+def measure(fn, raw: bytes, read_size: int, repeat: int):
+    best = float("inf")
+    events = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        events = fn(raw, read_size)
+        best = min(best, time.perf_counter() - started)
+    return best, events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=8.0)
+    parser.add_argument("--file", help="Raw SSE bytes to parse instead of synthetic data")
+    parser.add_argument(
+        "--read-size", type=int, nargs="+", default=[1024, 16384, 65536]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "rb") as f:
+            raw = f.read()
+    else:
+        raw = synthetic_stream(args.size_mb)
+    size_mb = len(raw) / (1024 * 1024)
+    print(f"stream: {size_mb:.2f} MB")
+
+    for read_size in args.read_size:
+        print(f"read size {read_size} B")
+        for name, fn in (("legacy", legacy_parse), ("incremental", incremental_parse)):
+            elapsed, events = measure(fn, raw, read_size, args.repeat)
+            print(
+                f"  {name:>12}: {size_mb / elapsed:8.1f} MB/s  "
+                f"({elapsed * 1000:.1f} ms, {events} events)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""End-to-end streaming benchmark against the local mock OpenRouter server.
+
+Runs concurrent streaming requests through the real client path
+(AsyncOpenRouterAI on the pooled session -> StreamProcessor -> coalesce_chunks)
+and reports time-to-first-token, total latency percentiles and tokens/sec.
+
+    python -m benchmarks.stream_e2e --users 20 --requests 5 --tokens-per-sec 200
+
+Pass --base-url to target an already running server instead of an in-process one.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import statistics
+import time
+from typing import *
+
+from app.http_pool import client_registry
+from app.resilience import upstream_stats
+from app.state import AsyncOpenRouterAI
+from app.streaming import FlushPolicy, TextAccumulator, coalesce_chunks
+from benchmarks.mock_openrouter import (
+    add_config_arguments,
+    config_from_args,
+    start_server,
+)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def one_request(base_url: str, policy: FlushPolicy) -> Dict[str, Any]:
+    client = await AsyncOpenRouterAI.from_pool(api_key="mock", base_url=base_url)
+    content = TextAccumulator()
+    reasoning = TextAccumulator()
+    started = time.perf_counter()
+    first_token = None
+    flushes = 0
+    error = None
+    try:
+        processor = await client.chat.completions.create(
+            model="mock/model",
+            messages=[{"role": "user", "content": "benchmark"}],
+            stream=True,
+            include_reasoning=True,
+        )
+    except Exception as e:
+        error = str(e)
+    else:
+        deltas = coalesce_chunks(processor, policy, content, reasoning)
+        async with contextlib.aclosing(deltas):
+            async for delta in deltas:
+                if delta.error:
+                    error = delta.error
+                    break
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                flushes += 1
+    elapsed = time.perf_counter() - started
+    return {
+        "ttft": first_token if first_token is not None else elapsed,
+        "latency": elapsed,
+        "tokens": len(content.getvalue().split()) + len(reasoning.getvalue().split()),
+        "flushes": flushes,
+        "error": error,
+    }
+
+
+async def user(base_url: str, requests: int, policy: FlushPolicy, results: list):
+    for _ in range(requests):
+        results.append(await one_request(base_url, policy))
+
+
+async def run(args):
+    runner = None
+    base_url = args.base_url
+    if not base_url:
+        runner, base_url = await start_server(config_from_args(args))
+
+    policy = FlushPolicy(interval_ms=args.flush_ms, max_chars=args.flush_chars)
+    results: List[Dict[str, Any]] = []
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(user(base_url, args.requests, policy, results) for _ in range(args.users))
+    )
+    wall = time.perf_counter() - started
+
+    ttft = [r["ttft"] * 1000 for r in results]
+    latency = [r["latency"] * 1000 for r in results]
+    tokens = sum(r["tokens"] for r in results)
+    errors = sum(1 for r in results if r["error"])
+    print(f"requests: {len(results)} ({errors} errors) in {wall:.2f} s")
+    print(f"throughput: {tokens / wall:.1f} tokens/s aggregate")
+    print(
+        "per-stream: "
+        f"{statistics.mean(r['tokens'] / r['latency'] for r in results):.1f} tokens/s, "
+        f"{statistics.mean(r['flushes'] for r in results):.1f} UI flushes"
+    )
+    for name, values in (("ttft", ttft), ("latency", latency)):
+        print(
+            f"{name:>8} ms: p50 {percentile(values, 50):8.1f}  "
+            f"p90 {percentile(values, 90):8.1f}  p99 {percentile(values, 99):8.1f}"
+        )
+    print(f"pool: {client_registry.pool_stats()}")
+    print(f"upstream: {upstream_stats.as_dict()}")
+
+    await client_registry.close()
+    if runner:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", help="Use a running server instead")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=5, help="Requests per user")
+    parser.add_argument("--flush-ms", type=float, default=FlushPolicy.interval_ms)
+    parser.add_argument("--flush-chars", type=int, default=FlushPolicy.max_chars)
+    add_config_arguments(parser)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
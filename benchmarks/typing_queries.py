@@ -0,0 +1,133 @@
+"""SQL statements while typing: computed vars must not query per keystroke.
+
+Seeds a throwaway database, opens the same chat in several tabs (real State
+instances) and replays a typing session in each: the question box, the chat
+and project modals, a document form. After every keystroke it computes the
+delta the way Reflex does before sending it to the browser, and counts the
+SQL statements (`unit_of_work.count_statements`). Also checks that a write
+(adding a document in the project modal) shows up in `project_to_edit_data`.
+
+Exits with status 1 if typing executes any statement or the write isn't
+shown.
+
+    python -m benchmarks.typing_queries --tabs 5 --keystrokes 200
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+# Point the app at a throwaway database before it is configured
+_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="typing-queries-"), "typing.db")
+os.environ["DB_URL"] = f"sqlite:///{_DB_PATH}"
+
+import reflex as rx
+from reflex.istate.data import RouterData
+
+from app import writes
+from app.row_cache import row_cache
+from app.state import State
+from app.unit_of_work import count_statements
+from app.writer import db_writer
+
+
+def new_state(project_id: int, chat_id: int) -> State:
+    """A State as a fresh browser tab on the chat's page would have it."""
+    root = rx.State(_reflex_internal_init=True)
+    root.router = RouterData(
+        {
+            "pathname": f"/projects/{project_id}/chats/{chat_id}",
+            "query": {"project_id": str(project_id), "chat_id": str(chat_id)},
+        }
+    )
+    return root.substates[State.get_name()]
+
+
+def send_delta(state: State):
+    """Compute and clear the delta, as Reflex does after each event."""
+    root = state.parent_state
+    root.get_delta()
+    root._clean()
+
+
+async def typing_session(state: State, keystrokes: int) -> int:
+    """Type into every form of the chat page; returns statements executed."""
+    text = "lorem ipsum dolor sit amet " * (keystrokes // 27 + 1)
+    fields = [
+        state.set_current_question,
+        state.set_chat_name,
+        state.set_project_name,
+        state.set_project_description,
+        state.set_document_name,
+        state.set_document_content,
+    ]
+    with count_statements() as counter:
+        for typed in range(1, keystrokes + 1):
+            fields[typed * len(fields) // (keystrokes + 1)](text[:typed])
+            send_delta(state)
+    return counter.statements
+
+
+async def run(args) -> int:
+    rx.Model.migrate()
+    project_id = await db_writer.submit(
+        writes.save_project,
+        None,
+        "bench",
+        "",
+        "Answer briefly.",
+        [{"name": f"doc {d}", "content": "lorem ipsum " * 50} for d in range(5)],
+    )
+    chat_id = await db_writer.submit(writes.save_chat, None, project_id, "chat")
+
+    failures = 0
+    tabs = [new_state(project_id, chat_id) for _ in range(args.tabs)]
+    with count_statements() as opening:
+        for state in tabs:
+            await state.handle_chat_route()
+            state.parent_state.dict()
+            await state.set_project_to_edit(project_id)
+            await state.set_chat_to_edit(chat_id)
+            send_delta(state)
+    print(f"opening {args.tabs} tabs with both modals: {opening.statements} statements")
+
+    typed = [await typing_session(state, args.keystrokes) for state in tabs]
+    print(
+        f"typing {args.keystrokes} keystrokes per tab: "
+        f"{sum(typed)} statements in {args.tabs} tabs"
+    )
+    failures += sum(typed) > 0
+
+    state = tabs[0]
+    state.set_document_name("added")
+    state.set_document_content("added while editing")
+    with count_statements() as adding:
+        await state.handle_document_submit()
+        send_delta(state)
+    documents = [document.name for document in state.project_to_edit_data.knowledge]
+    shown = "added" in documents
+    print(
+        f"adding a document: {adding.statements} statements, "
+        f"{'shown' if shown else 'NOT SHOWN'} in the project modal"
+    )
+    failures += not shown
+
+    print(f"row cache: {row_cache.stats()}")
+    await db_writer.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tabs", type=int, default=5)
+    parser.add_argument("--keystrokes", type=int, default=200)
+    failures = asyncio.run(run(parser.parse_args()))
+    if failures:
+        print("typing queried the database or a write wasn't shown")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
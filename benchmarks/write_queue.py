@@ -0,0 +1,139 @@
+"""Write throughput with one commit per write vs. the batching database writer.
+
+Concurrent users on one event loop each run chat turns the way
+process_question does: the user message and a placeholder reply, a few
+streaming checkpoints of the partial reply, then the finished reply and the
+chat timestamp. With --mode direct each write opens its own session and
+commits, the way the handlers used to. With --mode batched every write goes
+through `writer.DatabaseWriter`, which commits whatever is queued in one
+transaction. Reports writes per second, write latency percentiles, failed
+writes ("database is locked") and the writer's batch sizes.
+
+    python -m benchmarks.write_queue --mode both --users 50 --turns 10
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import *
+
+# Point the app at a throwaway database before it is configured
+_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="write-queue-"), "bench.db")
+os.environ["DB_URL"] = f"sqlite:///{_DB_PATH}"
+
+import reflex as rx
+import sqlalchemy
+
+from app import writes
+from app.checkpoint import _write_partial
+from app.models import MessageStatus
+from app.writer import DatabaseWriter, WriterConfig
+from benchmarks.stream_e2e import percentile
+
+
+async def user(
+    writer: DatabaseWriter,
+    chat_id: int,
+    turns: int,
+    checkpoints: int,
+    latencies: List[float],
+    errors: List[str],
+):
+    async def write(fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = await writer.submit(fn, *args, **kwargs)
+        except sqlalchemy.exc.OperationalError as e:
+            errors.append(str(e.orig))
+            return None
+        latencies.append((time.perf_counter() - started) * 1000)
+        return result
+
+    for turn in range(turns):
+        ids = await write(writes.start_turn, chat_id, f"question {turn}", ["model"])
+        if not ids:
+            continue
+        answer = ""
+        for _ in range(checkpoints):
+            answer += "token " * 50
+            await write(_write_partial, ids[0], answer, "")
+        await write(
+            writes.finish_reply,
+            ids[0],
+            answer,
+            "",
+            MessageStatus.COMPLETE.value,
+            chat_id=chat_id,
+        )
+
+
+async def run_mode(mode: str, args, chat_ids: List[int]):
+    writer = DatabaseWriter(
+        WriterConfig(
+            enabled=mode == "batched",
+            window_ms=args.window_ms,
+            max_batch=args.max_batch,
+        )
+    )
+    latencies: List[float] = []
+    errors: List[str] = []
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            user(writer, chat_id, args.turns, args.checkpoints, latencies, errors)
+            for chat_id in chat_ids
+        )
+    )
+    wall = time.perf_counter() - started
+    await writer.close()
+
+    print(f"[{mode}] {len(latencies)} writes ({len(errors)} failed) in {wall:.2f} s")
+    print(f"  throughput: {len(latencies) / wall:.1f} writes/s")
+    print(
+        f"  latency ms: p50 {percentile(latencies, 50):8.1f}  "
+        f"p99 {percentile(latencies, 99):8.1f}  max {max(latencies, default=0):8.1f}"
+    )
+    if errors:
+        print(f"  first error: {errors[0]}")
+    if writer.batches:
+        stats = writer.stats()
+        print(
+            f"  writer: {stats['batches']} commits, "
+            f"mean batch {stats['mean_batch']}, largest {stats['largest_batch']}"
+        )
+    return len(latencies) / wall
+
+
+async def run(args):
+    rx.Model.migrate()
+    setup = DatabaseWriter(WriterConfig())
+    project_id = await setup.submit(writes.save_project, None, "bench", "", "")
+    chat_ids = [
+        await setup.submit(writes.save_chat, None, project_id, f"user {i}")
+        for i in range(args.users)
+    ]
+    await setup.close()
+
+    modes = ["direct", "batched"] if args.mode == "both" else [args.mode]
+    results = {mode: await run_mode(mode, args, chat_ids) for mode in modes}
+    if len(results) == 2 and results["direct"]:
+        print(f"writes/s: {results['batched'] / results['direct']:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=["direct", "batched", "both"], default="both")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=10, help="Turns per user")
+    parser.add_argument(
+        "--checkpoints", type=int, default=3, help="Partial writes per turn"
+    )
+    parser.add_argument("--window-ms", type=float, default=WriterConfig.window_ms)
+    parser.add_argument("--max-batch", type=int, default=WriterConfig.max_batch)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,19 @@ class LogLevel(str, Enum):
 config = rx.Config(
     app_name="app",
     db_url="sqlite:///reflex.db",
+    # Pragmas and pool of the app's SQLite engines (app/db_profile.py); any
+    # key left out keeps its default, SQLITE_<KEY> env vars override
+    sqlite_profile={
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,
+        "temp_store": "memory",
+        "busy_timeout_ms": 5000,
+        "foreign_keys": True,
+        "pool_size": 8,
+        "max_overflow": 8,
+    },
     loglevel=LogLevel.DEBUG,
     env=rx.Env.DEV,
     # frontend_port=80,
@@ -0,0 +1,32 @@
+"""Tests run the app against a throwaway database migrated to head."""
+
+import asyncio
+import os
+import tempfile
+
+# Point the app at a throwaway database before it is configured
+_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="app-tests-"), "tests.db")
+os.environ["DB_URL"] = f"sqlite:///{_DB_PATH}"
+
+import pytest
+import reflex as rx
+
+# Load the config now: the benchmark modules the tests reuse point DB_URL
+# at databases of their own when imported
+rx.config.get_config()
+
+
+@pytest.fixture(scope="session")
+def run():
+    """Run a coroutine on one event loop shared by the whole test session.
+
+    The database writer and the async engine's connections belong to the
+    loop they were first used on.
+    """
+    from app.writer import db_writer
+
+    rx.Model.migrate()
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.run_until_complete(db_writer.close())
+    loop.close()
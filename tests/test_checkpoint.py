@@ -0,0 +1,43 @@
+"""Only responses no worker is still streaming are aborted at recovery."""
+
+from datetime import datetime, timedelta, timezone
+
+from sqlmodel import select
+
+from app import db, writes
+from app.checkpoint import abort_stale_responses
+from app.models import Message, MessageStatus
+from app.writer import db_writer
+
+
+def backdate(session, message_id: int, minutes: int):
+    """Make a message look last checkpointed `minutes` ago."""
+    message = session.get(Message, message_id)
+    message.updated_at = datetime.now(timezone.utc) - timedelta(minutes=minutes)
+    session.add(message)
+
+
+def statuses(session, ids):
+    rows = session.exec(select(Message.id, Message.status).where(Message.id.in_(ids)))
+    return {message_id: status for message_id, status in rows.all()}
+
+
+def test_only_stale_streaming_responses_are_aborted(run):
+    async def scenario():
+        project_id = await db_writer.submit(writes.save_project, None, "p", "", "")
+        chat_id = await db_writer.submit(writes.save_chat, None, project_id, "c")
+        ids = []
+        for question in ("dead worker", "live worker"):
+            ids += await db_writer.submit(
+                writes.start_turn, chat_id, question, ["openai/gpt-4o-mini"]
+            )
+        dead, live = ids
+        await db_writer.submit(backdate, dead, 30)
+
+        cutoff = datetime.now(timezone.utc) - timedelta(minutes=10)
+        assert await db_writer.submit(abort_stale_responses, cutoff) == 1
+        return await db.run(statuses, ids), dead, live
+
+    found, dead, live = run(scenario())
+    assert found[dead] == MessageStatus.ABORTED.value
+    assert found[live] == MessageStatus.STREAMING.value
@@ -0,0 +1,26 @@
+"""Event handlers stay within their SQL statement budgets (benchmarks.event_queries)."""
+
+import pytest
+
+from app.sidebar_cache import SidebarCacheConfig, sidebar_cache
+from benchmarks.event_queries import BUDGETS, count, scenarios, seed
+
+
+@pytest.fixture(scope="module")
+def ids(run):
+    return run(seed(chats=10, messages=150))
+
+
+@pytest.fixture
+def uncached_sidebar():
+    # Each handler reads the lists it needs, as in the benchmark
+    config = sidebar_cache.config
+    sidebar_cache.config = SidebarCacheConfig(enabled=False)
+    yield
+    sidebar_cache.config = config
+
+
+@pytest.mark.parametrize("name", list(BUDGETS))
+def test_handler_statements_within_budget(run, ids, uncached_sidebar, name):
+    setup, args = scenarios(*ids)[name]
+    assert run(count(name, setup, args, ids, separate=False)) <= BUDGETS[name]
@@ -0,0 +1,28 @@
+"""The hot queries are answered from indexes (see benchmarks.query_plans)."""
+
+import pytest
+import reflex as rx
+from sqlmodel import select
+
+from app.models import Chat, Message
+from benchmarks.query_plans import hot_queries, plan_problems, seed
+
+PROJECTS = 4
+MESSAGES = 40
+
+
+@pytest.fixture(scope="module")
+def queries(run):
+    seed(projects=PROJECTS, chats=8, messages=MESSAGES, seed=0)
+    with rx.session() as session:
+        chat_id = session.exec(select(Chat.id).order_by(Chat.id.desc())).first()
+        project_id = session.get(Chat, chat_id).project_id
+        user_msg_id = session.exec(
+            select(Message.id).where(Message.chat_id == chat_id, Message.role == "user")
+        ).first()
+    return hot_queries(project_id, chat_id, user_msg_id, MESSAGES // 2)
+
+
+@pytest.mark.parametrize("name", list(hot_queries(0, 0, 0, 0)))
+def test_hot_query_uses_indexes(queries, name):
+    assert plan_problems(rx.model.get_engine(), queries[name]) == []
@@ -0,0 +1,33 @@
+"""Cancelling a hedged request cancels the attempts it started."""
+
+import asyncio
+
+from app.resilience import RetryPolicy, UpstreamStats, hedged
+
+
+def test_cancel_before_hedge_cancels_primary(run):
+    async def scenario():
+        started, cancelled = asyncio.Event(), asyncio.Event()
+
+        async def attempt():
+            started.set()
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def discard(result):
+            pass
+
+        policy = RetryPolicy(hedge_after_ms=60_000)
+        stats = UpstreamStats()
+        request = asyncio.create_task(hedged(attempt, policy, discard, stats))
+        await started.wait()
+        request.cancel()
+        await asyncio.gather(request, return_exceptions=True)
+        return cancelled.is_set(), stats
+
+    was_cancelled, stats = run(scenario())
+    assert was_cancelled
+    assert stats.hedges_fired == 0
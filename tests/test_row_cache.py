@@ -0,0 +1,45 @@
+"""Rows shown by computed vars are loaded by handlers and expire after a TTL."""
+
+import time
+
+from app import writes
+from app.models import Chat, Project
+from app.row_cache import RowCache, RowCacheConfig, row_cache
+from app.state import get_project
+from app.unit_of_work import count_statements
+from app.writer import db_writer
+from benchmarks.typing_queries import new_state, send_delta
+
+
+def test_vars_run_no_statements_after_a_handler(run):
+    async def open_tab():
+        project_id = await db_writer.submit(writes.save_project, None, "p", "", "")
+        chat_id = await db_writer.submit(writes.save_chat, None, project_id, "c")
+        row_cache.invalidate_all(Project)
+        row_cache.invalidate_all(Chat)
+        state = new_state(project_id, chat_id)
+        await state.handle_chat_route()
+        await state.set_project_to_edit(project_id)
+        await state.set_chat_to_edit(chat_id)
+        return state
+
+    state = run(open_tab())
+    with count_statements() as counter:
+        send_delta(state)
+    assert counter.statements == 0
+    assert state.current_chat.name == "c"
+    assert state.project_to_edit_data.name == "p"
+
+
+def test_rows_are_reloaded_after_the_ttl(run, monkeypatch):
+    project_id = run(db_writer.submit(writes.save_project, None, "old", "", ""))
+    cache = RowCache(RowCacheConfig(ttl_seconds=60))
+    assert run(cache.load(Project, project_id, get_project)).name == "old"
+
+    # Written by another process: nothing invalidates this one's cache
+    run(db_writer.submit(writes.save_project, project_id, "new", "", ""))
+    assert cache.get(Project, project_id, get_project).name == "old"
+
+    later = time.monotonic() + 61
+    monkeypatch.setattr(time, "monotonic", lambda: later)
+    assert cache.get(Project, project_id, get_project).name == "new"
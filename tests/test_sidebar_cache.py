@@ -0,0 +1,70 @@
+"""The shared sidebar lists match the database after writes."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import db, writes
+from app.models import Project
+from app.sidebar_cache import PROJECTS, SidebarCacheConfig, sidebar_cache
+from app.state import list_projects
+from app.writer import db_writer
+
+
+@pytest.fixture
+def cached_sidebar():
+    config = sidebar_cache.config
+    sidebar_cache.config = SidebarCacheConfig(enabled=True)
+    sidebar_cache.invalidate([(None, True)])
+    yield
+    sidebar_cache.config = config
+
+
+def backdate(session, project_id: int, hours: int):
+    """Make a project look last updated `hours` ago."""
+    project = session.get(Project, project_id)
+    project.updated_at = datetime.now(timezone.utc) - timedelta(hours=hours)
+    session.add(project)
+
+
+async def project_ids(cached: bool):
+    if cached:
+        projects = await sidebar_cache.get(PROJECTS, list_projects)
+    else:
+        projects = await db.run(list_projects)
+    return [project.id for project in projects]
+
+
+def test_document_writes_keep_project_list(run, cached_sidebar):
+    async def scenario():
+        older = await db_writer.submit(writes.save_project, None, "older", "", "")
+        newer = await db_writer.submit(writes.save_project, None, "newer", "", "")
+        await db_writer.submit(backdate, older, 2)
+        await db_writer.submit(backdate, newer, 1)
+        before = await project_ids(cached=True)
+
+        # Documents don't change the list: they must not move their project
+        _, document = await db_writer.submit(
+            writes.save_document, None, older, "doc", "content"
+        )
+        await db_writer.submit(
+            writes.save_document, document.id, older, "doc", "edited"
+        )
+        await db_writer.submit(writes.delete_document, document.id, older)
+        assert await project_ids(cached=True) == await project_ids(cached=False)
+        assert await project_ids(cached=False) == before
+
+    run(scenario())
+
+
+def test_project_edit_refreshes_project_list(run, cached_sidebar):
+    async def scenario():
+        older = await db_writer.submit(writes.save_project, None, "old", "", "")
+        await db_writer.submit(writes.save_project, None, "new", "", "")
+        assert (await project_ids(cached=True))[0] != older
+
+        await db_writer.submit(writes.save_project, older, "renamed", "", "")
+        assert (await project_ids(cached=True))[0] == older
+        assert await project_ids(cached=True) == await project_ids(cached=False)
+
+    run(scenario())
@@ -0,0 +1,51 @@
+"""Typing runs no SQL, and writes still show (see benchmarks.typing_queries)."""
+
+import pytest
+
+from app import writes
+from app.unit_of_work import count_statements
+from app.writer import db_writer
+from benchmarks.typing_queries import new_state, send_delta, typing_session
+
+
+@pytest.fixture
+def state(run):
+    """A tab on a new chat's page with the chat and project modals open."""
+
+    async def open_tab():
+        project_id = await db_writer.submit(
+            writes.save_project,
+            None,
+            "typing",
+            "",
+            "Answer briefly.",
+            [{"name": f"doc {d}", "content": "lorem ipsum " * 50} for d in range(3)],
+        )
+        chat_id = await db_writer.submit(writes.save_chat, None, project_id, "chat")
+        state = new_state(project_id, chat_id)
+        await state.handle_chat_route()
+        state.parent_state.dict()
+        await state.set_project_to_edit(project_id)
+        await state.set_chat_to_edit(chat_id)
+        send_delta(state)
+        return state
+
+    return run(open_tab())
+
+
+def test_keystrokes_run_no_statements(run, state):
+    assert run(typing_session(state, 120)) == 0
+
+
+def test_added_document_shows_in_project_modal(run, state):
+    state.set_document_name("added")
+    state.set_document_content("added while editing")
+    run(state.handle_document_submit())
+    send_delta(state)
+    documents = [document.name for document in state.project_to_edit_data.knowledge]
+    assert "added" in documents
+    # Shown from the row cache: typing afterwards still runs no SQL
+    with count_statements() as counter:
+        state.set_document_name("next")
+        send_delta(state)
+    assert counter.statements == 0